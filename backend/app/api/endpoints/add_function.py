@@ -3,6 +3,7 @@ from pydantic import BaseModel
 from sqlalchemy.orm import Session
 from app.db.session import get_db
 from app.db.models import Connector
+from app.services.spec_parameters import build_operation_parameters
 from app.services.vector_db import process_and_store_connector_chunks
 import yaml
 import json
@@ -114,6 +115,7 @@ async def add_function_to_connector(
         
         connector.full_schema_json = spec
         flag_modified(connector, "full_schema_json")  # Mark as modified for SQLAlchemy
+        connector.operation_parameters = build_operation_parameters(spec)
         db.commit()
         db.refresh(connector)  # Refresh to get the latest state
         
@@ -193,6 +195,7 @@ async def delete_function_from_connector(
         
         connector.full_schema_json = spec
         flag_modified(connector, "full_schema_json")
+        connector.operation_parameters = build_operation_parameters(spec)
         db.commit()
         db.refresh(connector)
         
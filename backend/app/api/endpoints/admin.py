@@ -0,0 +1,87 @@
+from fastapi import APIRouter, HTTPException, Body
+from typing import Dict, Any
+import logging
+from app.core.log import APP_LOGGER, dropped_records
+from app.services.response_cache import response_cache
+from app.services.executor import executor
+from app.services.resilience import circuit_breakers
+from app.services.rate_limiter import rate_limiters
+from app.services.admission import query_admission
+from app.services.embedding_sidecar import sidecar_stats
+from app.services.jobs import job_manager
+
+router = APIRouter()
+
+@router.get("/cache")
+async def get_cache_stats():
+    """Hit, revalidation and miss counters of the upstream response cache."""
+    return response_cache.stats()
+
+@router.delete("/cache")
+async def clear_cache():
+    """Drop all cached upstream responses."""
+    response_cache.clear()
+    return {"status": "SUCCESS", "message": "Response cache cleared."}
+
+@router.get("/coalescing")
+async def get_coalescing_stats():
+    """How many upstream calls were shared between identical concurrent requests."""
+    return executor.flights.stats()
+
+@router.get("/circuit-breakers")
+async def get_circuit_breakers():
+    """State of the per-host circuit breakers guarding upstream APIs."""
+    return circuit_breakers.snapshot()
+
+@router.post("/circuit-breakers/{host}/reset")
+async def reset_circuit_breaker(host: str):
+    """Force a breaker back to CLOSED, e.g. after an upstream incident is resolved."""
+    breaker = circuit_breakers.find(host)
+    if not breaker:
+        raise HTTPException(status_code=404, detail="No circuit breaker for this host")
+    breaker.reset()
+    return breaker.snapshot()
+
+@router.get("/rate-limits")
+async def get_rate_limits():
+    """Current limits, throttling events and queue wait times per connector."""
+    return {
+        "connectors": rate_limiters.stats(),
+        "overrides": rate_limiters.get_overrides()
+    }
+
+@router.put("/rate-limits/{connector_id}")
+async def set_rate_limit(connector_id: str, limits: Dict[str, Any] = Body(...)):
+    """
+    Override a connector's outbound limits, e.g.
+    {"requests": 100, "period": 60, "burst": 10, "max-concurrency": 4}.
+    An empty object removes the override.
+    """
+    try:
+        rate_limiters.set_override(connector_id, limits)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return {"status": "SUCCESS", "connector_id": connector_id, "limits": limits}
+
+@router.get("/admission")
+async def get_admission_stats():
+    """In-flight and queued query requests of the admission controller."""
+    return query_admission.stats()
+
+@router.get("/embedding-sidecar")
+async def get_embedding_sidecar_stats():
+    """Whether each model's embeddings come from the sidecar or the in-process fallback."""
+    return sidecar_stats()
+
+@router.get("/jobs")
+async def get_job_stats():
+    """Running and pending query jobs of this worker, and the jobs stored for polling."""
+    return job_manager.stats()
+
+@router.get("/logging")
+async def get_logging_stats():
+    """Active log level and records dropped because the log queue was full."""
+    return {
+        "level": logging.getLevelName(logging.getLogger(APP_LOGGER).level),
+        "dropped": dropped_records(),
+    }
@@ -1,5 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException, Body
 from app.services.vault import vault
+from app.core.log import apply_log_level
 from typing import Dict, Any
 import secrets
 import string
@@ -38,6 +39,7 @@ async def get_config():
 async def save_config(config: Dict[str, Any] = Body(...)):
     """Save the system configuration to the vault."""
     vault.store_secrets(SYSTEM_USER_ID, GLOBAL_CONFIG_ID, config)
+    apply_log_level(config.get("logLevel"))
     return {"status": "SUCCESS", "message": "Configuration saved securely."}
 
 @router.get("/api-key")
@@ -5,9 +5,13 @@ from app.db.models import Connector, ConnectorStatus
 from app.services.ingestion import parse_openapi_spec, create_connector_from_spec
 from app.services.vector_db import process_and_store_connector_chunks
 from app.services.vault import vault
+from app.services.oauth import token_manager
 from typing import Dict
+import logging
 from . import add_function
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
 
 # Include add_function routes
@@ -46,6 +50,8 @@ async def save_secrets(
     user_id = "demo-user-123"
     
     vault.store_secrets(user_id, connector_id, secrets)
+    # Tokens issued for the previous credentials
+    token_manager.forget(user_id, connector_id)
     
     connector.status = ConnectorStatus.ACTIVE
     db.commit()
@@ -83,6 +89,7 @@ async def delete_connector(
         
         # 2. Delete from Vault
         vault.delete_secrets(user_id, connector_id)
+        token_manager.forget(user_id, connector_id)
         
         # 3. Delete from SQL DB
         db.delete(connector)
@@ -90,5 +97,5 @@ async def delete_connector(
         
         return {"status": "SUCCESS", "message": "Connector deleted successfully."}
     except Exception as e:
-        print(f"Error deleting connector: {str(e)}")
+        logger.exception("Error deleting connector", extra={"connector_id": connector_id})
         raise HTTPException(status_code=500, detail=f"Failed to delete connector: {str(e)}")
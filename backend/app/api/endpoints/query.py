@@ -1,12 +1,28 @@
 from fastapi import APIRouter, HTTPException, Depends, Header
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.background import BackgroundTask
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
 from sqlalchemy.orm import Session
-from app.db.session import get_db
-from app.db.models import Connector
+from app.db.session import get_db, SessionLocal
+from app.db.models import Connector, JobStatus
+from app.core import capture
+from app.core.config import settings
+from app.core.metrics import track_request, time_stage
+from app.core.deadline import deadline_stage, DeadlineExceeded
 from app.services.vector_db import vector_db
 from app.services.executor import executor
+from app.services.projection import projection_for
+from app.services.spec_parameters import operation_parameters
+from app.services.admission import query_admission, priority_for, Overloaded
+from app.services.jobs import job_manager, check_callback_url
 import re
+import json
+import asyncio
+import logging
+from urllib.parse import quote
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
@@ -16,12 +32,34 @@ DEMO_API_KEY = "test-api-key-12345"
 class QueryRequest(BaseModel):
     query: str
     parameters: Optional[dict] = None
+    fields: Optional[List[str]] = None  # e.g. ["id", "name"] or ["$.items[*].id"]
+    max_items: Optional[int] = None  # cap for every array in the response
+    max_bytes: Optional[int] = None  # approximate budget for the returned data
+    mode: Optional[str] = None  # "sync" (default) or "job"
+    callback_url: Optional[str] = None  # job mode: the finished job is POSTed here
+
+class PaginatedQueryRequest(BaseModel):
+    query: str
+    parameters: Optional[dict] = None
+    max_items: Optional[int] = None  # total items across all pages
+    max_pages: Optional[int] = None
+
+class PlanRequest(BaseModel):
+    query: str
+    max_operations: Optional[int] = None
 
 class QueryResponse(BaseModel):
     success: bool
     data: Optional[dict | list] = None  # Can be dict or list (array)
     error: Optional[str] = None
     matched_function: Optional[dict] = None
+    projection: Optional[dict] = None  # fields kept and bytes saved, when projected
+
+class PlanResponse(BaseModel):
+    success: bool
+    results: List[dict] = []  # one entry per planned call, in plan order
+    error: Optional[str] = None
+    plan: Optional[dict] = None
 
 
 def verify_api_key(x_api_key: str = Header(...)):
@@ -30,11 +68,230 @@ def verify_api_key(x_api_key: str = Header(...)):
         raise HTTPException(status_code=401, detail="Invalid API key")
     return x_api_key
 
-@router.post("/query", response_model=QueryResponse)
+async def admit_query(api_key: str = Depends(verify_api_key)):
+    """Hold an admission slot for the request, or shed it with 503 and Retry-After."""
+    try:
+        async with query_admission.slot(priority_for(api_key)):
+            yield api_key
+    except Overloaded as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
+async def _match_function(query: str, explicit_parameters: Optional[dict], db: Session) -> dict:
+    """
+    Resolve a natural language query to a connector operation and its parameters.
+    
+    Returns a dict with connector, operation_id, path, method, parameters and
+    assessment, or a dict with a single "error" message.
+    """
+    # Search vector DB for matching functions using configured embedding model
+    # Retrieve multiple results for LLM assessment
+    async with deadline_stage("search"):
+        results = await vector_db.asearch_functions(query, n_results=5)
+    
+    if not results or not results.get("ids") or len(results["ids"][0]) == 0:
+        return {"error": "No matching connector functions found in the database. Please ensure you have uploaded and configured the necessary API connectors."}
+    
+    # Prepare candidates for LLM assessment
+    candidates = []
+    for i in range(len(results["ids"][0])):
+        candidates.append({
+            "metadata": results["metadatas"][0][i],
+            "document": results["documents"][0][i],
+            "distance": results["distances"][0][i] if "distances" in results else 0.0
+        })
+    
+    logger.debug("Candidate functions from vector DB", extra={"candidates": len(candidates), "query": query})
+    
+    # Use LLM to assess which function (if any) best matches the query
+    from app.services.llm_service import assess_function_matches
+    
+    async with deadline_stage("assessment"):
+        assessment = await assess_function_matches(query, candidates)
+    
+    logger.debug("LLM assessment", extra={"assessment": assessment})
+    
+    # Check if a suitable function was selected
+    if not assessment.get("selected"):
+        # No suitable function found
+        reasoning = assessment.get("reasoning", "No suitable function found")
+        return {"error": f"The requested data or functionality is not available. {reasoning}"}
+    
+    # Get the selected candidate
+    selected_index = assessment.get("index", 0)
+    if selected_index >= len(candidates):
+        selected_index = 0
+    
+    selected_candidate = candidates[selected_index]
+    metadata = selected_candidate["metadata"]
+    
+    connector_id = metadata["connector_id"]
+    operation_id = metadata["operation_id"]
+    path = metadata["path"]
+    method = metadata["method"]
+    
+    logger.info(
+        "Selected function",
+        extra={"operation_id": operation_id, "method": method.upper(), "path": path,
+               "confidence": assessment.get("confidence", "unknown")}
+    )
+    
+    # Get connector from database
+    with time_stage("db_lookup", connector=connector_id):
+        connector = db.query(Connector).filter(Connector.connector_id == connector_id).first()
+    if not connector:
+        return {"error": "Connector not found in database"}
+    capture.note_connector(connector)
+    
+    # Check if connector has secrets configured
+    if connector.status != "ACTIVE":
+        return {"error": f"Connector '{connector.name}' is not active. Please configure authentication secrets first."}
+    
+    # Extract parameters from the query if needed
+    parameters = explicit_parameters or {}
+    
+    # Parameter definitions resolved at ingest ($refs, path-level parameters)
+    param_definitions = operation_parameters(connector, path, method)
+    missing_required = any(p["required"] and p["name"] not in parameters for p in param_definitions)
+    
+    # If path has parameters (or required ones are missing), use LLM to extract them intelligently
+    if ("{" in path and "}" in path) or missing_required:
+        if param_definitions:
+            operation_spec = connector.full_schema_json.get("paths", {}).get(path, {}).get(method.lower(), {})
+
+            # Use LLM to extract parameters
+            from app.services.llm_service import extract_parameters_with_llm
+            
+            async with deadline_stage("extraction"):
+                try:
+                    extracted_params = await extract_parameters_with_llm(
+                        query=query,
+                        param_definitions=param_definitions,
+                        operation_summary=operation_spec.get("summary", ""),
+                        operation_description=operation_spec.get("description", "")
+                    )
+                except Exception:
+                    logger.exception("LLM parameter extraction failed")
+                    extracted_params = {}
+            
+            # Merge extracted parameters with any explicitly provided ones
+            parameters = {**extracted_params, **parameters}
+        else:
+            # Fallback to regex-based extraction if no parameter definitions
+            path_params = re.findall(r'\{(\w+)\}', path)
+            query_lower = query.lower()
+            
+            for param in path_params:
+                if param not in parameters:
+                    # Try to find numbers in the query
+                    numbers = re.findall(r'\b\d+\b', query)
+                    if numbers:
+                        parameters[param] = numbers[-1]
+    
+    logger.debug("Parameters for executor", extra={"parameters": parameters})
+    
+    return {
+        "connector": connector,
+        "operation_id": operation_id,
+        "path": path,
+        "method": method,
+        "parameters": parameters,
+        "assessment": assessment
+    }
+
+async def _run_query(request: QueryRequest, db: Session) -> QueryResponse:
+    """Match the query to a function, call it and build the response (shared by sync and job mode)."""
+    match = await _match_function(request.query, request.parameters, db)
+    if "error" in match:
+        return QueryResponse(success=False, error=match["error"])
+
+    connector = match["connector"]
+    operation_id = match["operation_id"]
+    path = match["path"]
+    method = match["method"]
+    assessment = match["assessment"]
+
+    operation_spec = connector.full_schema_json.get("paths", {}).get(path, {}).get(method.lower(), {})
+    projection = projection_for(
+        connector.full_schema_json,
+        operation_spec,
+        fields=request.fields,
+        max_items=request.max_items,
+        max_bytes=request.max_bytes
+    )
+
+    # Execute the API call
+    user_id = "demo-user-123"  # Demo user ID
+    async with deadline_stage("upstream"):
+        with time_stage("upstream", connector=connector.connector_id):
+            result = await executor.execute_function(
+                connector=connector,
+                operation_id=operation_id,
+                path=path,
+                method=method,
+                user_id=user_id,
+                parameters=match["parameters"],
+                projection=projection
+            )
+
+    if result.get("success"):
+        return QueryResponse(
+            success=True,
+            data=result.get("data"),
+            projection=result.get("projection"),
+            matched_function={
+                "connector": connector.name,
+                "operation": operation_id,
+                "path": path,
+                "method": method,
+                "assessment": {
+                    "confidence": assessment.get("confidence", "unknown"),
+                    "reasoning": assessment.get("reasoning", "N/A")
+                }
+            }
+        )
+    else:
+        return QueryResponse(
+            success=False,
+            error=result.get("error"),
+            matched_function={
+                "connector": connector.name,
+                "operation": operation_id,
+                "path": path,
+                "method": method
+            }
+        )
+
+async def _run_query_job(request: QueryRequest) -> dict:
+    """Job body: runs after the request has returned, so it opens its own database session."""
+    with track_request("query_job"):
+        db = SessionLocal()
+        try:
+            return (await _run_query(request, db)).model_dump()
+        finally:
+            db.close()
+
+async def _submit_job(request: QueryRequest) -> JSONResponse:
+    if request.callback_url:
+        try:
+            await check_callback_url(request.callback_url)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    try:
+        job_id = job_manager.submit(request.query, lambda: _run_query_job(request), request.callback_url)
+    except Overloaded as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    status_url = f"{settings.API_V1_STR}/query/jobs/{job_id}"
+    return JSONResponse(
+        status_code=202,
+        content={"job_id": job_id, "status": JobStatus.QUEUED.value, "status_url": status_url},
+        headers={"Location": status_url},
+    )
+
+@router.post("/query", response_model=QueryResponse, responses={202: {"description": "Job accepted (mode \"job\")"}})
 async def query_data(
     request: QueryRequest,
     db: Session = Depends(get_db),
-    api_key: str = Depends(verify_api_key)
+    api_key: str = Depends(admit_query)
 ):
     """
     Main endpoint for external chatbot to query data through our connectors.
@@ -44,178 +301,322 @@ async def query_data(
     2. Searches the vector DB for matching connector functions
     3. Executes the API call to the external service
     4. Returns the data to the chatbot
+    
+    With "mode": "job" it returns 202 with a job id instead, runs the query in
+    the background and keeps the result for polling at /query/jobs/{job_id}
+    (and POSTs it to callback_url, if given).
     """
-    try:
-        # Search vector DB for matching functions using configured embedding model
-        # Retrieve multiple results for LLM assessment
-        results = vector_db.search_functions(request.query, n_results=5)
+    if request.mode == "job":
+        return await _submit_job(request)
+    if request.mode not in (None, "sync"):
+        raise HTTPException(status_code=400, detail="mode must be \"sync\" or \"job\"")
+    with track_request("query"):
+        try:
+            return await _run_query(request, db)
+        except DeadlineExceeded as e:
+            logger.warning("Query deadline exceeded", extra={"stage": e.stage})
+            raise HTTPException(status_code=504, detail=str(e))
+        except Exception as e:
+            logger.exception("Query failed")
+            raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/jobs/{job_id}")
+async def get_query_job(job_id: str, api_key: str = Depends(verify_api_key)):
+    """Status of a job-mode query, with its result (a QueryResponse) once it has succeeded."""
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    return job
+
+@router.post("/query/stream", response_model=QueryResponse)
+async def query_data_stream(
+    request: QueryRequest,
+    db: Session = Depends(get_db),
+    api_key: str = Depends(verify_api_key)
+):
+    """
+    Streaming variant of /query for large upstream responses.
+    
+    Matching works exactly like /query, but the upstream body is streamed to
+    the client as-is instead of being parsed and wrapped in a QueryResponse.
+    The matched function is reported in X-Matched-* response headers. Errors
+    before streaming starts are returned as a regular QueryResponse.
+    """
+    with track_request("stream"):
+        try:
+            match = await _match_function(request.query, request.parameters, db)
+            if "error" in match:
+                return QueryResponse(success=False, error=match["error"])
         
-        if not results or not results.get("ids") or len(results["ids"][0]) == 0:
-            return QueryResponse(
-                success=False,
-                error="No matching connector functions found in the database. Please ensure you have uploaded and configured the necessary API connectors."
+            connector = match["connector"]
+            user_id = "demo-user-123"  # Demo user ID
+            stream = await executor.open_stream(
+                connector=connector,
+                path=match["path"],
+                method=match["method"],
+                user_id=user_id,
+                parameters=match["parameters"]
             )
         
-        # Prepare candidates for LLM assessment
-        candidates = []
-        for i in range(len(results["ids"][0])):
-            candidates.append({
-                "metadata": results["metadatas"][0][i],
-                "document": results["documents"][0][i],
-                "distance": results["distances"][0][i] if "distances" in results else 0.0
-            })
-        
-        print(f"[QUERY] Found {len(candidates)} candidate functions from vector DB")
-        print(f"[QUERY] User query: {request.query}")
-        
-        # Use LLM to assess which function (if any) best matches the query
-        from app.services.llm_service import assess_function_matches
+            matched_function = {
+                "connector": connector.name,
+                "operation": match["operation_id"],
+                "path": match["path"],
+                "method": match["method"]
+            }
+            if not stream.get("success"):
+                return QueryResponse(success=False, error=stream.get("error"), matched_function=matched_function)
         
-        print(f"[QUERY] Calling LLM to assess function matches...")
-        assessment = await assess_function_matches(request.query, candidates)
-        
-        print(f"[QUERY] LLM Assessment: {assessment}")
-        
-        # Check if a suitable function was selected
-        if not assessment.get("selected"):
-            # No suitable function found
-            reasoning = assessment.get("reasoning", "No suitable function found")
-            return QueryResponse(
-                success=False,
-                error=f"The requested data or functionality is not available. {reasoning}"
+            headers = {
+                "X-Matched-Connector": quote(connector.name),
+                "X-Matched-Operation": quote(match["operation_id"]),
+                "X-Matched-Path": quote(match["path"]),
+                "X-Matched-Method": match["method"].upper(),
+                "X-Match-Confidence": quote(str(match["assessment"].get("confidence", "unknown"))),
+                "X-Upstream-Status": str(stream["status_code"])
+            }
+            return StreamingResponse(
+                stream["chunks"],
+                media_type=stream["content_type"],
+                headers=headers,
+                background=BackgroundTask(stream["close"])
             )
+    
+        except DeadlineExceeded as e:
+            logger.warning("Query deadline exceeded", extra={"stage": e.stage})
+            raise HTTPException(status_code=504, detail=str(e))
+        except Exception as e:
+            logger.exception("Query failed")
+            raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/query/paginate", response_model=QueryResponse)
+async def query_data_paginated(
+    request: PaginatedQueryRequest,
+    db: Session = Depends(get_db),
+    api_key: str = Depends(verify_api_key)
+):
+    """
+    Auto-paginating variant of /query for list operations.
+    
+    Follows Link headers, next cursors or offset/page parameters and streams
+    the items of every page as NDJSON (one JSON item per line) while later
+    pages are still being fetched. The last line is a summary object under
+    the "_pagination" key. Errors before the first page are returned as a
+    regular QueryResponse.
+    """
+    with track_request("paginate"):
+        try:
+            match = await _match_function(request.query, request.parameters, db)
+            if "error" in match:
+                return QueryResponse(success=False, error=match["error"])
         
-        # Get the selected candidate
-        selected_index = assessment.get("index", 0)
-        if selected_index >= len(candidates):
-            selected_index = 0
-        
-        selected_candidate = candidates[selected_index]
-        metadata = selected_candidate["metadata"]
-        
-        connector_id = metadata["connector_id"]
-        operation_id = metadata["operation_id"]
-        path = metadata["path"]
-        method = metadata["method"]
+            connector = match["connector"]
+            user_id = "demo-user-123"  # Demo user ID
+            pages = await executor.open_pagination(
+                connector=connector,
+                path=match["path"],
+                method=match["method"],
+                user_id=user_id,
+                parameters=match["parameters"],
+                max_items=request.max_items,
+                max_pages=request.max_pages
+            )
+            if not pages.get("success"):
+                return QueryResponse(
+                    success=False,
+                    error=pages.get("error"),
+                    matched_function={
+                        "connector": connector.name,
+                        "operation": match["operation_id"],
+                        "path": match["path"],
+                        "method": match["method"]
+                    }
+                )
         
-        print(f"[QUERY] Selected function: {operation_id} ({method.upper()} {path})")
-        print(f"[QUERY] Confidence: {assessment.get('confidence', 'unknown')}")
-        print(f"[QUERY] Reasoning: {assessment.get('reasoning', 'N/A')}")
+            async def ndjson():
+                async for item in pages["items"]:
+                    yield json.dumps(item, separators=(",", ":")) + "\n"
+                yield json.dumps({"_pagination": pages["summary"]}) + "\n"
         
-        # Get connector from database
-        connector = db.query(Connector).filter(Connector.connector_id == connector_id).first()
-        if not connector:
-            return QueryResponse(
-                success=False,
-                error="Connector not found in database"
+            headers = {
+                "X-Matched-Connector": quote(connector.name),
+                "X-Matched-Operation": quote(match["operation_id"]),
+                "X-Matched-Path": quote(match["path"]),
+                "X-Matched-Method": match["method"].upper(),
+                "X-Match-Confidence": quote(str(match["assessment"].get("confidence", "unknown")))
+            }
+            return StreamingResponse(
+                ndjson(),
+                media_type="application/x-ndjson",
+                headers=headers,
+                background=BackgroundTask(pages["close"])
             )
+    
+        except DeadlineExceeded as e:
+            logger.warning("Query deadline exceeded", extra={"stage": e.stage})
+            raise HTTPException(status_code=504, detail=str(e))
+        except Exception as e:
+            logger.exception("Query failed")
+            raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/plan", response_model=PlanResponse)
+async def query_plan(
+    request: PlanRequest,
+    db: Session = Depends(get_db),
+    api_key: str = Depends(admit_query)
+):
+    """
+    Answer queries that need several independent API calls.
+    
+    The LLM plans a small set of calls (possibly the same function with
+    different parameters, or functions from different connectors). The
+    calls run concurrently, bounded by PLAN_MAX_CONCURRENCY, and their
+    results are merged into one response in plan order. A failing call is
+    reported in its own entry without cancelling the others.
+    
+    This is a sibling of /query rather than a mode of it: a plan returns one
+    result per call, which doesn't fit QueryResponse's single `data`.
+    """
+    from app.services.llm_service import plan_function_calls, extract_parameters_with_llm
+    
+    with track_request("plan"):
+        try:
+            max_operations = min(request.max_operations or settings.PLAN_MAX_OPERATIONS, settings.PLAN_MAX_OPERATIONS)
+            async with deadline_stage("search"):
+                results = await vector_db.asearch_functions(request.query, n_results=settings.PLAN_SEARCH_RESULTS)
+            if not results or not results.get("ids") or len(results["ids"][0]) == 0:
+                return PlanResponse(
+                    success=False,
+                    error="No matching connector functions found in the database. Please ensure you have uploaded and configured the necessary API connectors."
+                )
         
-        # Check if connector has secrets configured
-        if connector.status != "ACTIVE":
-            return QueryResponse(
-                success=False,
-                error=f"Connector '{connector.name}' is not active. Please configure authentication secrets first."
-            )
+            # Load every candidate connector once
+            connector_ids = {metadata["connector_id"] for metadata in results["metadatas"][0]}
+            connectors = {
+                connector.connector_id: connector
+                for connector in db.query(Connector).filter(Connector.connector_id.in_(connector_ids)).all()
+            }
         
-        # Extract parameters from the query if needed
-        parameters = request.parameters or {}
+            candidates = []
+            for i in range(len(results["ids"][0])):
+                metadata = results["metadatas"][0][i]
+                connector = connectors.get(metadata["connector_id"])
+                operation_spec = {}
+                param_definitions = []
+                if connector:
+                    operation_spec = connector.full_schema_json.get("paths", {}).get(metadata["path"], {}).get(metadata["method"].lower(), {})
+                    param_definitions = operation_parameters(connector, metadata["path"], metadata["method"])
+                candidates.append({
+                    "metadata": metadata,
+                    "document": results["documents"][0][i],
+                    "distance": results["distances"][0][i] if "distances" in results else 0.0,
+                    "parameters": param_definitions,
+                    "operation_spec": operation_spec
+                })
         
-        print(f"[QUERY] Matched path: {path}")
-        print(f"[QUERY] Matched method: {method}")
+            async with deadline_stage("planning"):
+                plan = await plan_function_calls(request.query, candidates, max_operations)
+            logger.info("Operations planned", extra={"operations": len(plan["operations"])})
+            logger.debug("Plan reasoning", extra={"reasoning": plan.get("reasoning", "N/A")})
+            plan_info = {
+                "operations": len(plan["operations"]),
+                "confidence": plan.get("confidence", "unknown"),
+                "reasoning": plan.get("reasoning", "N/A")
+            }
+            if not plan.get("selected"):
+                return PlanResponse(
+                    success=False,
+                    error=f"The requested data or functionality is not available. {plan.get('reasoning', '')}",
+                    plan=plan_info
+                )
         
-        # If path has parameters, use LLM to extract them intelligently
-        if "{" in path and "}" in path:
-            print(f"[QUERY] Path contains parameters, attempting extraction...")
-            
-            # Get the operation details from the OpenAPI spec
-            spec = connector.full_schema_json
-            operation_spec = spec.get("paths", {}).get(path, {}).get(method.lower(), {})
-            
-            # Get parameter definitions
-            param_definitions = operation_spec.get("parameters", [])
-            
-            print(f"[QUERY] Found {len(param_definitions)} parameter definitions")
+            semaphore = asyncio.Semaphore(max(1, settings.PLAN_MAX_CONCURRENCY))
+            user_id = "demo-user-123"  # Demo user ID
+        
+            async def run(operation: dict) -> dict:
+                candidate = candidates[operation["index"]]
+                metadata = candidate["metadata"]
+                connector = connectors.get(metadata["connector_id"])
+                matched_function = {
+                    "connector": connector.name if connector else None,
+                    "operation": metadata["operation_id"],
+                    "path": metadata["path"],
+                    "method": metadata["method"]
+                }
+                if not connector:
+                    return {"success": False, "error": "Connector not found in database", "matched_function": matched_function}
+                if connector.status != "ACTIVE":
+                    return {
+                        "success": False,
+                        "error": f"Connector '{connector.name}' is not active. Please configure authentication secrets first.",
+                        "matched_function": matched_function
+                    }
             
-            if param_definitions:
-                # Use LLM to extract parameters
-                from app.services.llm_service import extract_parameters_with_llm
-                
-                print(f"[QUERY] Calling LLM for parameter extraction...")
+                parameters = dict(operation["parameters"])
+                missing_required = any(p["required"] and p["name"] not in parameters for p in candidate["parameters"])
                 try:
-                    extracted_params = await extract_parameters_with_llm(
-                        query=request.query,
-                        param_definitions=param_definitions,
-                        operation_summary=operation_spec.get("summary", ""),
-                        operation_description=operation_spec.get("description", "")
-                    )
-                    print(f"[QUERY] LLM extracted parameters: {extracted_params}")
+                    async with semaphore:
+                        if missing_required:
+                            # Planner left required parameters out, extract them separately
+                            operation_spec = candidate["operation_spec"]
+                            async with deadline_stage("extraction"):
+                                extracted = await extract_parameters_with_llm(
+                                    query=request.query,
+                                    param_definitions=candidate["parameters"],
+                                    operation_summary=operation_spec.get("summary", ""),
+                                    operation_description=operation_spec.get("description", "")
+                                )
+                            parameters = {**extracted, **parameters}
+                    
+                        async with deadline_stage("upstream"):
+                            with time_stage("upstream", connector=connector.connector_id):
+                                result = await executor.execute_function(
+                                    connector=connector,
+                                    operation_id=metadata["operation_id"],
+                                    path=metadata["path"],
+                                    method=metadata["method"],
+                                    user_id=user_id,
+                                    parameters=parameters
+                                )
+                except DeadlineExceeded:
+                    # The deadline is shared, so the other calls are out of time too
+                    raise
                 except Exception as e:
-                    print(f"[QUERY] LLM extraction failed: {e}")
-                    import traceback
-                    traceback.print_exc()
-                    extracted_params = {}
-                
-                # Merge extracted parameters with any explicitly provided ones
-                parameters = {**extracted_params, **parameters}
-            else:
-                print(f"[QUERY] No parameter definitions, using fallback regex extraction")
-                # Fallback to regex-based extraction if no parameter definitions
-                path_params = re.findall(r'\{(\w+)\}', path)
-                query_lower = request.query.lower()
-                
-                for param in path_params:
-                    if param not in parameters:
-                        # Try to find numbers in the query
-                        numbers = re.findall(r'\b\d+\b', request.query)
-                        if numbers:
-                            parameters[param] = numbers[-1]
-                            print(f"[QUERY] Regex extracted {param} = {numbers[-1]}")
-        
-        print(f"[QUERY] Final parameters to pass to executor: {parameters}")
-        
-        # Execute the API call
-        user_id = "demo-user-123"  # Demo user ID
-        result = await executor.execute_function(
-            connector=connector,
-            operation_id=operation_id,
-            path=path,
-            method=method,
-            user_id=user_id,
-            parameters=parameters
-        )
-        
-        if result.get("success"):
-            return QueryResponse(
-                success=True,
-                data=result.get("data"),
-                matched_function={
-                    "connector": connector.name,
-                    "operation": operation_id,
-                    "path": path,
-                    "method": method,
-                    "assessment": {
-                        "confidence": assessment.get("confidence", "unknown"),
-                        "reasoning": assessment.get("reasoning", "N/A")
-                    }
-                }
-            )
-        else:
-            return QueryResponse(
-                success=False,
-                error=result.get("error"),
-                matched_function={
-                    "connector": connector.name,
-                    "operation": operation_id,
-                    "path": path,
-                    "method": method
+                    # One failed call must not cancel its siblings
+                    logger.exception("Planned call failed", extra={"operation": metadata["operation_id"]})
+                    return {"success": False, "error": str(e), "parameters": parameters, "matched_function": matched_function}
+                return {
+                    "success": bool(result.get("success")),
+                    "data": result.get("data"),
+                    "error": result.get("error"),
+                    "parameters": parameters,
+                    "matched_function": matched_function
                 }
+        
+            calls = [asyncio.ensure_future(run(operation)) for operation in plan["operations"]]
+            try:
+                outcomes = await asyncio.gather(*calls)
+            except BaseException:
+                # Deadline exceeded (or the request cancelled): stop the other calls
+                # instead of leaving them running with no one to collect their results
+                for call in calls:
+                    call.cancel()
+                await asyncio.gather(*calls, return_exceptions=True)
+                raise
+            failed = [outcome for outcome in outcomes if not outcome["success"]]
+            return PlanResponse(
+                success=len(failed) < len(outcomes),
+                results=outcomes,
+                error=f"{len(failed)} of {len(outcomes)} planned calls failed" if failed else None,
+                plan=plan_info
             )
-            
-    except Exception as e:
-        print(f"[QUERY] Exception occurred: {e}")
-        import traceback
-        traceback.print_exc()
-        raise HTTPException(status_code=500, detail=str(e))
+    
+        except DeadlineExceeded as e:
+            logger.warning("Plan deadline exceeded", extra={"stage": e.stage})
+            raise HTTPException(status_code=504, detail=str(e))
+        except Exception as e:
+            logger.exception("Plan failed")
+            raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/test-key")
 def get_test_api_key():
@@ -0,0 +1,382 @@
+"""
+Opt-in traffic capture for offline replay (CAPTURE_ENABLED).
+
+`CaptureMiddleware` records sampled requests to the captured endpoints
+together with what the pipeline observed while serving them:
+- `vector`: the function search results
+- `llm`: provider responses, keyed by provider, model and a hash of the prompt
+- `upstream`: upstream API responses
+
+It also snapshots every connector a request touched. Each event carries its
+start offset and duration, so replay can keep the original timing.
+
+Records are sanitized before they leave the process:
+- headers are dropped except X-Request-Timeout, so API keys and credentials
+  are never written
+- JSON fields and URL query parameters whose names look sensitive
+  (CAPTURE_REDACT_FIELDS) are replaced with "[REDACTED]"
+- large bodies are truncated
+
+A background thread writes them as gzip-compressed JSON lines to rotating
+files in CAPTURE_PATH. Each file repeats the connector snapshots it needs, so
+it can be replayed on its own.
+
+With CAPTURE_REPLAY_PATH set, function search is answered from the recorded
+results instead (see `benchmarks/replay.py`).
+"""
+import contextvars
+import glob
+import gzip
+import hashlib
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+REDACTED = "[REDACTED]"
+
+# Request headers worth keeping: they change how the request is served
+_KEPT_HEADERS = {b"x-request-timeout"}
+
+# Upstream response headers replay needs to answer like the original
+UPSTREAM_RESPONSE_HEADERS = ("content-type", "cache-control", "etag", "expires", "retry-after", "link")
+
+_current: contextvars.ContextVar[Optional["CapturedRequest"]] = contextvars.ContextVar("captured_request", default=None)
+
+
+def _is_sensitive(name: str) -> bool:
+    name = name.lower()
+    return name == "key" or any(fragment in name for fragment in settings.CAPTURE_REDACT_FIELDS)
+
+
+def sanitize(value: Any) -> Any:
+    """Copy of a JSON value with sensitive-looking fields redacted."""
+    if isinstance(value, dict):
+        return {key: REDACTED if _is_sensitive(str(key)) else sanitize(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [sanitize(item) for item in value]
+    return value
+
+
+def sanitize_url(url: str) -> str:
+    """URL with the values of sensitive-looking query parameters redacted."""
+    parts = urlsplit(url)
+    if not parts.query:
+        return url
+    query = [(name, REDACTED if _is_sensitive(name) else value) for name, value in parse_qsl(parts.query, keep_blank_values=True)]
+    return urlunsplit(parts._replace(query=urlencode(query, safe=REDACTED + "[]")))
+
+
+def prompt_key(prompt: str) -> str:
+    return hashlib.sha256(prompt.encode()).hexdigest()[:16]
+
+
+def capture_body(content: bytes) -> Dict[str, Any]:
+    """
+    Sanitized JSON body, or (truncated) text for anything else. JSON over
+    CAPTURE_MAX_BODY_BYTES is neither parsed nor kept: a truncated prefix
+    couldn't be redacted, so only its size is recorded.
+    """
+    limit = settings.CAPTURE_MAX_BODY_BYTES
+    if len(content) > limit and content.lstrip()[:1] in (b"{", b"["):
+        return {"omitted": len(content)}
+    try:
+        return {"json": sanitize(json.loads(content))}
+    except (ValueError, UnicodeDecodeError):
+        pass
+    body = {"text": content[:limit].decode("utf-8", errors="replace")}
+    if len(content) > limit:
+        body["truncated"] = len(content)
+    return body
+
+
+def llm_body(content: bytes) -> Dict[str, Any]:
+    """
+    An LLM provider response for the `body` of an "llm" event. It is kept
+    verbatim, not sanitized, since replay serves it back to the app as is;
+    over CAPTURE_MAX_BODY_BYTES only its size is recorded (as `omitted`).
+    """
+    if len(content) > settings.CAPTURE_MAX_BODY_BYTES:
+        return {"body": None, "omitted": len(content)}
+    return {"body": content.decode("utf-8", errors="replace")}
+
+
+def _json_default(value: Any) -> Any:
+    # numpy scalars and arrays in vector search results
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    return str(value)
+
+
+class CapturedRequest:
+    def __init__(self, endpoint: str):
+        self.endpoint = endpoint
+        self.start = time.monotonic()
+        self.events: List[Dict[str, Any]] = []
+        self.connectors: Dict[str, Dict[str, Any]] = {}
+
+    def add(self, kind: str, started: float, **fields: Any) -> None:
+        self.events.append({
+            "kind": kind,
+            "at_ms": round((started - self.start) * 1000, 3),
+            "duration_ms": round((time.monotonic() - started) * 1000, 3),
+            **fields,
+        })
+
+
+def capturing() -> bool:
+    """Whether the current request is being captured (to skip building events otherwise)."""
+    return _current.get() is not None
+
+
+def record(kind: str, started: float, **fields: Any) -> None:
+    """Add an event (started at `started`, ending now) to the request being captured, if any."""
+    captured = _current.get()
+    if captured is not None:
+        captured.add(kind, started, **fields)
+
+
+def detach() -> None:
+    """Stop recording into the captured request from this context (for background work that outlives it)."""
+    _current.set(None)
+
+
+def note_connector(connector) -> None:
+    """Snapshot a connector the request being captured uses, if any."""
+    captured = _current.get()
+    if captured is None or connector.connector_id in captured.connectors:
+        return
+    captured.connectors[connector.connector_id] = {
+        "connector_id": connector.connector_id,
+        "name": connector.name,
+        "description": connector.description,
+        "version": connector.version,
+        "auth_type": connector.auth_type,
+        "status": getattr(connector.status, "value", connector.status),
+        "full_schema_json": sanitize(connector.full_schema_json),
+        "operation_parameters": connector.operation_parameters,
+    }
+
+
+class CaptureWriter:
+    """Background writer of capture records to rotating gzip JSON-lines files."""
+
+    def __init__(self, directory: str, max_file_bytes: int, max_files: int):
+        self.directory = directory
+        self.max_file_bytes = max_file_bytes
+        self.max_files = max_files
+        self.queue: queue.Queue = queue.Queue(maxsize=settings.CAPTURE_QUEUE_SIZE)
+        self.written = 0
+        self.dropped = 0
+        self._file = None
+        self._file_bytes = 0
+        self._file_connectors: set = set()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="traffic-capture", daemon=True)
+        os.makedirs(directory, exist_ok=True)
+        self._thread.start()
+
+    def submit(self, entry: Dict[str, Any]) -> None:
+        try:
+            self.queue.put_nowait(entry)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self) -> None:
+        while not (self._stop.is_set() and self.queue.empty()):
+            try:
+                entry = self.queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            try:
+                self._write(entry)
+            except Exception as e:
+                # Capture is best effort; never let it take the service down
+                sys.stderr.write(f"Traffic capture write failed: {e}\n")
+
+    def _write(self, entry: Dict[str, Any]) -> None:
+        if self._file is None or self._file_bytes >= self.max_file_bytes:
+            self._rotate()
+        connectors = entry.pop("connectors", {})
+        lines = [
+            {"type": "connector", **snapshot}
+            for connector_id, snapshot in connectors.items() if connector_id not in self._file_connectors
+        ]
+        self._file_connectors.update(connectors)
+        lines.append(entry)
+        data = "".join(json.dumps(line, separators=(",", ":"), default=_json_default) + "\n" for line in lines)
+        self._file.write(data)
+        self._file.flush()
+        self._file_bytes += len(data)
+        self.written += 1
+
+    def _rotate(self) -> None:
+        if self._file is not None:
+            self._file.close()
+        name = f"capture-{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}-{int(time.time() * 1000) % 1000:03d}.jsonl.gz"
+        self._file = gzip.open(os.path.join(self.directory, name), "wt", encoding="utf-8")
+        self._file_bytes = 0
+        self._file_connectors = set()
+        self._file.write(json.dumps({"type": "header", "version": FORMAT_VERSION, "pid": os.getpid()}) + "\n")
+        files = sorted(glob.glob(os.path.join(self.directory, "capture-*.jsonl.gz")), key=os.path.getmtime)
+        for old in files[:-self.max_files] if self.max_files > 0 else []:
+            os.remove(old)
+
+    def shutdown(self) -> None:
+        self._stop.set()
+        self._thread.join(timeout=5.0)
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+_writer: Optional[CaptureWriter] = None
+
+
+def setup_capture() -> None:
+    global _writer
+    if settings.CAPTURE_ENABLED and _writer is None:
+        _writer = CaptureWriter(settings.CAPTURE_PATH, settings.CAPTURE_MAX_FILE_BYTES, settings.CAPTURE_MAX_FILES)
+        logger.warning("Traffic capture enabled", extra={"path": settings.CAPTURE_PATH, "sample_rate": settings.CAPTURE_SAMPLE_RATE})
+
+
+def shutdown_capture() -> None:
+    global _writer
+    if _writer is not None:
+        _writer.shutdown()
+        _writer = None
+
+
+metrics.collector(
+    "capture_records_total", "counter", "Captured requests written (outcome=written) or dropped on a full queue",
+    lambda: [({"outcome": "written"}, _writer.written), ({"outcome": "dropped"}, _writer.dropped)] if _writer else [],
+)
+
+
+class CaptureMiddleware:
+    """ASGI middleware that captures a sample of requests to the given paths."""
+
+    def __init__(self, app, paths: Tuple[str, ...]):
+        self.app = app
+        self.paths = set(paths)
+
+    async def __call__(self, scope, receive, send):
+        if (
+            _writer is None or scope["type"] != "http" or scope["path"] not in self.paths
+            or random.random() >= settings.CAPTURE_SAMPLE_RATE
+        ):
+            return await self.app(scope, receive, send)
+
+        captured = CapturedRequest(scope["path"])
+        body = bytearray()
+        status = 0
+
+        async def receive_recording():
+            message = await receive()
+            if message["type"] == "http.request":
+                body.extend(message.get("body", b""))
+            return message
+
+        async def send_recording(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        token = _current.set(captured)
+        try:
+            await self.app(scope, receive_recording, send_recording)
+        finally:
+            _current.reset(token)
+            request = capture_body(bytes(body)) if body else {}
+            _writer.submit({
+                "type": "request",
+                "ts": time.time(),
+                "endpoint": scope["path"],
+                "method": scope["method"],
+                "headers": {
+                    name.decode("latin-1"): value.decode("latin-1")
+                    for name, value in scope.get("headers", []) if name in _KEPT_HEADERS
+                },
+                "body": request.get("json", request.get("text")),
+                "status": status,
+                "duration_ms": round((time.monotonic() - captured.start) * 1000, 3),
+                "events": captured.events,
+                "connectors": captured.connectors,
+            })
+
+
+def read_capture(paths: List[str]):
+    """Yield the lines of capture files (directories are expanded to their capture-*.jsonl.gz files)."""
+    files: List[str] = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob.glob(os.path.join(path, "capture-*.jsonl.gz")), key=os.path.getmtime))
+        else:
+            files.append(path)
+    for path in files:
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+class _ReplayedSearches:
+    """Recorded function search results by query, served in recorded order."""
+
+    def __init__(self, paths: List[str]):
+        self._results: Dict[Tuple[str, int], List[Tuple[Dict[str, Any], float]]] = defaultdict(list)
+        self._next: Dict[Tuple[str, int], int] = defaultdict(int)
+        self._lock = threading.Lock()
+        for line in read_capture(paths):
+            for event in line.get("events", []) if line.get("type") == "request" else []:
+                if event["kind"] == "vector":
+                    self._results[(event["query"], event["n_results"])].append((event["result"], event["duration_ms"]))
+
+    def get(self, query: str, n_results: int) -> Optional[Tuple[Dict[str, Any], float]]:
+        key = (query, n_results)
+        with self._lock:
+            recorded = self._results.get(key)
+            if not recorded:
+                return None
+            index = self._next[key] % len(recorded)
+            self._next[key] += 1
+        return recorded[index]
+
+
+_replayed: Optional[_ReplayedSearches] = None
+
+
+def replayed_search(query: str, n_results: int) -> Optional[Dict[str, Any]]:
+    """
+    Recorded search results for a query when replaying (None when not
+    replaying or not recorded), after the recorded duration scaled by
+    CAPTURE_REPLAY_SPEED.
+    """
+    global _replayed
+    if not settings.CAPTURE_REPLAY_PATH:
+        return None
+    if _replayed is None:
+        _replayed = _ReplayedSearches(settings.CAPTURE_REPLAY_PATH.split(os.pathsep))
+    recorded = _replayed.get(query, n_results)
+    if recorded is None:
+        return None
+    result, duration_ms = recorded
+    if settings.CAPTURE_REPLAY_SPEED > 0:
+        # Called from the search worker thread (asearch_functions), like a real search
+        time.sleep(duration_ms / 1000 / settings.CAPTURE_REPLAY_SPEED)
+    return result
@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import Dict, List, Optional
 
 class Settings(BaseSettings):
     PROJECT_NAME: str = "AI API Connector"
@@ -14,7 +14,31 @@ class Settings(BaseSettings):
     SQLALCHEMY_DATABASE_URI: str = "sqlite:///./sql_app.db"
     
     # Vector DB
+    VECTOR_BACKEND: str = "chroma"  # chroma | numpy (see migrate_vectors.py to switch)
     CHROMA_DB_PATH: str = "./chroma_db"
+    VECTOR_STORE_PATH: str = "./vector_store"  # numpy backend
+    VECTOR_DTYPE: str = "float32"  # float32 | float16 | int8 (numpy backend)
+    VECTOR_RESCORE_CANDIDATES: int = 50  # re-scored exactly when VECTOR_DTYPE is compact (0 = off)
+    VECTOR_INDEX: str = "exact"  # exact | hnsw (numpy backend, requires hnswlib)
+    VECTOR_HNSW_EF: int = 100
+
+    # ONNX Runtime embeddings (embedding provider "onnx"); the model directory
+    # is downloaded from Hugging Face on first use unless a path is given
+    ONNX_EMBEDDING_MODEL_PATH: Optional[str] = None
+    ONNX_EMBEDDING_FILE: str = "onnx/model.onnx"  # int8: onnx/model_quint8_avx2.onnx or onnx/model_qint8_avx512.onnx
+    ONNX_NUM_THREADS: int = 0  # intra-op threads (0 = one per physical core)
+    ONNX_BATCH_SIZE: int = 32
+    ONNX_MAX_SEQUENCE_LENGTH: int = 256
+    ONNX_TOKENIZER_CACHE_SIZE: int = 4096  # tokenized texts kept (LRU)
+
+    # Shared embedding sidecar (embedding provider "sidecar"): http://host:port or unix:///path
+    EMBEDDING_SIDECAR_URL: str = "http://127.0.0.1:8100"
+    EMBEDDING_SIDECAR_TIMEOUT: float = 2.0  # per EMBEDDING_SIDECAR_MAX_BATCH texts of a call
+    EMBEDDING_SIDECAR_HEALTH_TIMEOUT: float = 1.0
+    EMBEDDING_SIDECAR_RETRY_INTERVAL: float = 30.0  # seconds on the fallback before checking the sidecar again
+    EMBEDDING_SIDECAR_FALLBACK: str = "local"  # in-process provider while the sidecar is down: local | onnx
+    EMBEDDING_SIDECAR_MAX_BATCH: int = 64  # sidecar side: texts per model call
+    EMBEDDING_SIDECAR_BATCH_WAIT_MS: float = 2.0  # sidecar side: how long a batch waits for more requests
     
     # Vault
     VAULT_PATH: str = "./vault"
@@ -24,6 +48,127 @@ class Settings(BaseSettings):
     OPENAI_API_KEY: Optional[str] = None
     ANTHROPIC_API_KEY: Optional[str] = None
 
+    # LLM provider rate governor: limits per "provider/model" or "provider",
+    # e.g. '{"openai": {"rpm": 500, "tpm": 200000, "max_concurrency": 8}}'
+    LLM_RATE_LIMITS: Dict[str, Dict[str, float]] = {}
+    LLM_MAX_CONCURRENCY: int = 0  # default per model when not in LLM_RATE_LIMITS (0 = unlimited)
+    LLM_GOVERNOR_MAX_WAIT: float = 10.0  # give up (and fall back) when the budget won't free up sooner
+    LLM_MAX_RETRIES: int = 2  # retries of 429 responses
+
+    # Provider endpoints (override to use a proxy, a compatible server or the benchmark mocks)
+    OPENAI_BASE_URL: str = "https://api.openai.com"
+    ANTHROPIC_BASE_URL: str = "https://api.anthropic.com"
+    GOOGLE_AI_BASE_URL: str = "https://generativelanguage.googleapis.com"
+
+    # Logging (the runtime level follows `logLevel` in the system configuration)
+    LOG_LEVEL: str = "INFO"
+    LOG_FORMAT: str = "text"  # text | json
+    LOG_QUEUE_SIZE: int = 10000
+    LOG_DEBUG_SAMPLE_RATE: float = 1.0  # fraction of requests whose DEBUG records are kept
+
+    # Request tracing
+    TRACING_EXPORTER: str = "none"  # none | console | file | otlp
+    TRACING_SAMPLE_RATE: float = 0.1  # fraction of new traces recorded; incoming traceparent decides otherwise
+    TRACING_FILE_PATH: str = "./traces/spans.jsonl"
+    TRACING_OTLP_ENDPOINT: str = "http://localhost:4318/v1/traces"
+
+    # Upstream response cache (GET only, opt-in)
+    RESPONSE_CACHE_ENABLED: bool = False
+    RESPONSE_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    RESPONSE_CACHE_MAX_ENTRY_BYTES: int = 4 * 1024 * 1024
+
+    # Upstream calls: timeout, retries (idempotent methods only) and circuit breaker
+    UPSTREAM_TIMEOUT: float = 30.0
+    UPSTREAM_MAX_RETRIES: int = 2
+    UPSTREAM_RETRY_BACKOFF_BASE: float = 0.2
+    UPSTREAM_RETRY_BACKOFF_MAX: float = 5.0
+    UPSTREAM_RETRY_STATUSES: List[int] = [429, 502, 503, 504]
+    CIRCUIT_BREAKER_FAILURE_THRESHOLD: int = 5
+    CIRCUIT_BREAKER_RESET_TIMEOUT: float = 30.0
+
+    # Outbound limits applied when neither the connector settings nor the
+    # spec's x-rate-limit extension define them (None / 0 = unlimited)
+    UPSTREAM_DEFAULT_RATE_LIMIT: Optional[float] = None
+    UPSTREAM_DEFAULT_MAX_CONCURRENCY: int = 0
+
+    # Streaming pass-through (/query/query/stream)
+    STREAM_MAX_BYTES: int = 100 * 1024 * 1024
+    STREAM_CHUNK_SIZE: int = 64 * 1024
+
+    # Response projection defaults (None = no limit)
+    PROJECTION_MAX_ITEMS: Optional[int] = None
+    PROJECTION_MAX_BYTES: Optional[int] = None
+
+    # Auto-pagination (/query/query/paginate)
+    PAGINATION_MAX_PAGES: int = 50
+    PAGINATION_MAX_ITEMS: int = 10000
+    PAGINATION_CONCURRENCY: int = 3
+    PAGINATION_PAGE_SIZE: int = 100
+
+    # Multi-operation plans (/query/plan)
+    PLAN_MAX_OPERATIONS: int = 5
+    PLAN_MAX_CONCURRENCY: int = 4
+    PLAN_SEARCH_RESULTS: int = 8
+
+    # Deadline of query requests in seconds (clients may ask for less, or up to the max, with X-Request-Timeout)
+    REQUEST_DEADLINE_DEFAULT: float = 60.0
+    REQUEST_DEADLINE_MAX: float = 300.0
+
+    # Admission control for /query/query (0 in-flight = unlimited); classes: high, normal, low
+    ADMISSION_MAX_IN_FLIGHT: int = 64
+    ADMISSION_MAX_QUEUE: int = 128
+    ADMISSION_MAX_WAIT: float = 2.0
+    ADMISSION_DEFAULT_PRIORITY: str = "normal"
+    ADMISSION_KEY_PRIORITIES: Dict[str, str] = {}  # API key -> class, e.g. '{"key-1": "high"}'
+
+    # Share one upstream call between identical concurrent GETs
+    UPSTREAM_COALESCE_ENABLED: bool = True
+
+    # OAuth2 upstreams (x-auth-type: oauth2); times in seconds
+    OAUTH_TOKEN_TIMEOUT: float = 10.0
+    OAUTH_REFRESH_AHEAD: float = 120.0
+    OAUTH_EXPIRY_MARGIN: float = 10.0
+    OAUTH_DEFAULT_TOKEN_TTL: float = 3600.0
+
+    # Traffic capture for offline replay (opt-in): sampled /query/query and
+    # /agent/query requests with their vector, LLM and upstream results
+    CAPTURE_ENABLED: bool = False
+    CAPTURE_PATH: str = "./captures"
+    CAPTURE_SAMPLE_RATE: float = 1.0
+    CAPTURE_MAX_FILE_BYTES: int = 64 * 1024 * 1024  # uncompressed, per file
+    CAPTURE_MAX_FILES: int = 8
+    CAPTURE_MAX_BODY_BYTES: int = 256 * 1024
+    CAPTURE_QUEUE_SIZE: int = 1000
+    CAPTURE_REDACT_FIELDS: List[str] = ["password", "secret", "token", "api_key", "apikey", "authorization", "cookie", "credential"]
+    # Replay (benchmarks/replay.py): serve function search from these capture
+    # files/directories (os.pathsep-separated), at recorded duration / speed (0 = no delay)
+    CAPTURE_REPLAY_PATH: Optional[str] = None
+    CAPTURE_REPLAY_SPEED: float = 1.0
+
+    # On-demand profiling of /query/query: requests sending X-Profile with the
+    # admin token, and/or a random sample; profiler: "cprofile" or "pyinstrument"
+    PROFILING_ADMIN_TOKEN: Optional[str] = None
+    PROFILING_SAMPLE_RATE: float = 0.0
+    PROFILING_PROFILER: str = "cprofile"
+    PROFILING_DIR: str = "./profiles"
+    PROFILING_TRACEMALLOC: bool = False  # always trace allocations (admin requests can ask with X-Profile-Allocations)
+    PROFILING_TRACEMALLOC_FRAMES: int = 10
+
+    # Job mode of /query/query ("mode": "job"): the call runs in the background
+    # and its result is polled at /query/jobs/{job_id} or POSTed to callback_url
+    JOB_MAX_CONCURRENCY: int = 8  # jobs running at once, per worker
+    JOB_MAX_PENDING: int = 256  # queued + running jobs per worker before new ones get 503
+    JOB_TIMEOUT: float = 900.0  # deadline of a whole job
+    JOB_UPSTREAM_TIMEOUT: float = 300.0  # per upstream attempt, instead of UPSTREAM_TIMEOUT
+    JOB_RESULT_TTL: float = 3600.0  # seconds a finished job can be polled
+    JOB_MAX_RESULT_BYTES: int = 10 * 1024 * 1024  # larger results fail the job (use fields/max_bytes)
+    JOB_STORE_MAX_BYTES: int = 256 * 1024 * 1024  # oldest finished results are evicted beyond this
+    JOB_CALLBACK_TIMEOUT: float = 10.0
+    JOB_CALLBACK_RETRIES: int = 3
+    JOB_CALLBACK_SECRET: Optional[str] = None  # signs callbacks: X-Job-Signature: sha256=<HMAC of the body>
+    # Callback hosts (".example.com" = its subdomains); empty = any host resolving to public addresses only
+    JOB_CALLBACK_ALLOWED_HOSTS: List[str] = []
+
     class Config:
         env_file = ".env"
 
@@ -0,0 +1,153 @@
+"""
+Request deadlines for the query pipeline.
+
+`DeadlineMiddleware` gives every query request a deadline: the client's
+`X-Request-Timeout` (seconds, capped at REQUEST_DEADLINE_MAX) or
+REQUEST_DEADLINE_DEFAULT. Pipeline stages run inside `deadline_stage`, which
+cancels the stage's in-flight LLM or upstream call when the time left runs out
+and raises `DeadlineExceeded`. The middleware also cancels the request when the
+client disconnects before the response starts, so abandoned requests stop
+consuming LLM and upstream capacity.
+"""
+import asyncio
+import contextvars
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Optional
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+DEADLINE_HEADER = "X-Request-Timeout"
+
+DEADLINE_EXCEEDED = metrics.counter(
+    "deadline_exceeded_total", "Pipeline stages cut off by the request deadline", ("stage",)
+)
+CLIENT_DISCONNECTS = metrics.counter(
+    "client_disconnects_total", "Requests cancelled because the client disconnected before the response", ("path",)
+)
+
+# Absolute deadline (time.monotonic()) of the current request
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("request_deadline", default=None)
+
+
+class DeadlineExceeded(Exception):
+    def __init__(self, stage: str):
+        super().__init__(f"Request deadline exceeded during {stage}")
+        self.stage = stage
+
+
+def remaining() -> Optional[float]:
+    """Seconds left before the current request's deadline (None without a deadline)."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def check_deadline(stage: str) -> None:
+    """Raise `DeadlineExceeded` if the deadline has passed (for stages that can't be cancelled)."""
+    left = remaining()
+    if left is not None and left <= 0:
+        DEADLINE_EXCEEDED.labels(stage=stage).inc()
+        raise DeadlineExceeded(stage)
+
+
+@contextmanager
+def request_deadline(seconds: float):
+    """Run the code inside with its own deadline, `seconds` from now (for work that outlives its request)."""
+    token = _deadline.set(time.monotonic() + seconds)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+@asynccontextmanager
+async def deadline_stage(stage: str):
+    """Run a stage with the time left; overrunning cancels it and raises `DeadlineExceeded`."""
+    left = remaining()
+    if left is None:
+        yield
+        return
+    check_deadline(stage)
+    timeout = asyncio.timeout(left)
+    try:
+        async with timeout:
+            yield
+    except TimeoutError:
+        if not timeout.expired():
+            raise
+        DEADLINE_EXCEEDED.labels(stage=stage).inc()
+        raise DeadlineExceeded(stage) from None
+
+
+def _requested_timeout(scope) -> float:
+    for name, value in scope.get("headers", []):
+        if name == DEADLINE_HEADER.lower().encode():
+            try:
+                seconds = float(value.decode("latin-1"))
+            except ValueError:
+                break
+            if seconds > 0:
+                return min(seconds, settings.REQUEST_DEADLINE_MAX)
+            break
+    return settings.REQUEST_DEADLINE_DEFAULT
+
+
+class DeadlineMiddleware:
+    """
+    ASGI middleware that sets the deadline of query requests and cancels them
+    when the client disconnects before the response has started.
+    """
+
+    def __init__(self, app, path_prefix: str):
+        self.app = app
+        self.path_prefix = path_prefix
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(self.path_prefix):
+            return await self.app(scope, receive, send)
+
+        token = _deadline.set(time.monotonic() + _requested_timeout(scope))
+        task = asyncio.current_task()
+        disconnected = asyncio.Event()
+        response_started = False
+        watcher: Optional[asyncio.Task] = None
+
+        async def watch():
+            # Sole reader of `receive` once the request body is in
+            while (await receive())["type"] != "http.disconnect":
+                pass
+            disconnected.set()
+            if not response_started:
+                task.cancel()
+
+        async def receive_once_body_is_read():
+            nonlocal watcher
+            if watcher is not None:
+                await disconnected.wait()
+                return {"type": "http.disconnect"}
+            message = await receive()
+            if message["type"] == "http.request" and not message.get("more_body", False):
+                watcher = asyncio.get_running_loop().create_task(watch())
+            elif message["type"] == "http.disconnect":
+                disconnected.set()
+            return message
+
+        async def send_tracking_start(message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, receive_once_body_is_read, send_tracking_start)
+        except asyncio.CancelledError:
+            if not disconnected.is_set() or response_started:
+                raise
+            # Nobody is waiting for this response any more
+            task.uncancel()
+            CLIENT_DISCONNECTS.labels(path=scope["path"]).inc()
+        finally:
+            if watcher is not None:
+                watcher.cancel()
+            _deadline.reset(token)
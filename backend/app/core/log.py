@@ -0,0 +1,168 @@
+"""
+Structured, non-blocking logging.
+
+Application modules log through `logging.getLogger(__name__)` under the "app"
+logger. Records are handed to a bounded in-memory queue and written by a
+background thread, so request handlers never block on stdout. Every record
+carries the current request's correlation id, and DEBUG records are sampled
+per request.
+"""
+import contextvars
+import json
+import logging
+import queue
+import random
+import sys
+import uuid
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+APP_LOGGER = "app"
+REQUEST_ID_HEADER = "x-request-id"
+
+request_id_var: contextvars.ContextVar[str] = contextvars.ContextVar("request_id", default="-")
+debug_sampled_var: contextvars.ContextVar[bool] = contextvars.ContextVar("debug_sampled", default=True)
+
+# Attributes of a plain LogRecord; anything else was passed through `extra`
+_RESERVED = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "request_id"}
+
+_listener: Optional[QueueListener] = None
+
+
+class _ContextFilter(logging.Filter):
+    """Attach the correlation id and drop DEBUG records of unsampled requests."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return record.levelno > logging.DEBUG or debug_sampled_var.get()
+
+
+class _DroppingQueueHandler(QueueHandler):
+    """QueueHandler that drops records instead of blocking when the queue is full."""
+
+    dropped = 0
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _DroppingQueueHandler.dropped += 1
+
+
+def _extra_fields(record: logging.LogRecord) -> dict:
+    return {key: value for key, value in vars(record).items() if key not in _RESERVED}
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s [%(name)s] [%(request_id)s] %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = _extra_fields(record)
+        if fields:
+            line += " " + " ".join(f"{key}={value}" for key, value in fields.items())
+        return line
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", "-"),
+            "message": record.getMessage(),
+            **_extra_fields(record),
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def dropped_records() -> int:
+    return _DroppingQueueHandler.dropped
+
+
+metrics.collector(
+    "log_records_dropped_total", "counter", "Log records dropped because the log queue was full",
+    lambda: [({}, dropped_records())],
+)
+
+
+def setup_logging(level: Optional[str] = None) -> None:
+    """Route the "app" logger through a background queue listener."""
+    global _listener
+    if _listener is not None:
+        apply_log_level(level)
+        return
+
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(JsonFormatter() if settings.LOG_FORMAT == "json" else TextFormatter())
+
+    log_queue: queue.Queue = queue.Queue(maxsize=settings.LOG_QUEUE_SIZE)
+    queue_handler = _DroppingQueueHandler(log_queue)
+    # Filters run before the record is prepared for the queue, so unsampled
+    # DEBUG records are never formatted
+    queue_handler.addFilter(_ContextFilter())
+
+    logger = logging.getLogger(APP_LOGGER)
+    logger.handlers = [queue_handler]
+    logger.propagate = False
+    apply_log_level(level)
+
+    _listener = QueueListener(log_queue, handler, respect_handler_level=False)
+    _listener.start()
+
+
+def shutdown_logging() -> None:
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def apply_log_level(level: Optional[str]) -> None:
+    """Apply the `logLevel` value from the system configuration."""
+    name = (level or settings.LOG_LEVEL).upper()
+    logging.getLogger(APP_LOGGER).setLevel(getattr(logging, name, logging.INFO))
+
+
+class RequestContextMiddleware:
+    """
+    ASGI middleware that assigns each request a correlation id (taken from
+    X-Request-ID when the client sends one), decides whether its DEBUG
+    records are sampled, and echoes the id in the response headers.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        request_id = None
+        for name, value in scope.get("headers", []):
+            if name == REQUEST_ID_HEADER.encode():
+                request_id = value.decode("latin-1")[:64]
+                break
+        request_id = request_id or uuid.uuid4().hex
+        request_token = request_id_var.set(request_id)
+        sampled_token = debug_sampled_var.set(random.random() < settings.LOG_DEBUG_SAMPLE_RATE)
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [
+                    (REQUEST_ID_HEADER.encode(), request_id.encode("latin-1"))
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            request_id_var.reset(request_token)
+            debug_sampled_var.reset(sampled_token)
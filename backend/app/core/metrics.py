@@ -0,0 +1,252 @@
+"""
+In-process metrics in the Prometheus text exposition format.
+
+Counters, gauges and histograms keep plain Python numbers per label set, so
+recording a sample is a dict lookup and an addition (a few microseconds).
+Subsystems that already keep their own counters (response cache, rate
+limiters, circuit breakers, ...) are exported through collector callbacks
+evaluated only when /metrics is scraped.
+"""
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; covers cache hits (sub-millisecond) up to slow LLM calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# (labels, value) pairs produced by a collector for one metric family
+Samples = Iterable[Tuple[Dict[str, str], float]]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+
+    def labels(self, **labels: str):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        child = self._children.get(key)
+        if child is None:
+            child = self._children[key] = self._new_child()
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for key, child in list(self._children.items()):
+            lines.extend(self._render_child(key, child))
+        return lines
+
+    def _render_child(self, key: Tuple[str, ...], child) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(child.value)}"]
+
+
+class _Value:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount: float = 1) -> None:
+        self.value += amount
+
+    def dec(self, amount: float = 1) -> None:
+        self.value -= amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _new_child(self):
+        return _Value()
+
+
+class _HistogramValue:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def time(self) -> "_Timer":
+        return _Timer(self)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def _render_child(self, key: Tuple[str, ...], child: _HistogramValue) -> List[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), child.counts):
+            cumulative += count
+            labels = _format_labels(self.labelnames, key, f'le="{_format_value(float(bound))}"')
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.labelnames, key)
+        lines.append(f"{self.name}_sum{labels} {_format_value(child.sum)}")
+        lines.append(f"{self.name}_count{labels} {child.count}")
+        return lines
+
+
+class _Timer:
+    """Context manager observing the elapsed wall time into a histogram child."""
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram: _HistogramValue):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start)
+        return False
+
+
+class _Collected:
+    """A metric family whose samples are produced by a callback at scrape time."""
+
+    def __init__(self, name: str, kind: str, documentation: str, collect: Callable[[], Samples]):
+        self.name = name
+        self.kind = kind
+        self.documentation = documentation
+        self.collect = collect
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for labels, value in self.collect():
+            lines.append(f"{self.name}{_format_labels(labels.keys(), labels.values())} {_format_value(value)}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+
+    def _register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric '{metric.name}' is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def collector(self, name: str, kind: str, documentation: str, collect: Callable[[], Samples]) -> None:
+        """Export values owned by another component, read only when scraped."""
+        self._register(_Collected(name, kind, documentation, collect))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+# Query pipeline
+QUERY_STAGE_SECONDS = metrics.histogram(
+    "query_stage_seconds",
+    "Latency of each stage of the query pipeline",
+    ("stage", "provider", "connector"),
+)
+QUERY_REQUEST_SECONDS = metrics.histogram(
+    "query_request_seconds", "End-to-end latency of query endpoints", ("endpoint",)
+)
+QUERY_IN_FLIGHT = metrics.gauge("query_in_flight", "Query requests currently being processed", ("endpoint",))
+QUERY_DECISIONS = metrics.counter(
+    "query_decisions_total",
+    "Function selection outcomes (similarity fast path or LLM assessment)",
+    ("decision", "provider"),
+)
+
+# LLM providers
+LLM_REQUEST_SECONDS = metrics.histogram("llm_request_seconds", "Latency of LLM provider calls", ("provider", "outcome"))
+
+# Upstream APIs
+UPSTREAM_REQUEST_SECONDS = metrics.histogram(
+    "upstream_request_seconds", "Latency of individual upstream HTTP attempts", ("connector",)
+)
+UPSTREAM_RESPONSES = metrics.counter(
+    "upstream_responses_total", "Upstream responses by status code ('error' for transport failures)", ("connector", "status")
+)
+
+
+class track_request:
+    """Count a query endpoint request as in flight and observe its total latency."""
+    __slots__ = ("in_flight", "timer")
+
+    def __init__(self, endpoint: str):
+        self.in_flight = QUERY_IN_FLIGHT.labels(endpoint=endpoint)
+        self.timer = QUERY_REQUEST_SECONDS.labels(endpoint=endpoint).time()
+
+    def __enter__(self):
+        self.in_flight.inc()
+        self.timer.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.timer.__exit__(*exc_info)
+        self.in_flight.dec()
+        return False
+
+
+def time_stage(stage: str, provider: str = "", connector: str = "") -> _Timer:
+    return QUERY_STAGE_SECONDS.labels(stage=stage, provider=provider, connector=connector).time()
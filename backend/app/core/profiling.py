@@ -0,0 +1,184 @@
+"""
+On-demand profiling of single /query/query requests.
+
+A request is profiled when either:
+- it carries `X-Profile: <PROFILING_ADMIN_TOKEN>`, or
+- it is picked by PROFILING_SAMPLE_RATE.
+
+The profiler is cProfile (deterministic), or pyinstrument (statistical) when
+PROFILING_PROFILER is "pyinstrument" and the package is installed. The profile
+is written to PROFILING_DIR, named after the request id (X-Request-ID):
+- `<request id>.prof` from cProfile (load with pstats or snakeviz)
+- `<request id>.html` from pyinstrument
+
+Allocation tracing (tracemalloc) is added when PROFILING_TRACEMALLOC is set,
+or for admin requests that send `X-Profile-Allocations: true`. It writes a
+`<request id>.tracemalloc` snapshot and a `<request id>-allocations.txt`
+summary.
+
+cProfile and tracemalloc trace the whole process, not just the request. So
+only one request is profiled at a time, and other requests served
+concurrently on the event loop show up in its profile. pyinstrument's async
+mode attributes only the profiled request's time. The middleware is only
+installed when a token or sample rate is configured, so it costs nothing
+otherwise.
+"""
+import cProfile
+import hmac
+import logging
+import os
+import random
+import time
+import tracemalloc
+
+from app.core.config import settings
+from app.core.log import request_id_var
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = b"x-profile"
+ALLOCATIONS_HEADER = b"x-profile-allocations"
+
+# Lines in the allocation summary
+TOP_ALLOCATIONS = 50
+
+PROFILES_WRITTEN = metrics.counter(
+    "profiles_written_total", "Requests profiled, by trigger (header or sample)", ("trigger",)
+)
+PROFILES_SKIPPED = metrics.counter(
+    "profiles_skipped_total", "Profiling triggers ignored because another request was being profiled"
+)
+
+
+def profiling_configured() -> bool:
+    return bool(settings.PROFILING_ADMIN_TOKEN) or settings.PROFILING_SAMPLE_RATE > 0
+
+
+def _safe_name(request_id: str) -> str:
+    # Request ids come from clients; keep them to a harmless file name
+    return "".join(c if c.isalnum() or c in "-_." else "_" for c in request_id).lstrip(".") or "request"
+
+
+class _CProfiler:
+    suffix = ".prof"
+
+    def __init__(self):
+        self.profile = cProfile.Profile()
+
+    def start(self):
+        self.profile.enable()
+
+    def stop(self):
+        self.profile.disable()
+
+    def write(self, path: str):
+        self.profile.dump_stats(path)
+
+
+class _PyinstrumentProfiler:
+    suffix = ".html"
+
+    def __init__(self):
+        from pyinstrument import Profiler
+
+        self.profile = Profiler(async_mode="enabled")
+
+    def start(self):
+        self.profile.start()
+
+    def stop(self):
+        self.profile.stop()
+
+    def write(self, path: str):
+        with open(path, "w") as f:
+            f.write(self.profile.output_html())
+
+
+def _create_profiler():
+    if settings.PROFILING_PROFILER == "pyinstrument":
+        try:
+            return _PyinstrumentProfiler()
+        except ImportError:
+            logger.warning("pyinstrument is not installed; profiling with cProfile")
+    return _CProfiler()
+
+
+def _write_allocations(snapshot: tracemalloc.Snapshot, base: str) -> None:
+    snapshot.dump(f"{base}.tracemalloc")
+    statistics = snapshot.statistics("lineno")
+    total = sum(stat.size for stat in statistics)
+    with open(f"{base}-allocations.txt", "w") as f:
+        f.write(f"Traced memory still allocated at the end of the request: {total / 1024:.1f} KiB\n")
+        f.write(f"Peak traced memory during the request: {tracemalloc.get_traced_memory()[1] / 1024:.1f} KiB\n\n")
+        for stat in statistics[:TOP_ALLOCATIONS]:
+            f.write(f"{stat}\n")
+
+
+class ProfilingMiddleware:
+    """ASGI middleware that profiles requests to one path on demand."""
+
+    def __init__(self, app, path: str):
+        self.app = app
+        self.path = path
+        self.busy = False
+
+    def _trigger(self, scope):
+        """("header" | "sample" | None, whether to trace allocations)."""
+        token = settings.PROFILING_ADMIN_TOKEN
+        if token:
+            headers = dict(scope.get("headers", []))
+            supplied = headers.get(PROFILE_HEADER)
+            if supplied is not None and hmac.compare_digest(supplied, token.encode()):
+                requested = headers.get(ALLOCATIONS_HEADER, b"").lower() in (b"1", b"true", b"yes")
+                return "header", settings.PROFILING_TRACEMALLOC or requested
+        if settings.PROFILING_SAMPLE_RATE > 0 and random.random() < settings.PROFILING_SAMPLE_RATE:
+            return "sample", settings.PROFILING_TRACEMALLOC
+        return None, False
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] != self.path:
+            return await self.app(scope, receive, send)
+        trigger, allocations = self._trigger(scope)
+        if trigger is None:
+            return await self.app(scope, receive, send)
+        if self.busy:
+            PROFILES_SKIPPED.labels().inc()
+            return await self.app(scope, receive, send)
+
+        self.busy = True
+        profiler = _create_profiler()
+        # Don't take over allocation tracing someone else started
+        trace_allocations = allocations and not tracemalloc.is_tracing()
+        start = time.perf_counter()
+        try:
+            if trace_allocations:
+                tracemalloc.start(settings.PROFILING_TRACEMALLOC_FRAMES)
+            profiler.start()
+            try:
+                await self.app(scope, receive, send)
+            finally:
+                profiler.stop()
+                snapshot = tracemalloc.take_snapshot() if trace_allocations else None
+                self._save(profiler, snapshot, trigger, time.perf_counter() - start)
+        finally:
+            if trace_allocations:
+                tracemalloc.stop()
+            self.busy = False
+
+    def _save(self, profiler, snapshot, trigger: str, elapsed: float) -> None:
+        base = os.path.join(settings.PROFILING_DIR, _safe_name(request_id_var.get()))
+        try:
+            os.makedirs(settings.PROFILING_DIR, exist_ok=True)
+            profiler.write(base + profiler.suffix)
+            if snapshot is not None:
+                _write_allocations(snapshot, base)
+        except Exception:
+            logger.exception("Writing the request profile failed")
+            return
+        PROFILES_WRITTEN.labels(trigger=trigger).inc()
+        logger.info(
+            "Request profiled",
+            extra={"profile": base + profiler.suffix, "trigger": trigger, "allocations": snapshot is not None,
+                   "duration_ms": round(elapsed * 1000, 1)},
+        )
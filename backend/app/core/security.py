@@ -1,8 +1,11 @@
 from cryptography.fernet import Fernet
 from app.core.config import settings
 import base64
+import logging
 import os
 
+logger = logging.getLogger(__name__)
+
 # Ensure the key is valid or generate one if it's the default placeholder
 KEY_FILE = ".key"
 
@@ -23,7 +26,7 @@ try:
     
     cipher_suite = Fernet(_key)
 except Exception as e:
-    print(f"Warning: Encryption key issue: {e}. Generating a temporary one.")
+    logger.warning("Encryption key issue, generating a temporary one", extra={"error": str(e)})
     _key = Fernet.generate_key()
     cipher_suite = Fernet(_key)
 
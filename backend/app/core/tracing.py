@@ -0,0 +1,372 @@
+"""
+Lightweight request tracing compatible with OpenTelemetry.
+
+Spans use W3C trace context ids (and `traceparent` headers for propagation)
+and are exported in the OTLP data model: as JSON lines to the console or a
+local file for offline use, or to any OTLP/HTTP collector. Finished spans are
+handed to a background thread in batches, and spans of unsampled traces are
+never recorded, so tracing stays cheap at full traffic.
+"""
+import contextvars
+import json
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from app.core.config import settings
+
+TRACEPARENT_HEADER = "traceparent"
+
+KIND_INTERNAL = "internal"
+KIND_SERVER = "server"
+KIND_CLIENT = "client"
+
+_BATCH_SIZE = 512
+_FLUSH_INTERVAL = 2.0
+_QUEUE_SIZE = 10000
+
+
+class SpanContext:
+    __slots__ = ("trace_id", "span_id", "sampled")
+
+    def __init__(self, trace_id: str, span_id: str, sampled: bool):
+        self.trace_id = trace_id
+        self.span_id = span_id
+        self.sampled = sampled
+
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+
+_current: contextvars.ContextVar[Optional[SpanContext]] = contextvars.ContextVar("trace_context", default=None)
+
+
+def _new_id(bits: int) -> str:
+    return f"{random.getrandbits(bits):0{bits // 4}x}"
+
+
+def parse_traceparent(value: Optional[str]) -> Optional[SpanContext]:
+    """Parse a W3C `traceparent` header; None when absent or malformed."""
+    if not value:
+        return None
+    parts = value.strip().split("-")
+    if len(parts) < 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        flags = int(parts[3][:2], 16)
+        int(parts[1], 16), int(parts[2], 16)
+    except ValueError:
+        return None
+    if parts[1] == "0" * 32 or parts[2] == "0" * 16:
+        return None
+    return SpanContext(parts[1], parts[2], bool(flags & 1))
+
+
+def current_traceparent() -> Optional[str]:
+    """`traceparent` value for an outgoing call made from the current span."""
+    context = _current.get()
+    return context.traceparent() if context and _processor is not None else None
+
+
+class Span:
+    """A recorded span; only created for sampled traces."""
+    __slots__ = ("context", "parent_id", "name", "kind", "start_ns", "end_ns", "attributes", "status", "error")
+
+    def __init__(self, context: SpanContext, parent_id: Optional[str], name: str, kind: str, attributes: Optional[Dict[str, Any]]):
+        self.context = context
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.attributes = dict(attributes) if attributes else {}
+        self.status = "unset"
+        self.error: Optional[str] = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def set_error(self, message: str) -> None:
+        self.status = "error"
+        self.error = message
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "traceId": self.context.trace_id,
+            "spanId": self.context.span_id,
+            "parentSpanId": self.parent_id or "",
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": self.start_ns,
+            "endTimeUnixNano": self.end_ns,
+            "durationMs": round((self.end_ns - self.start_ns) / 1e6, 3),
+            "attributes": self.attributes,
+            "status": {"code": self.status, "message": self.error or ""},
+        }
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+    def set_error(self, message: str) -> None:
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class _SpanScope:
+    """Context manager that makes a span current for its duration."""
+    __slots__ = ("span", "context", "token")
+
+    def __init__(self, span, context: Optional[SpanContext]):
+        self.span = span
+        self.context = context
+        self.token = None
+
+    def __enter__(self):
+        if self.context is not None:
+            self.token = _current.set(self.context)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.token is not None:
+            _current.reset(self.token)
+        span = self.span
+        if span is not _NOOP_SPAN:
+            if exc is not None and span.status != "error":
+                span.set_error(f"{exc_type.__name__}: {exc}")
+            span.end_ns = time.time_ns()
+            _processor.submit(span)
+        return False
+
+
+_NOOP_SCOPE = _SpanScope(_NOOP_SPAN, None)
+
+
+def start_span(
+    name: str,
+    kind: str = KIND_INTERNAL,
+    attributes: Optional[Dict[str, Any]] = None,
+    parent: Optional[SpanContext] = None
+) -> _SpanScope:
+    """
+    Start a span as a child of `parent` (default: the current span).
+
+    Without a parent a new trace is started, sampled at TRACING_SAMPLE_RATE;
+    children inherit their parent's sampling decision. Returns a no-op scope
+    when tracing is disabled.
+    """
+    if _processor is None:
+        return _NOOP_SCOPE
+    parent = parent or _current.get()
+    if parent is None:
+        sampled = random.random() < settings.TRACING_SAMPLE_RATE
+        context = SpanContext(_new_id(128), _new_id(64), sampled)
+    else:
+        context = SpanContext(parent.trace_id, _new_id(64), parent.sampled)
+    if not context.sampled:
+        # Still propagate ids so downstream services see one unsampled trace
+        return _SpanScope(_NOOP_SPAN, context)
+    span = Span(context, parent.span_id if parent else None, name, kind, attributes)
+    return _SpanScope(span, context)
+
+
+# Exporters
+
+class ConsoleExporter:
+    """Write one JSON span per line to stdout."""
+
+    def export(self, spans: List[Dict[str, Any]]) -> None:
+        sys.stdout.write("".join(json.dumps({"span": span}, default=str) + "\n" for span in spans))
+        sys.stdout.flush()
+
+    def shutdown(self) -> None:
+        pass
+
+
+class FileExporter:
+    """Append one JSON span per line to TRACING_FILE_PATH (works fully offline)."""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or settings.TRACING_FILE_PATH
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def export(self, spans: List[Dict[str, Any]]) -> None:
+        with open(self.path, "a") as f:
+            f.write("".join(json.dumps(span, default=str) + "\n" for span in spans))
+
+    def shutdown(self) -> None:
+        pass
+
+
+_OTLP_KINDS = {KIND_INTERNAL: 1, KIND_SERVER: 2, KIND_CLIENT: 3}
+_OTLP_STATUS = {"unset": 0, "ok": 1, "error": 2}
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class OTLPHttpExporter:
+    """Send spans to an OpenTelemetry collector using OTLP/HTTP with JSON encoding."""
+
+    def __init__(self, endpoint: Optional[str] = None):
+        import httpx
+
+        self.endpoint = endpoint or settings.TRACING_OTLP_ENDPOINT
+        self.client = httpx.Client(timeout=10.0)
+
+    def export(self, spans: List[Dict[str, Any]]) -> None:
+        payload = {"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": _otlp_value(settings.PROJECT_NAME)}]},
+            "scopeSpans": [{
+                "scope": {"name": "app.core.tracing"},
+                "spans": [{
+                    "traceId": span["traceId"],
+                    "spanId": span["spanId"],
+                    "parentSpanId": span["parentSpanId"],
+                    "name": span["name"],
+                    "kind": _OTLP_KINDS[span["kind"]],
+                    "startTimeUnixNano": str(span["startTimeUnixNano"]),
+                    "endTimeUnixNano": str(span["endTimeUnixNano"]),
+                    "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in span["attributes"].items()],
+                    "status": {"code": _OTLP_STATUS[span["status"]["code"]], "message": span["status"]["message"]},
+                } for span in spans],
+            }],
+        }]}
+        self.client.post(self.endpoint, json=payload)
+
+    def shutdown(self) -> None:
+        self.client.close()
+
+
+EXPORTERS: Dict[str, Callable[[], Any]] = {
+    "console": ConsoleExporter,
+    "file": FileExporter,
+    "otlp": OTLPHttpExporter,
+}
+
+
+def register_exporter(name: str, factory: Callable[[], Any]) -> None:
+    """Make an exporter (an object with export(spans) and shutdown()) selectable via TRACING_EXPORTER."""
+    EXPORTERS[name] = factory
+
+
+class _BatchProcessor:
+    """Collect finished spans on a bounded queue and export them from a background thread."""
+
+    def __init__(self, exporter):
+        self.exporter = exporter
+        self.queue: queue.Queue = queue.Queue(maxsize=_QUEUE_SIZE)
+        self.dropped = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+        self._thread.start()
+
+    def submit(self, span: Span) -> None:
+        try:
+            self.queue.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1
+
+    def _drain(self) -> List[Dict[str, Any]]:
+        batch = []
+        while len(batch) < _BATCH_SIZE:
+            try:
+                batch.append(self.queue.get_nowait().to_dict())
+            except queue.Empty:
+                break
+        return batch
+
+    def _export(self, batch: List[Dict[str, Any]]) -> None:
+        try:
+            self.exporter.export(batch)
+        except Exception as e:
+            # Never let a broken exporter take the service down; spans are best effort
+            sys.stderr.write(f"Trace export failed: {e}\n")
+
+    def _run(self) -> None:
+        while not self._stop.wait(_FLUSH_INTERVAL):
+            while True:
+                batch = self._drain()
+                if not batch:
+                    break
+                self._export(batch)
+
+    def shutdown(self) -> None:
+        self._stop.set()
+        self._thread.join(timeout=5.0)
+        batch = self._drain()
+        while batch:
+            self._export(batch)
+            batch = self._drain()
+        self.exporter.shutdown()
+
+
+_processor: Optional[_BatchProcessor] = None
+
+
+def setup_tracing() -> None:
+    """Start exporting spans with the exporter named by TRACING_EXPORTER ("none" disables tracing)."""
+    global _processor
+    name = settings.TRACING_EXPORTER.lower()
+    if _processor is not None or name in ("", "none"):
+        return
+    if name not in EXPORTERS:
+        raise ValueError(f"Unknown TRACING_EXPORTER '{name}', expected one of: none, {', '.join(EXPORTERS)}")
+    _processor = _BatchProcessor(EXPORTERS[name]())
+
+
+def shutdown_tracing() -> None:
+    """Flush pending spans and stop the exporter thread."""
+    global _processor
+    if _processor is not None:
+        _processor.shutdown()
+        _processor = None
+
+
+class TracingMiddleware:
+    """
+    ASGI middleware that opens a server span per HTTP request, continuing the
+    caller's trace when a `traceparent` header is present.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or _processor is None:
+            return await self.app(scope, receive, send)
+
+        parent = None
+        for name, value in scope.get("headers", []):
+            if name == TRACEPARENT_HEADER.encode():
+                parent = parse_traceparent(value.decode("latin-1"))
+                break
+
+        attributes = {"http.method": scope["method"], "http.target": scope["path"]}
+        with start_span(f"{scope['method']} {scope['path']}", KIND_SERVER, attributes, parent=parent) as span:
+            async def send_with_status(message):
+                if message["type"] == "http.response.start":
+                    span.set_attribute("http.status_code", message["status"])
+                    if message["status"] >= 500:
+                        span.set_error(f"HTTP {message['status']}")
+                await send(message)
+
+            await self.app(scope, receive, send_with_status)
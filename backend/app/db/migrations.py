@@ -0,0 +1,38 @@
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from app.db.models import Connector
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Columns added after the first release: (table, column, SQL type).
+# create_all only creates missing tables, so existing databases get these via ALTER TABLE.
+ADDED_COLUMNS = [
+    ("connectors", "operation_parameters", "JSON"),
+]
+
+
+def upgrade_schema(engine: Engine) -> None:
+    """Add missing columns and backfill derived data. Safe to run on every start."""
+    inspector = inspect(engine)
+    with engine.begin() as connection:
+        for table, column, column_type in ADDED_COLUMNS:
+            existing = {c["name"] for c in inspector.get_columns(table)}
+            if column not in existing:
+                connection.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}"))
+                logger.info("Added database column", extra={"table": table, "column": column})
+
+    _backfill_operation_parameters(engine)
+
+
+def _backfill_operation_parameters(engine: Engine) -> None:
+    from app.services.spec_parameters import build_operation_parameters
+
+    with Session(engine) as db:
+        connectors = db.query(Connector).filter(Connector.operation_parameters.is_(None)).all()
+        for connector in connectors:
+            connector.operation_parameters = build_operation_parameters(connector.full_schema_json)
+        if connectors:
+            db.commit()
+            logger.info("Resolved operation parameters for existing connectors", extra={"connectors": len(connectors)})
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Enum, DateTime, Text
+from sqlalchemy import Column, String, Enum, DateTime, Text, Integer
 from sqlalchemy.dialects.sqlite import JSON
 from app.db.session import Base
 import uuid
@@ -20,5 +20,30 @@ class Connector(Base):
     version = Column(String)
     auth_type = Column(String, nullable=False)
     full_schema_json = Column(JSON, nullable=False)
+    # Resolved parameters per operation ("<method> <path>" -> list), see app.services.spec_parameters
+    operation_parameters = Column(JSON, nullable=True)
     status = Column(Enum(ConnectorStatus), default=ConnectorStatus.PENDING_SECRETS)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+class JobStatus(str, enum.Enum):
+    QUEUED = "QUEUED"
+    RUNNING = "RUNNING"
+    SUCCEEDED = "SUCCEEDED"
+    FAILED = "FAILED"
+
+class QueryJob(Base):
+    """A /query/query request run in job mode (see app.services.jobs)."""
+    __tablename__ = "query_jobs"
+
+    job_id = Column(String, primary_key=True, default=lambda: uuid.uuid4().hex)
+    status = Column(Enum(JobStatus), default=JobStatus.QUEUED, nullable=False)
+    query = Column(Text, nullable=False)
+    callback_url = Column(String)
+    callback_status = Column(String)  # "delivered" or why delivery failed
+    result = Column(Text)  # JSON of the query response
+    result_bytes = Column(Integer, default=0)
+    error = Column(Text)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+    expires_at = Column(DateTime, index=True)
@@ -1,16 +1,44 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response
 from app.core.config import settings
-from app.api.endpoints import connectors, agent, config, query
+from app.core.log import setup_logging, shutdown_logging, RequestContextMiddleware
+from app.core.metrics import metrics, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from app.core.tracing import setup_tracing, shutdown_tracing, TracingMiddleware
+from app.core.deadline import DeadlineMiddleware
+from app.core.capture import setup_capture, shutdown_capture, CaptureMiddleware
+from app.core.profiling import profiling_configured, ProfilingMiddleware
+from app.api.endpoints import connectors, agent, config, query, admin
 
 from app.db import models
+from app.db.migrations import upgrade_schema
 from app.db.session import engine
+from app.services.executor import executor
+from app.services.jobs import job_manager
+from app.services.vault import vault
 
 models.Base.metadata.create_all(bind=engine)
 
+setup_logging(vault.get_secrets("system", "global_config").get("logLevel"))
+setup_tracing()
+setup_capture()
+upgrade_schema(engine)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    await job_manager.aclose()
+    # Close pooled upstream connections
+    await executor.aclose()
+    shutdown_capture()
+    shutdown_tracing()
+    shutdown_logging()
+
 app = FastAPI(
     title=settings.PROJECT_NAME,
-    openapi_url=f"{settings.API_V1_STR}/openapi.json"
+    openapi_url=f"{settings.API_V1_STR}/openapi.json",
+    lifespan=lifespan
 )
 
 # Set all CORS enabled origins
@@ -25,13 +53,29 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Request-ID"],
 )
+if profiling_configured():
+    app.add_middleware(ProfilingMiddleware, path=f"{settings.API_V1_STR}/query/query")
+app.add_middleware(
+    CaptureMiddleware,
+    paths=(f"{settings.API_V1_STR}/query/query", f"{settings.API_V1_STR}/agent/query"),
+)
+app.add_middleware(DeadlineMiddleware, path_prefix=f"{settings.API_V1_STR}/query")
+app.add_middleware(RequestContextMiddleware)
+app.add_middleware(TracingMiddleware)
 
 app.include_router(connectors.router, prefix=f"{settings.API_V1_STR}/connectors", tags=["connectors"])
 app.include_router(agent.router, prefix=f"{settings.API_V1_STR}/agent", tags=["agent"])
 app.include_router(config.router, prefix=f"{settings.API_V1_STR}/config", tags=["config"])
 app.include_router(query.router, prefix=f"{settings.API_V1_STR}/query", tags=["query"])
+app.include_router(admin.router, prefix=f"{settings.API_V1_STR}/admin", tags=["admin"])
 
 @app.get("/")
 def root():
     return {"message": "Welcome to AI API Connector System"}
+
+@app.get("/metrics", include_in_schema=False)
+def get_metrics():
+    """Prometheus scrape endpoint."""
+    return Response(content=metrics.render(), media_type=METRICS_CONTENT_TYPE)
@@ -0,0 +1,190 @@
+"""
+Admission control (load shedding) for query endpoints.
+
+At most `max_in_flight` requests are processed at once. Further requests wait
+in a short priority queue (higher classes first, FIFO within a class) for at
+most `max_wait` seconds. When the queue is full or the wait runs out, the
+request is rejected right away with `Overloaded`, so a slow LLM provider
+turns into a few quick 503s instead of unbounded piles of requests that all
+time out. A full queue gives way to higher classes: the newest waiter of
+the lowest class below the arriving request is rejected to make room.
+"""
+import asyncio
+import heapq
+import itertools
+import math
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+# Priority classes, most important first
+PRIORITIES = ("high", "normal", "low")
+
+ADMISSION_REJECTED = metrics.counter(
+    "admission_rejected_total", "Query requests shed by admission control", ("endpoint", "priority", "reason")
+)
+ADMISSION_WAIT_SECONDS = metrics.histogram(
+    "admission_wait_seconds", "Time admitted query requests spent queued", ("endpoint", "priority")
+)
+
+# Weight of the latest sample in the average service time (for Retry-After)
+_SERVICE_TIME_ALPHA = 0.2
+
+
+class Overloaded(Exception):
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(f"Server overloaded ({reason}); retry in {retry_after}s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    __slots__ = ("rank", "future")
+
+    def __init__(self, rank: int, future: asyncio.Future):
+        self.rank = rank
+        self.future = future
+
+
+class AdmissionController:
+    def __init__(self, endpoint: str, max_in_flight: int, max_queue: int, max_wait: float):
+        self.endpoint = endpoint
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.in_flight = 0
+        self.service_time = 1.0
+        self._heap: List[tuple] = []
+        self._queued: Dict[int, int] = {rank: 0 for rank in range(len(PRIORITIES))}
+        self._sequence = itertools.count()
+
+    @staticmethod
+    def _rank(priority: str) -> int:
+        return PRIORITIES.index(priority) if priority in PRIORITIES else PRIORITIES.index("normal")
+
+    @property
+    def queued(self) -> int:
+        return sum(self._queued.values())
+
+    def retry_after(self) -> int:
+        """Seconds until the current backlog should have drained."""
+        backlog = self.queued + self.in_flight
+        return max(1, math.ceil(backlog * self.service_time / max(1, self.max_in_flight)))
+
+    def _reject(self, priority: str, reason: str) -> Overloaded:
+        ADMISSION_REJECTED.labels(endpoint=self.endpoint, priority=priority, reason=reason).inc()
+        return Overloaded(reason, self.retry_after())
+
+    @asynccontextmanager
+    async def slot(self, priority: str = "normal"):
+        """Hold a processing slot for the duration of the block, or raise `Overloaded`."""
+        if self.max_in_flight <= 0:
+            yield
+            return
+        priority = PRIORITIES[self._rank(priority)]
+        await self._acquire(priority)
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            elapsed = time.monotonic() - start
+            self.service_time += _SERVICE_TIME_ALPHA * (elapsed - self.service_time)
+            self._release()
+
+    async def _acquire(self, priority: str) -> None:
+        rank = self._rank(priority)
+        if self.in_flight < self.max_in_flight and not self.queued:
+            self.in_flight += 1
+            ADMISSION_WAIT_SECONDS.labels(endpoint=self.endpoint, priority=priority).observe(0.0)
+            return
+
+        if self.queued >= self.max_queue and not self._evict_below(rank):
+            raise self._reject(priority, "queue_full")
+
+        waiter = _Waiter(rank, asyncio.get_running_loop().create_future())
+        heapq.heappush(self._heap, (rank, next(self._sequence), waiter))
+        self._queued[rank] += 1
+        start = time.monotonic()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), self.max_wait)
+        except asyncio.TimeoutError:
+            if not self._abandon(waiter):
+                raise self._reject(priority, "timeout")
+        except asyncio.CancelledError:
+            if not self._abandon(waiter):
+                raise
+            # Slot was handed over as the caller went away
+            self._release()
+            raise
+        except Overloaded:
+            ADMISSION_REJECTED.labels(endpoint=self.endpoint, priority=priority, reason="evicted").inc()
+            raise
+        ADMISSION_WAIT_SECONDS.labels(endpoint=self.endpoint, priority=priority).observe(time.monotonic() - start)
+
+    def _abandon(self, waiter: _Waiter) -> bool:
+        """Leave the queue; True when the slot was handed over in the meantime."""
+        if waiter.future.done():
+            return not waiter.future.cancelled() and waiter.future.exception() is None
+        waiter.future.cancel()
+        self._queued[waiter.rank] -= 1
+        return False
+
+    def _evict_below(self, rank: int) -> bool:
+        """Reject the newest waiter of the lowest class below `rank`, if any."""
+        victim: Optional[tuple] = None
+        for entry in self._heap:
+            if not entry[2].future.done() and entry[0] > rank and (victim is None or entry[:2] > victim[:2]):
+                victim = entry
+        if victim is None:
+            return False
+        waiter = victim[2]
+        self._queued[waiter.rank] -= 1
+        waiter.future.set_exception(Overloaded("evicted", self.retry_after()))
+        return True
+
+    def _release(self) -> None:
+        while self._heap:
+            _, _, waiter = heapq.heappop(self._heap)
+            if waiter.future.done():
+                continue
+            # Hand the slot over without giving it back
+            self._queued[waiter.rank] -= 1
+            waiter.future.set_result(True)
+            return
+        self.in_flight -= 1
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "endpoint": self.endpoint,
+            "max_in_flight": self.max_in_flight,
+            "max_queue": self.max_queue,
+            "max_wait": self.max_wait,
+            "in_flight": self.in_flight,
+            "queued": {PRIORITIES[rank]: count for rank, count in self._queued.items()},
+            "service_time": round(self.service_time, 3),
+        }
+
+
+def priority_for(api_key: str) -> str:
+    """Priority class of an API key (ADMISSION_KEY_PRIORITIES, else the default class)."""
+    return settings.ADMISSION_KEY_PRIORITIES.get(api_key, settings.ADMISSION_DEFAULT_PRIORITY)
+
+
+query_admission = AdmissionController(
+    "query", settings.ADMISSION_MAX_IN_FLIGHT, settings.ADMISSION_MAX_QUEUE, settings.ADMISSION_MAX_WAIT
+)
+
+metrics.collector(
+    "admission_in_flight", "gauge", "Query requests holding an admission slot",
+    lambda: [({"endpoint": query_admission.endpoint}, query_admission.in_flight)],
+)
+metrics.collector(
+    "admission_queued", "gauge", "Query requests waiting for an admission slot",
+    lambda: [
+        ({"endpoint": query_admission.endpoint, "priority": priority}, count)
+        for priority, count in query_admission.stats()["queued"].items()
+    ],
+)
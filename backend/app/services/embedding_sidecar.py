@@ -0,0 +1,313 @@
+"""
+Shared local embedding sidecar for multi-worker deployments.
+
+With the "local" or "onnx" provider, every uvicorn worker loads its own copy
+of the embedding model. The sidecar is one process that holds the model for
+all workers. Workers select it with the embedding provider "sidecar" and
+reach it over a Unix socket or localhost HTTP (EMBEDDING_SIDECAR_URL). The
+sidecar batches concurrent requests from all workers into single model
+calls.
+
+Run it next to the app:
+    python -m app.services.embedding_sidecar --socket /tmp/api-connector-embeddings.sock
+    python -m app.services.embedding_sidecar --port 8100 --backend onnx
+
+`SidecarEmbeddingFunction` (the worker side) checks the sidecar's health and
+falls back to encoding in-process (EMBEDDING_SIDECAR_FALLBACK) while the
+sidecar is down or serves a different model. It checks again every
+EMBEDDING_SIDECAR_RETRY_INTERVAL seconds. The fallback model is only loaded
+when first needed.
+"""
+import argparse
+import asyncio
+import base64
+import logging
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+import numpy as np
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+UNIX_SCHEME = "unix://"
+
+EMBEDDING_SIDECAR_CALLS = metrics.counter(
+    "embedding_sidecar_calls_total", "Embedding calls served by the sidecar or the in-process fallback", ("served_by",)
+)
+
+
+def encode_vectors(vectors) -> Dict[str, Any]:
+    matrix = np.asarray(vectors, dtype=np.float32)
+    return {"shape": list(matrix.shape), "data": base64.b64encode(matrix.tobytes()).decode("ascii")}
+
+
+def decode_vectors(payload: Dict[str, Any]) -> List[np.ndarray]:
+    matrix = np.frombuffer(base64.b64decode(payload["data"]), dtype=np.float32).reshape(payload["shape"])
+    return list(matrix)
+
+
+def load_model(backend: str, model_name: str):
+    """In-process embedding function of the "local" (PyTorch) or "onnx" provider."""
+    if backend == "onnx":
+        from app.services.onnx_embeddings import onnx_embedding_function
+
+        return onnx_embedding_function(model_name)
+    from chromadb.utils import embedding_functions
+
+    return embedding_functions.SentenceTransformerEmbeddingFunction(model_name=model_name)
+
+
+# Sidecar process
+
+class _Batcher:
+    """Collects texts from concurrent requests into model calls of up to `max_batch` texts."""
+
+    def __init__(self, encode, max_batch: int, max_wait: float):
+        self.encode = encode
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.queue: asyncio.Queue = asyncio.Queue()
+        # One model call at a time; the model parallelizes internally
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embedding")
+        self.batches = 0
+        self.texts = 0
+
+    async def embed(self, texts: List[str]) -> List[np.ndarray]:
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((texts, future))
+        return await future
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            pending = [await self.queue.get()]
+            count = len(pending[0][0])
+            deadline = loop.time() + self.max_wait
+            while count < self.max_batch:
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), max(0.0, deadline - loop.time()))
+                except asyncio.TimeoutError:
+                    break
+                pending.append(item)
+                count += len(item[0])
+
+            texts = [text for item_texts, _ in pending for text in item_texts]
+            try:
+                vectors = await loop.run_in_executor(self.executor, self.encode, texts)
+            except Exception as e:
+                for _, future in pending:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self.batches += 1
+            self.texts += len(texts)
+            offset = 0
+            for item_texts, future in pending:
+                if not future.done():
+                    future.set_result(vectors[offset:offset + len(item_texts)])
+                offset += len(item_texts)
+
+
+def create_app(backend: str, model_name: str, max_batch: int, max_wait: float):
+    from fastapi import FastAPI, HTTPException
+    from pydantic import BaseModel
+
+    class EmbedRequest(BaseModel):
+        texts: List[str]
+        model: Optional[str] = None
+
+    state: Dict[str, Any] = {}
+
+    @asynccontextmanager
+    async def lifespan(app):
+        started = time.perf_counter()
+        function = await asyncio.get_running_loop().run_in_executor(None, load_model, backend, model_name)
+        state["dimensions"] = len(function(["warm up"])[0])
+        state["batcher"] = _Batcher(function, max_batch, max_wait)
+        task = asyncio.create_task(state["batcher"].run())
+        logger.warning(
+            "Embedding sidecar ready",
+            extra={"backend": backend, "model": model_name, "load_s": round(time.perf_counter() - started, 2)},
+        )
+        yield
+        task.cancel()
+        state["batcher"].executor.shutdown(wait=False)
+
+    app = FastAPI(title="Embedding sidecar", openapi_url=None, docs_url=None, redoc_url=None, lifespan=lifespan)
+
+    @app.get("/health")
+    async def health():
+        batcher = state["batcher"]
+        return {
+            "status": "ok",
+            "backend": backend,
+            "model": model_name,
+            "dimensions": state["dimensions"],
+            "batches": batcher.batches,
+            "texts": batcher.texts,
+            "queued": batcher.queue.qsize(),
+        }
+
+    @app.post("/embed")
+    async def embed(request: EmbedRequest):
+        if request.model and request.model != model_name:
+            raise HTTPException(status_code=409, detail=f"Sidecar serves {model_name}, not {request.model}")
+        if not request.texts:
+            return {"shape": [0, state["dimensions"]], "data": ""}
+        return encode_vectors(await state["batcher"].embed(request.texts))
+
+    return app
+
+
+# Worker side
+
+def _client_for(url: str, timeout: float) -> Tuple[httpx.Client, str]:
+    """HTTP client and base URL for an http:// or unix:// sidecar address."""
+    if url.startswith(UNIX_SCHEME):
+        transport = httpx.HTTPTransport(uds=url[len(UNIX_SCHEME):])
+        return httpx.Client(transport=transport, timeout=timeout), "http://sidecar"
+    return httpx.Client(timeout=timeout), url.rstrip("/")
+
+
+class SidecarEmbeddingFunction:
+    """Embeds through the sidecar, or in-process while the sidecar is unavailable."""
+
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+        self.client, self.base_url = _client_for(settings.EMBEDDING_SIDECAR_URL, settings.EMBEDDING_SIDECAR_TIMEOUT)
+        self.healthy: Optional[bool] = None
+        self.next_check = 0.0
+        self.last_error: Optional[str] = None
+        self._fallback = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def name() -> str:
+        return "embedding-sidecar"
+
+    def _check_health(self) -> bool:
+        try:
+            response = self.client.get(f"{self.base_url}/health", timeout=settings.EMBEDDING_SIDECAR_HEALTH_TIMEOUT)
+            response.raise_for_status()
+            served = response.json().get("model")
+            if served != self.model_name:
+                raise ValueError(f"sidecar serves {served}, configured model is {self.model_name}")
+            return True
+        except (httpx.HTTPError, ValueError) as e:
+            self._mark_down(e)
+            return False
+
+    def _mark_down(self, error: Exception) -> None:
+        if self.healthy is not False:
+            logger.warning(
+                "Embedding sidecar unavailable, encoding in-process",
+                extra={"url": settings.EMBEDDING_SIDECAR_URL, "error": str(error),
+                       "fallback": settings.EMBEDDING_SIDECAR_FALLBACK},
+            )
+        self.healthy = False
+        self.last_error = str(error)
+        self.next_check = time.monotonic() + settings.EMBEDDING_SIDECAR_RETRY_INTERVAL
+
+    def _use_sidecar(self) -> bool:
+        if self.healthy:
+            return True
+        if time.monotonic() < self.next_check:
+            return False
+        if self._check_health():
+            if self.healthy is False:
+                logger.warning("Embedding sidecar available again", extra={"url": settings.EMBEDDING_SIDECAR_URL})
+            self.healthy = True
+            self.last_error = None
+        return bool(self.healthy)
+
+    def _fallback_function(self):
+        if self._fallback is None:
+            with self._lock:
+                if self._fallback is None:
+                    self._fallback = load_model(settings.EMBEDDING_SIDECAR_FALLBACK, self.model_name)
+        return self._fallback
+
+    def __call__(self, input: List[str]) -> List[np.ndarray]:
+        if self._use_sidecar():
+            try:
+                # Short for a query, longer for the batches of an ingestion
+                batches = max(1, math.ceil(len(input) / max(1, settings.EMBEDDING_SIDECAR_MAX_BATCH)))
+                response = self.client.post(
+                    f"{self.base_url}/embed", json={"texts": list(input), "model": self.model_name},
+                    timeout=settings.EMBEDDING_SIDECAR_TIMEOUT * batches,
+                )
+                response.raise_for_status()
+                vectors = decode_vectors(response.json())
+                EMBEDDING_SIDECAR_CALLS.labels(served_by="sidecar").inc()
+                return vectors
+            except (httpx.HTTPError, ValueError, KeyError) as e:
+                self._mark_down(e)
+        EMBEDDING_SIDECAR_CALLS.labels(served_by="fallback").inc()
+        return self._fallback_function()(input)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "url": settings.EMBEDDING_SIDECAR_URL,
+            "model": self.model_name,
+            "healthy": self.healthy,
+            "last_error": self.last_error,
+            "fallback": settings.EMBEDDING_SIDECAR_FALLBACK,
+            "fallback_loaded": self._fallback is not None,
+        }
+
+
+_functions: Dict[str, SidecarEmbeddingFunction] = {}
+_functions_lock = threading.Lock()
+
+
+def sidecar_embedding_function(model_name: str) -> SidecarEmbeddingFunction:
+    function = _functions.get(model_name)
+    if function is None:
+        with _functions_lock:
+            function = _functions.get(model_name)
+            if function is None:
+                function = _functions[model_name] = SidecarEmbeddingFunction(model_name)
+    return function
+
+
+def sidecar_stats() -> List[Dict[str, Any]]:
+    return [function.stats() for function in list(_functions.values())]
+
+
+metrics.collector(
+    "embedding_sidecar_healthy", "gauge", "Whether the embedding sidecar is in use (1) or the fallback (0)",
+    lambda: [({"model": s["model"]}, 1 if s["healthy"] else 0) for s in sidecar_stats() if s["healthy"] is not None],
+)
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Serve one embedding model to all app workers")
+    parser.add_argument("--socket", help="listen on this Unix socket instead of a TCP port")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--backend", choices=("local", "onnx"), default="local",
+                        help="local = sentence-transformers (PyTorch), onnx = ONNX Runtime (ONNX_* settings)")
+    parser.add_argument("--model", default="all-MiniLM-L6-v2")
+    parser.add_argument("--max-batch", type=int, default=settings.EMBEDDING_SIDECAR_MAX_BATCH)
+    parser.add_argument("--batch-wait-ms", type=float, default=settings.EMBEDDING_SIDECAR_BATCH_WAIT_MS)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s [%(name)s] %(message)s")
+    app = create_app(args.backend, args.model, args.max_batch, args.batch_wait_ms / 1000)
+    if args.socket:
+        if os.path.exists(args.socket):
+            os.remove(args.socket)
+        uvicorn.run(app, uds=args.socket, log_level="warning")
+    else:
+        uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
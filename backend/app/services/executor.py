@@ -1,14 +1,62 @@
+import asyncio
+import contextvars
 import httpx
-from typing import Dict, Any, Optional
+from collections import deque
+from contextlib import AsyncExitStack, contextmanager, nullcontext
+from typing import Dict, Any, List, Optional
 import json
+import logging
+import time
 from app.db.models import Connector
+from app.core import capture
+from app.core.config import settings
+from app.core.metrics import metrics, UPSTREAM_REQUEST_SECONDS, UPSTREAM_RESPONSES
+from app.core.tracing import start_span, current_traceparent, KIND_CLIENT, TRACEPARENT_HEADER
 from app.services.vault import vault
+from app.services.oauth import token_manager, OAuthError
+from app.services.response_cache import response_cache
+from app.services.singleflight import SingleFlight
+from app.services import pagination
+from app.services.projection import Projection, decode_projected
+from app.services.spec_parameters import operation_parameters
+from app.services.rate_limiter import rate_limiters, ConnectorLimiter
+from app.services.resilience import circuit_breakers, CircuitOpenError, CircuitState, backoff_delay, parse_retry_after
+
+logger = logging.getLogger(__name__)
+
+# Methods whose identical concurrent calls may share one upstream request
+COALESCE_METHODS = {"get", "head"}
+# Methods that are safe to retry after a failed or ambiguous attempt
+IDEMPOTENT_METHODS = {"get", "head", "put", "delete", "options"}
+
+# Timeout of upstream attempts in the current context, instead of UPSTREAM_TIMEOUT
+_upstream_timeout: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("upstream_timeout", default=None)
+
+
+@contextmanager
+def upstream_timeout(seconds: float):
+    """Allow upstream calls made inside to take up to `seconds` per attempt (e.g. in background jobs)."""
+    token = _upstream_timeout.set(seconds)
+    try:
+        yield
+    finally:
+        _upstream_timeout.reset(token)
+
+
+def _request_timeout():
+    seconds = _upstream_timeout.get()
+    return httpx.USE_CLIENT_DEFAULT if seconds is None else seconds
+
 from sqlalchemy.orm import Session
 
 class APIExecutor:
     """
     Service to execute API calls to external services based on OpenAPI specs.
     """
+
+    def __init__(self):
+        self.flights = SingleFlight()
+        self._client: Optional[httpx.AsyncClient] = None
     
     async def execute_function(
         self,
@@ -17,7 +65,8 @@ class APIExecutor:
         path: str,
         method: str,
         user_id: str,
-        parameters: Optional[Dict[str, Any]] = None
+        parameters: Optional[Dict[str, Any]] = None,
+        projection: Optional[Projection] = None
     ) -> Dict[str, Any]:
         """
         Execute an API call to an external service.
@@ -29,118 +78,621 @@ class APIExecutor:
             method: HTTP method (get, post, etc.)
             user_id: User ID for retrieving credentials
             parameters: Optional parameters for the API call
+            projection: Optional field projection / size limits for the response
             
         Returns:
             Dict with response data or error
         """
+        attributes = {"connector.id": connector.connector_id, "operation_id": operation_id, "http.method": method.upper()}
+        with start_span("executor.execute_function", attributes=attributes) as span:
+            result = await self._execute(connector, path, method, user_id, parameters, projection)
+            if not result.get("success"):
+                span.set_error(str(result.get("error")))
+            return result
+
+    async def _execute(
+        self,
+        connector: Connector,
+        path: str,
+        method: str,
+        user_id: str,
+        parameters: Optional[Dict[str, Any]],
+        projection: Optional[Projection]
+    ) -> Dict[str, Any]:
         try:
-            # Get the full OpenAPI spec
+            prepared = await self._prepare_request(connector, path, method, user_id, parameters)
+            if "error" in prepared:
+                return prepared
             spec = connector.full_schema_json
+            method, full_url, headers, body = prepared["method"], prepared["url"], prepared["headers"], prepared["body"]
             
-            # Get base URL from servers
-            servers = spec.get("servers", [])
-            if not servers or len(servers) == 0:
-                return {
-                    "success": False,
-                    "error": f"No server URL defined in the OpenAPI spec for connector '{connector.name}'. Please update the spec to include a 'servers' section with a valid base URL."
-                }
-            
-            base_url = servers[0].get("url", "")
-            if not base_url:
-                return {
-                    "success": False,
-                    "error": f"Server URL is empty in the OpenAPI spec for connector '{connector.name}'."
-                }
-            
-            # Ensure base_url has a protocol
-            if not base_url.startswith(('http://', 'https://')):
-                # If it's a relative URL, we can't use it without a host
-                return {
-                    "success": False,
-                    "error": f"Invalid server URL '{base_url}' in OpenAPI spec. URL must start with 'http://' or 'https://'. Please update the connector's OpenAPI specification."
-                }
-            
-            # Get credentials from vault
-            secrets = vault.get_secrets(user_id, connector.connector_id)
-            
-            # Build headers
-            headers = {"Content-Type": "application/json"}
-            
-            # Add authentication based on spec
-            auth_type = spec.get("x-auth-type", "api-key")
-            if auth_type == "api-key":
-                api_key = secrets.get("api_key")
-                if api_key:
-                    # Check if spec defines where to put the API key
-                    security_schemes = spec.get("components", {}).get("securitySchemes", {})
-                    if security_schemes:
-                        # Use the first security scheme
-                        scheme = list(security_schemes.values())[0]
-                        if scheme.get("in") == "header":
-                            key_name = scheme.get("name", "Authorization")
-                            headers[key_name] = f"Bearer {api_key}" if "Authorization" in key_name else api_key
-                    else:
-                        # Default to Authorization header
-                        headers["Authorization"] = f"Bearer {api_key}"
+            operation_spec = spec.get("paths", {}).get(path, {}).get(method, {})
+            limiter = rate_limiters.get(connector.connector_id, spec)
+            ttl_override = self._cache_ttl_override(spec, operation_spec)
+            if method == "get" and settings.RESPONSE_CACHE_ENABLED and ttl_override != 0:
+                result = await self._execute_cached_get(
+                    connector.connector_id, full_url, headers, ttl_override, limiter, projection
+                )
+            else:
+                response = await self._fetch(connector.connector_id, method, full_url, headers, body, limiter)
+                result = self._build_result(response.status_code, response.content, response.encoding, projection=projection)
+            if result.get("status_code") == 401 and "oauth_key" in prepared:
+                # Token revoked or expired early; the next call fetches a new one
+                token_manager.invalidate(prepared["oauth_key"])
+            return result
+                
+        except Exception as e:
+            return {
+                "success": False,
+                "error": str(e)
+            }
+
+    async def open_stream(
+        self,
+        connector: Connector,
+        path: str,
+        method: str,
+        user_id: str,
+        parameters: Optional[Dict[str, Any]] = None,
+        max_bytes: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        Start an upstream call without buffering its body.
+        
+        Returns a dict with status_code, content_type and an async `chunks`
+        iterator that yields the body and releases the connection (and the
+        connector's concurrency slot) when exhausted, plus a `close` coroutine
+        function for callers that stop early, or an error dict. Bodies larger than `max_bytes` are rejected up front when the
+        upstream sends Content-Length, and cut off otherwise.
+        """
+        max_bytes = max_bytes or settings.STREAM_MAX_BYTES
+        stack = AsyncExitStack()
+        try:
+            prepared = await self._prepare_request(connector, path, method, user_id, parameters)
+            if "error" in prepared:
+                return prepared
             
-            # Build full URL
-            full_url = f"{base_url.rstrip('/')}{path}"
+            breaker = circuit_breakers.get(httpx.URL(prepared["url"]).netloc.decode())
+            breaker.raise_if_open()
             
-            print(f"[EXECUTOR] Original path: {path}")
-            print(f"[EXECUTOR] Parameters received: {parameters}")
-            print(f"[EXECUTOR] URL before replacement: {full_url}")
+            limiter = rate_limiters.get(connector.connector_id, connector.full_schema_json)
+            await stack.enter_async_context(limiter.slot())
+            client = self.get_client()
+            headers = prepared["headers"]
+            traceparent = current_traceparent()
+            if traceparent:
+                headers = {**headers, TRACEPARENT_HEADER: traceparent}
+            request = client.build_request(
+                prepared["method"].upper(), prepared["url"], headers=headers, json=prepared["body"]
+            )
+            # Take a half-open trial only once the limiter slot is held
+            if not breaker.allow_request():
+                raise CircuitOpenError(breaker.host, breaker.retry_in())
+            trial = breaker.state == CircuitState.HALF_OPEN
+            try:
+                response = await client.send(request, stream=True)
+            except httpx.TransportError:
+                breaker.record_failure()
+                raise
+            except BaseException:
+                if trial:
+                    breaker.release_trial()
+                raise
+            stack.push_async_callback(response.aclose)
             
-            # Replace path parameters if any
-            if parameters:
-                for key, value in parameters.items():
-                    placeholder = f"{{{key}}}"
-                    if placeholder in full_url:
-                        full_url = full_url.replace(placeholder, str(value))
-                        print(f"[EXECUTOR] Replaced {placeholder} with {value}")
-                    else:
-                        print(f"[EXECUTOR] Warning: {placeholder} not found in URL")
+            if response.status_code >= 500:
+                breaker.record_failure()
             else:
-                print(f"[EXECUTOR] No parameters to replace!")
+                breaker.record_success()
+            if response.status_code == 429:
+                limiter.on_throttled(parse_retry_after(response.headers.get("retry-after")))
             
-            print(f"[EXECUTOR] Final URL: {full_url}")
+            if not 200 <= response.status_code < 300:
+                content = await response.aread()
+                await stack.aclose()
+                return self._build_result(response.status_code, content[:max_bytes], response.encoding)
             
-            # Make the request
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                if method.lower() == "get":
-                    response = await client.get(full_url, headers=headers)
-                elif method.lower() == "post":
-                    response = await client.post(full_url, headers=headers, json=parameters or {})
-                elif method.lower() == "put":
-                    response = await client.put(full_url, headers=headers, json=parameters or {})
-                elif method.lower() == "delete":
-                    response = await client.delete(full_url, headers=headers)
-                else:
-                    return {"error": f"Unsupported HTTP method: {method}"}
-                
-                # Parse response
-                response.raise_for_status()
-                
-                try:
-                    data = response.json()
-                except:
-                    data = {"response": response.text}
-                
+            content_length = response.headers.get("content-length")
+            if content_length and content_length.isdigit() and int(content_length) > max_bytes:
+                await stack.aclose()
                 return {
-                    "success": True,
-                    "data": data,
-                    "status_code": response.status_code
+                    "success": False,
+                    "error": f"Upstream response is {content_length} bytes, above the streaming limit of {max_bytes} bytes."
                 }
-                
-        except httpx.HTTPStatusError as e:
+        except BaseException as e:
+            await stack.aclose()
+            if not isinstance(e, Exception):
+                raise
+            return {"success": False, "error": str(e)}
+        
+        async def chunks():
+            sent = 0
+            async with stack:
+                async for chunk in response.aiter_bytes(settings.STREAM_CHUNK_SIZE):
+                    sent += len(chunk)
+                    if sent > max_bytes:
+                        # Abort mid-stream so the client sees an incomplete transfer
+                        raise ValueError(f"Upstream response exceeded the streaming limit of {max_bytes} bytes")
+                    yield chunk
+        
+        return {
+            "success": True,
+            "status_code": response.status_code,
+            "content_type": response.headers.get("content-type", "application/octet-stream"),
+            "chunks": chunks(),
+            "close": stack.aclose
+        }
+
+    async def open_pagination(
+        self,
+        connector: Connector,
+        path: str,
+        method: str,
+        user_id: str,
+        parameters: Optional[Dict[str, Any]] = None,
+        max_items: Optional[int] = None,
+        max_pages: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        Fetch a paginated list operation page by page.
+        
+        The first page is fetched before returning so that errors can be
+        reported normally. Returns a dict with an async `items` iterator, a
+        `summary` dict that is filled in as pages are consumed and a `close`
+        coroutine function that cancels any prefetched pages, or an error
+        dict. Offset and page numbered styles prefetch up to
+        PAGINATION_CONCURRENCY pages ahead; link and cursor styles fetch the
+        next page while the current one is being consumed. At most that many
+        pages are held in memory regardless of the total.
+        """
+        max_items = min(max_items or settings.PAGINATION_MAX_ITEMS, settings.PAGINATION_MAX_ITEMS)
+        max_pages = min(max_pages or settings.PAGINATION_MAX_PAGES, settings.PAGINATION_MAX_PAGES)
+        prefetch = max(1, settings.PAGINATION_CONCURRENCY)
+        
+        try:
+            prepared = await self._prepare_request(connector, path, method, user_id, parameters)
+        except OAuthError as e:
+            return {"success": False, "error": str(e)}
+        if "error" in prepared:
+            return prepared
+        if prepared["method"] != "get":
+            return {"success": False, "error": "Auto-pagination is only supported for GET operations."}
+        
+        spec = connector.full_schema_json
+        operation_spec = spec.get("paths", {}).get(path, {}).get(prepared["method"], {})
+        config = pagination.detect_config(
+            operation_spec, settings.PAGINATION_PAGE_SIZE, operation_parameters(connector, path, prepared["method"])
+        )
+        limiter = rate_limiters.get(connector.connector_id, spec)
+        headers = prepared["headers"]
+        base_url = prepared["url"]
+        
+        def fetch(url: str) -> asyncio.Task:
+            return asyncio.ensure_future(self._fetch(connector.connector_id, "get", url, headers, None, limiter))
+        
+        if config.predictable:
+            first_url = pagination.numbered_page_url(base_url, config, 0)
+        elif config.limit_param:
+            first_url = str(httpx.URL(base_url).copy_merge_params({config.limit_param: config.page_size}))
+        else:
+            first_url = base_url
+        pending = deque([fetch(first_url)])
+        summary = {"pages": 0, "items": 0, "style": config.style, "complete": False, "error": None}
+        
+        async def next_page() -> Optional[List[Any]]:
+            """Await the oldest in-flight page and schedule the following ones."""
+            response = await pending.popleft()
+            if not 200 <= response.status_code < 300:
+                raise ValueError(f"HTTP {response.status_code}: {response.text[:500]}")
+            data = json.loads(response.content)
+            items = pagination.extract_items(data, config)
+            summary["pages"] += 1
+            
+            if config.predictable:
+                if not items or (config.limit_param and len(items) < config.page_size):
+                    # Short page: this was the last one, drop anything prefetched beyond it
+                    cancel_pending()
+                else:
+                    scheduled = summary["pages"] + len(pending)
+                    while len(pending) < prefetch and scheduled < max_pages:
+                        pending.append(fetch(pagination.numbered_page_url(base_url, config, scheduled)))
+                        scheduled += 1
+            else:
+                url = pagination.next_page_url(response, data, config)
+                summary["style"] = config.style
+                if url and summary["pages"] < max_pages:
+                    pending.append(fetch(url))
+            return items
+        
+        def cancel_pending():
+            while pending:
+                pending.pop().cancel()
+        
+        try:
+            first_items = await next_page()
+        except Exception as e:
+            cancel_pending()
+            return {"success": False, "error": str(e)}
+        
+        async def items():
+            page = first_items
+            try:
+                while True:
+                    for item in page:
+                        if summary["items"] >= max_items:
+                            return
+                        summary["items"] += 1
+                        yield item
+                    if not pending:
+                        summary["complete"] = True
+                        return
+                    page = await next_page()
+            except Exception as e:
+                summary["error"] = str(e)
+            finally:
+                cancel_pending()
+        
+        async def close():
+            cancel_pending()
+        
+        return {"success": True, "items": items(), "summary": summary, "close": close}
+
+    async def _prepare_request(
+        self,
+        connector: Connector,
+        path: str,
+        method: str,
+        user_id: str,
+        parameters: Optional[Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        """
+        Resolve the final URL, auth headers and body for an operation.
+        
+        Returns a dict with method, url, headers and body, or an error dict.
+        """
+        # Get the full OpenAPI spec
+        spec = connector.full_schema_json
+        
+        # Get base URL from servers
+        servers = spec.get("servers", [])
+        if not servers or len(servers) == 0:
             return {
                 "success": False,
-                "error": f"HTTP {e.response.status_code}: {e.response.text}",
-                "status_code": e.response.status_code
+                "error": f"No server URL defined in the OpenAPI spec for connector '{connector.name}'. Please update the spec to include a 'servers' section with a valid base URL."
             }
-        except Exception as e:
+        
+        base_url = servers[0].get("url", "")
+        if not base_url:
             return {
                 "success": False,
-                "error": str(e)
+                "error": f"Server URL is empty in the OpenAPI spec for connector '{connector.name}'."
+            }
+        
+        # Ensure base_url has a protocol
+        if not base_url.startswith(('http://', 'https://')):
+            # If it's a relative URL, we can't use it without a host
+            return {
+                "success": False,
+                "error": f"Invalid server URL '{base_url}' in OpenAPI spec. URL must start with 'http://' or 'https://'. Please update the connector's OpenAPI specification."
+            }
+        
+        # Get credentials from vault
+        secrets = vault.get_secrets(user_id, connector.connector_id)
+        
+        # Build headers
+        headers = {"Content-Type": "application/json"}
+        
+        # Add authentication based on spec
+        auth_type = spec.get("x-auth-type", "api-key")
+        if auth_type == "api-key":
+            api_key = secrets.get("api_key")
+            if api_key:
+                # Check if spec defines where to put the API key
+                security_schemes = spec.get("components", {}).get("securitySchemes", {})
+                if security_schemes:
+                    # Use the first security scheme
+                    scheme = list(security_schemes.values())[0]
+                    if scheme.get("in") == "header":
+                        key_name = scheme.get("name", "Authorization")
+                        headers[key_name] = f"Bearer {api_key}" if "Authorization" in key_name else api_key
+                else:
+                    # Default to Authorization header
+                    headers["Authorization"] = f"Bearer {api_key}"
+        oauth_key = None
+        if auth_type == "oauth2":
+            headers["Authorization"], oauth_key = await token_manager.authorization(
+                self.get_client(), connector, user_id, secrets, path, method
+            )
+        
+        # Build full URL
+        full_url = f"{base_url.rstrip('/')}{path}"
+        
+        # Replace path parameters; declared query and header parameters go where the spec says
+        locations = {p["name"]: p["in"] for p in operation_parameters(connector, path, method)}
+        query_params = {}
+        placed = set()
+        if parameters:
+            for key, value in parameters.items():
+                placeholder = f"{{{key}}}"
+                if placeholder in full_url:
+                    full_url = full_url.replace(placeholder, str(value))
+                elif locations.get(key) == "query":
+                    query_params[key] = value
+                    placed.add(key)
+                elif locations.get(key) == "header":
+                    headers[key] = str(value)
+                    placed.add(key)
+                else:
+                    logger.debug("Parameter not in path", extra={"parameter": key, "path": path})
+        if query_params:
+            full_url = str(httpx.URL(full_url).copy_merge_params(query_params))
+        
+        logger.debug("Resolved upstream URL", extra={"url": full_url, "parameters": sorted(parameters or {})})
+        
+        method = method.lower()
+        if method not in ("get", "post", "put", "delete"):
+            return {"error": f"Unsupported HTTP method: {method}"}
+        body = {k: v for k, v in (parameters or {}).items() if k not in placed} if method in ("post", "put") else None
+        
+        prepared = {"method": method, "url": full_url, "headers": headers, "body": body}
+        if oauth_key:
+            prepared["oauth_key"] = oauth_key
+        return prepared
+
+    async def _fetch(
+        self,
+        connector_id: str,
+        method: str,
+        url: str,
+        headers: Dict[str, str],
+        body: Optional[Dict[str, Any]],
+        limiter: Optional[ConnectorLimiter] = None
+    ) -> httpx.Response:
+        """
+        Send the request, sharing one upstream call between identical in-flight
+        idempotent requests (same connector, method, final URL and credentials).
+        """
+        if method not in COALESCE_METHODS or not settings.UPSTREAM_COALESCE_ENABLED:
+            return await self._send(method, url, headers, body, limiter)
+        
+        key = f"{method}|{response_cache.make_key(connector_id, url, headers)}|{headers.get('If-None-Match', '')}"
+        return await self.flights.do(key, lambda: self._send(method, url, headers, body, limiter))
+
+    async def _send(
+        self,
+        method: str,
+        url: str,
+        headers: Dict[str, str],
+        body: Optional[Dict[str, Any]],
+        limiter: Optional[ConnectorLimiter] = None
+    ) -> httpx.Response:
+        """
+        Send the request through the connector's rate limiter and the host's
+        circuit breaker, retrying idempotent methods on connection errors and
+        retryable statuses with jittered exponential backoff (honouring
+        Retry-After).
+        """
+        breaker = circuit_breakers.get(httpx.URL(url).netloc.decode())
+        attempts = 1 + (settings.UPSTREAM_MAX_RETRIES if method in IDEMPOTENT_METHODS else 0)
+        connector_id = limiter.connector_id if limiter else ""
+        
+        for attempt in range(attempts):
+            try:
+                response = await self._attempt(breaker, limiter, connector_id, method, url, headers, body)
+            except httpx.TransportError:
+                if attempt + 1 >= attempts:
+                    raise
+                delay = backoff_delay(attempt)
+            else:
+                retry_after = parse_retry_after(response.headers.get("retry-after"))
+                if limiter:
+                    if response.status_code == 429 or (response.status_code >= 400 and retry_after is not None):
+                        limiter.on_throttled(retry_after)
+                    elif response.status_code < 400:
+                        limiter.on_success()
+                
+                if response.status_code not in settings.UPSTREAM_RETRY_STATUSES or attempt + 1 >= attempts:
+                    return response
+                
+                delay = backoff_delay(attempt)
+                if retry_after is not None:
+                    if retry_after > settings.UPSTREAM_RETRY_BACKOFF_MAX:
+                        # Upstream asked us to come back later than we are willing to wait
+                        return response
+                    delay = max(delay, retry_after)
+            
+            logger.info(
+                "Retrying upstream call",
+                extra={"method": method.upper(), "host": breaker.host, "delay": round(delay, 2), "attempt": attempt + 2}
+            )
+            await asyncio.sleep(delay)
+
+    async def _attempt(
+        self,
+        breaker,
+        limiter: Optional[ConnectorLimiter],
+        connector_id: str,
+        method: str,
+        url: str,
+        headers: Dict[str, str],
+        body: Optional[Dict[str, Any]]
+    ) -> httpx.Response:
+        """
+        One attempt through the connector's limiter slot and the host's
+        breaker. A half-open trial is only taken once the slot is held, and
+        is released on any exit that gives no outcome (cancellation, deadline,
+        non-transport errors), so the breaker never waits on a lost trial.
+        """
+        breaker.raise_if_open()
+        async with limiter.slot() if limiter else nullcontext():
+            if not breaker.allow_request():
+                raise CircuitOpenError(breaker.host, breaker.retry_in())
+            trial = breaker.state == CircuitState.HALF_OPEN
+            try:
+                response = await self._request(connector_id, method, url, headers, body)
+            except httpx.TransportError:
+                breaker.record_failure()
+                raise
+            except BaseException:
+                if trial:
+                    breaker.release_trial()
+                raise
+        if response.status_code >= 500:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+        return response
+
+    async def _request(
+        self,
+        connector_id: str,
+        method: str,
+        url: str,
+        headers: Dict[str, str],
+        body: Optional[Dict[str, Any]]
+    ) -> httpx.Response:
+        """
+        Single upstream HTTP attempt in its own client span, recording its
+        latency and status code and propagating the trace via `traceparent`.
+        """
+        target = httpx.URL(url)
+        attributes = {"http.method": method.upper(), "server.address": target.host, "url.path": target.path}
+        started = time.monotonic()
+        with start_span(f"HTTP {method.upper()}", KIND_CLIENT, attributes) as span:
+            traceparent = current_traceparent()
+            if traceparent:
+                headers = {**headers, TRACEPARENT_HEADER: traceparent}
+            with UPSTREAM_REQUEST_SECONDS.labels(connector=connector_id).time():
+                try:
+                    response = await self.get_client().request(
+                        method.upper(), url, headers=headers, json=body, timeout=_request_timeout()
+                    )
+                except httpx.TransportError:
+                    UPSTREAM_RESPONSES.labels(connector=connector_id, status="error").inc()
+                    raise
+            span.set_attribute("http.status_code", response.status_code)
+            if response.status_code >= 500:
+                span.set_error(f"HTTP {response.status_code}")
+        UPSTREAM_RESPONSES.labels(connector=connector_id, status=str(response.status_code)).inc()
+        if capture.capturing():
+            capture.record(
+                "upstream", started, connector_id=connector_id, method=method.upper(), url=capture.sanitize_url(url),
+                status=response.status_code, headers={
+                    name: response.headers[name] for name in capture.UPSTREAM_RESPONSE_HEADERS if name in response.headers
+                },
+                body=capture.capture_body(response.content),
+            )
+        return response
+
+    def pool_stats(self) -> Dict[str, int]:
+        """Connections in the shared client's pool (empty before the first call)."""
+        pool = getattr(getattr(self._client, "_transport", None), "_pool", None)
+        connections = list(getattr(pool, "connections", []))
+        idle = sum(1 for connection in connections if connection.is_idle())
+        return {
+            "active": len(connections) - idle,
+            "idle": idle,
+            "waiting": sum(1 for request in list(getattr(pool, "_requests", [])) if request.is_queued()),
+        }
+
+    def get_client(self) -> httpx.AsyncClient:
+        """Shared connection-pooling client for all upstream calls."""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(timeout=settings.UPSTREAM_TIMEOUT)
+        return self._client
+
+    async def aclose(self):
+        await token_manager.aclose()
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _execute_cached_get(
+        self,
+        connector_id: str,
+        url: str,
+        headers: Dict[str, str],
+        ttl_override: Optional[float],
+        limiter: Optional[ConnectorLimiter] = None,
+        projection: Optional[Projection] = None
+    ) -> Dict[str, Any]:
+        """
+        Serve a GET from the response cache, revalidating stale entries with
+        If-None-Match when the upstream supplied an ETag.
+        """
+        key = response_cache.make_key(connector_id, url, headers)
+        entry = response_cache.get(key)
+        if entry and entry.is_fresh():
+            response_cache.hits += 1
+            return self._build_result(entry.status_code, entry.content, entry.encoding, "hit", projection)
+        
+        request_headers = dict(headers)
+        if entry and entry.etag:
+            request_headers["If-None-Match"] = entry.etag
+        
+        response = await self._fetch(connector_id, "get", url, request_headers, None, limiter)
+        if response.status_code == 304 and entry:
+            response_cache.revalidations += 1
+            response_cache.refresh(key, response.headers, ttl_override)
+            return self._build_result(entry.status_code, entry.content, entry.encoding, "revalidated", projection)
+        
+        response_cache.misses += 1
+        if response.status_code == 200:
+            response_cache.store(key, response, ttl_override)
+        return self._build_result(response.status_code, response.content, response.encoding, "miss", projection)
+
+    @staticmethod
+    def _cache_ttl_override(spec: Dict[str, Any], operation_spec: Dict[str, Any]) -> Optional[float]:
+        """Read the `x-cache-ttl` extension (operation level wins over spec level)."""
+        ttl = operation_spec.get("x-cache-ttl", spec.get("x-cache-ttl"))
+        try:
+            return float(ttl) if ttl is not None and float(ttl) >= 0 else None
+        except (TypeError, ValueError):
+            return None
+
+    @staticmethod
+    def _build_result(
+        status_code: int,
+        content: bytes,
+        encoding: Optional[str],
+        cache: Optional[str] = None,
+        projection: Optional[Projection] = None
+    ) -> Dict[str, Any]:
+        text = content.decode(encoding or "utf-8", errors="replace")
+        if not 200 <= status_code < 300:
+            return {
+                "success": False,
+                "error": f"HTTP {status_code}: {text}",
+                "status_code": status_code
             }
+        
+        report = None
+        try:
+            if projection:
+                data, report = decode_projected(content, encoding or "utf-8", projection)
+            else:
+                data = json.loads(content)
+        except ValueError:
+            data = {"response": text}
+        
+        result = {
+            "success": True,
+            "data": data,
+            "status_code": status_code
+        }
+        if cache:
+            result["cache"] = cache
+        if report:
+            result["projection"] = report
+        return result
 
 executor = APIExecutor()
+
+metrics.collector(
+    "upstream_pool_connections", "gauge", "Shared upstream connection pool usage by state",
+    lambda: [({"state": state}, count) for state, count in executor.pool_stats().items()],
+)
+metrics.collector(
+    "upstream_coalesced_total", "counter", "Upstream calls shared with an identical in-flight request",
+    lambda: [({}, executor.flights.stats()["coalesced"])],
+)
@@ -4,6 +4,7 @@ from fastapi import HTTPException
 from sqlalchemy.orm import Session
 from app.db.models import Connector, ConnectorStatus
 from app.core.config import settings
+from app.services.spec_parameters import build_operation_parameters
 
 def parse_openapi_spec(file_content: bytes, filename: str) -> dict:
     try:
@@ -41,6 +42,7 @@ def create_connector_from_spec(spec: dict, user_id: str, db: Session) -> Connect
         version=spec["info"].get("version", "1.0.0"),
         auth_type=auth_type,
         full_schema_json=spec,
+        operation_parameters=build_operation_parameters(spec),
         status=ConnectorStatus.PENDING_SECRETS
     )
     
@@ -0,0 +1,333 @@
+"""
+Job mode for long-running queries.
+
+A /query/query request with `"mode": "job"` is answered right away with a job
+id. The query then runs in the background, outside the request's deadline
+and admission slot:
+- at most JOB_MAX_CONCURRENCY jobs run at once per worker; further jobs wait
+  for a slot, and beyond JOB_MAX_PENDING new jobs are rejected with 503
+- a job has JOB_TIMEOUT as its deadline and JOB_UPSTREAM_TIMEOUT per upstream
+  attempt, so slow upstreams that would time out a synchronous call can finish
+
+Jobs and their results are stored in the database (table `query_jobs`), so
+any worker can answer a poll. Finished jobs are kept for JOB_RESULT_TTL
+seconds. Results over JOB_MAX_RESULT_BYTES fail the job, and once all
+results add up to more than JOB_STORE_MAX_BYTES the oldest finished jobs are
+evicted. Expired jobs are removed lazily on submit and poll.
+
+When the request gave a `callback_url`, the finished job (as returned by the
+poll endpoint) is POSTed there, retried with backoff on connection errors,
+429 and 5xx. With JOB_CALLBACK_SECRET set, the body is signed in the
+`X-Job-Signature: sha256=<hex HMAC-SHA256>` header. Callback hosts must be in
+JOB_CALLBACK_ALLOWED_HOSTS or, when that is empty, resolve to public
+addresses only; this is checked on submit and again before delivery, and
+redirects are not followed.
+
+Jobs run in the worker that accepted them. If it stops, its unfinished jobs
+are marked failed on a clean shutdown; after a crash they stay queued or
+running until they expire.
+"""
+import asyncio
+import datetime
+import hashlib
+import hmac
+import ipaddress
+import json
+import logging
+import math
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+from urllib.parse import urlsplit
+
+import httpx
+from sqlalchemy import func
+
+from app.core import capture
+from app.core.config import settings
+from app.core.deadline import DeadlineExceeded, request_deadline
+from app.core.metrics import metrics
+from app.db.models import JobStatus, QueryJob
+from app.db.session import SessionLocal
+from app.services.admission import Overloaded
+from app.services.executor import upstream_timeout
+from app.services.resilience import backoff_delay
+
+logger = logging.getLogger(__name__)
+
+SIGNATURE_HEADER = "X-Job-Signature"
+CALLBACK_RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+JOBS_FINISHED = metrics.counter("query_jobs_finished_total", "Query jobs finished, by status", ("status",))
+JOBS_REJECTED = metrics.counter("query_jobs_rejected_total", "Query jobs rejected because too many were pending")
+JOB_SECONDS = metrics.histogram(
+    "query_job_seconds", "Run time of query jobs (excluding the wait for a slot)", ("status",),
+    buckets=(0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 900.0),
+)
+JOBS_EVICTED = metrics.counter("query_jobs_evicted_total", "Stored jobs removed, by reason", ("reason",))
+JOB_CALLBACKS = metrics.counter("query_job_callbacks_total", "Job callback deliveries, by outcome", ("outcome",))
+
+# Weight of the latest job in the average run time (for Retry-After)
+_RUN_TIME_ALPHA = 0.2
+
+
+def _utcnow() -> datetime.datetime:
+    return datetime.datetime.utcnow()
+
+
+def _host_allowed(host: str) -> bool:
+    for allowed in settings.JOB_CALLBACK_ALLOWED_HOSTS:
+        allowed = allowed.lower()
+        if host == allowed or (allowed.startswith(".") and host.endswith(allowed)):
+            return True
+    return False
+
+
+async def check_callback_url(url: str) -> None:
+    """
+    Raise ValueError unless `url` is an http(s) URL the server may POST job
+    results to: its host is in JOB_CALLBACK_ALLOWED_HOSTS or, without an
+    allowlist, every address it resolves to is public (not loopback, private,
+    link-local, reserved or multicast).
+    """
+    target = urlsplit(url)
+    if target.scheme not in ("http", "https") or not target.hostname:
+        raise ValueError("callback_url must be an absolute http(s) URL")
+    host = target.hostname.lower()
+    if settings.JOB_CALLBACK_ALLOWED_HOSTS:
+        if not _host_allowed(host):
+            raise ValueError(f"callback_url host {host} is not in JOB_CALLBACK_ALLOWED_HOSTS")
+        return
+    try:
+        port = target.port or (443 if target.scheme == "https" else 80)
+        infos = await asyncio.get_running_loop().getaddrinfo(host, port)
+    except (OSError, ValueError):
+        raise ValueError(f"callback_url host {host} does not resolve")
+    for info in infos:
+        address = ipaddress.ip_address(info[4][0].split("%", 1)[0])
+        mapped = getattr(address, "ipv4_mapped", None)
+        if mapped:
+            address = mapped
+        if not address.is_global or address.is_multicast:
+            raise ValueError(f"callback_url host {host} resolves to a non-public address")
+
+
+def job_view(job: QueryJob) -> Dict[str, Any]:
+    """A stored job as returned by the poll endpoint and sent to callbacks."""
+    view = {
+        "job_id": job.job_id,
+        "status": job.status.value,
+        "created_at": job.created_at.isoformat() + "Z" if job.created_at else None,
+        "started_at": job.started_at.isoformat() + "Z" if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() + "Z" if job.finished_at else None,
+        "expires_at": job.expires_at.isoformat() + "Z" if job.expires_at else None,
+        "result": json.loads(job.result) if job.result else None,
+        "error": job.error,
+    }
+    if job.callback_url:
+        view["callback_status"] = job.callback_status
+    return view
+
+
+class JobManager:
+    """Runs query jobs in the background and keeps their results in the database."""
+
+    def __init__(self, max_concurrency: int, max_pending: int):
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_pending = max_pending
+        self._slots = asyncio.Semaphore(self.max_concurrency)
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self.running = 0
+        self.run_time = 1.0
+
+    def submit(self, query: str, run: Callable[[], Awaitable[Dict[str, Any]]], callback_url: Optional[str] = None) -> str:
+        """Store a new job and start `run` (returning the result as a dict) for it; returns the job id."""
+        if self.max_pending and len(self._tasks) >= self.max_pending:
+            JOBS_REJECTED.labels().inc()
+            waves = len(self._tasks) / self.max_concurrency
+            raise Overloaded("too many pending jobs", max(1, math.ceil(self.run_time * waves)))
+
+        with SessionLocal() as db:
+            self._remove_expired(db)
+            job = QueryJob(
+                query=query,
+                callback_url=callback_url,
+                # Bounds how long a job lost with its worker lingers
+                expires_at=_utcnow() + datetime.timedelta(seconds=settings.JOB_TIMEOUT + settings.JOB_RESULT_TTL),
+            )
+            db.add(job)
+            db.commit()
+            job_id = job.job_id
+
+        # The task gets a copy of the request's context (request id, trace)
+        task = asyncio.get_running_loop().create_task(self._run(job_id, run, callback_url))
+        self._tasks[job_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job_id, None))
+        return job_id
+
+    @property
+    def pending(self) -> int:
+        """Jobs of this worker that are queued or running."""
+        return len(self._tasks)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with SessionLocal() as db:
+            self._remove_expired(db)
+            job = db.get(QueryJob, job_id)
+            return job_view(job) if job else None
+
+    async def _run(self, job_id: str, run: Callable[[], Awaitable[Dict[str, Any]]], callback_url: Optional[str]) -> None:
+        # Events of the job don't belong to the captured submit request
+        capture.detach()
+        status, result, error = JobStatus.FAILED, None, None
+        try:
+            async with self._slots:
+                self.running += 1
+                started = time.monotonic()
+                try:
+                    self._update(job_id, status=JobStatus.RUNNING, started_at=_utcnow())
+                    with request_deadline(settings.JOB_TIMEOUT), upstream_timeout(settings.JOB_UPSTREAM_TIMEOUT):
+                        result = json.dumps(await run(), default=str)
+                    status = JobStatus.SUCCEEDED
+                except DeadlineExceeded as e:
+                    error = f"Job exceeded JOB_TIMEOUT ({settings.JOB_TIMEOUT:g}s) during {e.stage}"
+                except Exception as e:
+                    logger.exception("Query job failed", extra={"job_id": job_id})
+                    error = str(e) or type(e).__name__
+                finally:
+                    self.running -= 1
+                    elapsed = time.monotonic() - started
+                    self.run_time += _RUN_TIME_ALPHA * (elapsed - self.run_time)
+        except asyncio.CancelledError:
+            self._finish(job_id, JobStatus.FAILED, None, "Server shut down before the job finished")
+            raise
+
+        JOB_SECONDS.labels(status=status.value).observe(elapsed)
+        self._finish(job_id, status, result, error)
+        if callback_url:
+            await self._deliver(job_id, callback_url)
+
+    def _finish(self, job_id: str, status: JobStatus, result: Optional[str], error: Optional[str]) -> None:
+        size = len(result.encode()) if result else 0
+        if size > settings.JOB_MAX_RESULT_BYTES:
+            error = (f"Result of {size} bytes exceeds JOB_MAX_RESULT_BYTES ({settings.JOB_MAX_RESULT_BYTES}); "
+                     "narrow it with fields, max_items or max_bytes")
+            status, result, size = JobStatus.FAILED, None, 0
+        now = _utcnow()
+        self._update(
+            job_id, status=status, result=result, result_bytes=size, error=error, finished_at=now,
+            expires_at=now + datetime.timedelta(seconds=settings.JOB_RESULT_TTL),
+        )
+        JOBS_FINISHED.labels(status=status.value).inc()
+        logger.info("Query job finished", extra={"job_id": job_id, "status": status.value, "result_bytes": size})
+        with SessionLocal() as db:
+            self._evict_oldest(db, keep=job_id)
+
+    def _update(self, job_id: str, **fields: Any) -> None:
+        with SessionLocal() as db:
+            db.query(QueryJob).filter(QueryJob.job_id == job_id).update(fields)
+            db.commit()
+
+    @staticmethod
+    def _remove_expired(db) -> None:
+        removed = db.query(QueryJob).filter(QueryJob.expires_at < _utcnow()).delete()
+        db.commit()
+        if removed:
+            JOBS_EVICTED.labels(reason="expired").inc(removed)
+
+    @staticmethod
+    def _evict_oldest(db, keep: Optional[str] = None) -> None:
+        """
+        Remove the oldest finished jobs while all stored results exceed
+        JOB_STORE_MAX_BYTES, never the job `keep` (the one just finished, whose
+        result hasn't been polled or delivered yet).
+        """
+        total = db.query(func.coalesce(func.sum(QueryJob.result_bytes), 0)).scalar()
+        if total <= settings.JOB_STORE_MAX_BYTES:
+            return
+        evicted = []
+        finished = (
+            db.query(QueryJob.job_id, QueryJob.result_bytes)
+            .filter(QueryJob.finished_at.isnot(None), QueryJob.job_id != keep)
+            .order_by(QueryJob.finished_at)
+        )
+        for job_id, size in finished:
+            if total <= settings.JOB_STORE_MAX_BYTES:
+                break
+            evicted.append(job_id)
+            total -= size or 0
+        db.query(QueryJob).filter(QueryJob.job_id.in_(evicted)).delete(synchronize_session=False)
+        db.commit()
+        JOBS_EVICTED.labels(reason="size").inc(len(evicted))
+
+    async def _deliver(self, job_id: str, callback_url: str) -> None:
+        """POST the finished job to its callback URL, retrying transient failures."""
+        view = self.get(job_id)
+        if view is None:
+            return
+        body = json.dumps(view).encode()
+        headers = {"Content-Type": "application/json", "X-Job-ID": job_id}
+        if settings.JOB_CALLBACK_SECRET:
+            digest = hmac.new(settings.JOB_CALLBACK_SECRET.encode(), body, hashlib.sha256).hexdigest()
+            headers[SIGNATURE_HEADER] = f"sha256={digest}"
+
+        outcome = None
+        # Redirects aren't followed: the target would escape the host check
+        async with httpx.AsyncClient(timeout=settings.JOB_CALLBACK_TIMEOUT, follow_redirects=False) as client:
+            for attempt in range(settings.JOB_CALLBACK_RETRIES + 1):
+                if attempt:
+                    await asyncio.sleep(backoff_delay(attempt - 1))
+                try:
+                    # Again before each attempt: the host's DNS may have changed since submit
+                    await check_callback_url(callback_url)
+                except ValueError as e:
+                    outcome = f"rejected: {e}"
+                    break
+                try:
+                    response = await client.post(callback_url, content=body, headers=headers)
+                except httpx.HTTPError as e:
+                    outcome = f"failed: {type(e).__name__}"
+                    continue
+                if response.status_code < 300:
+                    outcome = "delivered"
+                    break
+                outcome = f"failed: HTTP {response.status_code}"
+                if response.status_code not in CALLBACK_RETRY_STATUSES:
+                    break
+
+        JOB_CALLBACKS.labels(outcome="delivered" if outcome == "delivered" else "failed").inc()
+        if outcome != "delivered":
+            logger.warning("Job callback failed", extra={"job_id": job_id, "outcome": outcome})
+        self._update(job_id, callback_status=outcome)
+
+    async def aclose(self) -> None:
+        """Cancel unfinished jobs (marking them failed) on shutdown."""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        with SessionLocal() as db:
+            stored = dict(db.query(QueryJob.status, func.count()).group_by(QueryJob.status).all())
+            stored_bytes = db.query(func.coalesce(func.sum(QueryJob.result_bytes), 0)).scalar()
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_pending": self.max_pending,
+            "running": self.running,
+            "pending": self.pending,
+            "run_time": round(self.run_time, 3),
+            "stored": {status.value: count for status, count in stored.items()},
+            "stored_result_bytes": stored_bytes,
+        }
+
+
+job_manager = JobManager(settings.JOB_MAX_CONCURRENCY, settings.JOB_MAX_PENDING)
+
+metrics.collector(
+    "query_jobs_running", "gauge", "Query jobs running in this worker",
+    lambda: [({}, job_manager.running)],
+)
+metrics.collector(
+    "query_jobs_pending", "gauge", "Query jobs queued or running in this worker",
+    lambda: [({}, job_manager.pending)],
+)
@@ -0,0 +1,288 @@
+"""
+Request and token rate governor for LLM provider calls.
+
+One `ModelGovernor` per provider and model keeps calls under the provider's
+requests-per-minute (RPM) and tokens-per-minute (TPM) limits:
+- calls queue (FIFO) until a request and their estimated tokens are
+  available, for at most LLM_GOVERNOR_MAX_WAIT seconds, instead of bursting
+  into 429s; the estimate is corrected with the usage the response reports
+- remaining-request / remaining-token headers (OpenAI `x-ratelimit-*`,
+  Anthropic `anthropic-ratelimit-*`) lower the local budget when the provider
+  knows better (other clients may share the key), and their limits are
+  adopted when none is configured
+- a 429 pauses all calls to that model for Retry-After (or a backoff)
+
+Limits come from LLM_RATE_LIMITS, keyed by "provider/model" or "provider":
+    {"openai": {"rpm": 500, "tpm": 200000}, "anthropic/claude-3-5-haiku-latest": {"rpm": 50}}
+"""
+import asyncio
+import re
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Optional, Tuple
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.services.resilience import backoff_delay, parse_retry_after
+
+# Rough prompt size in tokens (about four characters per token for English text)
+CHARS_PER_TOKEN = 4
+
+# Pause after a 429 that carries no Retry-After, per consecutive 429
+DEFAULT_THROTTLE_PAUSE = 1.0
+
+# Header prefixes of the remaining/limit values providers send
+_RATE_LIMIT_HEADERS = ("x-ratelimit-", "anthropic-ratelimit-")
+
+LLM_GOVERNOR_WAIT_SECONDS = metrics.histogram(
+    "llm_governor_wait_seconds", "Time LLM calls waited for request/token budget", ("provider", "model")
+)
+LLM_GOVERNOR_THROTTLED = metrics.counter(
+    "llm_governor_throttled_total", "429 responses from LLM providers", ("provider", "model")
+)
+LLM_GOVERNOR_REJECTED = metrics.counter(
+    "llm_governor_rejected_total", "LLM calls given up because the budget would not free up in time", ("provider", "model")
+)
+
+
+class LLMRateLimited(Exception):
+    pass
+
+
+def estimate_tokens(prompt: str, max_output_tokens: int) -> int:
+    """Tokens a call may consume: the prompt (approximated) plus the output cap."""
+    return len(prompt) // CHARS_PER_TOKEN + max_output_tokens
+
+
+def parse_duration(value: Optional[str]) -> Optional[float]:
+    """Seconds in OpenAI reset values such as "20ms", "1s" or "6m0s"."""
+    if not value:
+        return None
+    parts = re.findall(r"([\d.]+)(ms|h|m|s)", value)
+    if not parts:
+        return parse_retry_after(value)
+    scale = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+    return sum(float(number) * scale[unit] for number, unit in parts)
+
+
+def usage_tokens(result: Dict[str, Any]) -> Optional[int]:
+    """Total tokens reported in an OpenAI, Anthropic or Gemini response body."""
+    usage = result.get("usage") or {}
+    if "total_tokens" in usage:
+        return int(usage["total_tokens"])
+    if "input_tokens" in usage:
+        return int(usage["input_tokens"]) + int(usage.get("output_tokens", 0))
+    metadata = result.get("usageMetadata") or {}
+    if "totalTokenCount" in metadata:
+        return int(metadata["totalTokenCount"])
+    return None
+
+
+class _Budget:
+    """Token bucket refilled at `limit` units per minute (None = unlimited)."""
+
+    def __init__(self, limit: Optional[float]):
+        self.learned = False
+        self.configure(limit)
+
+    def configure(self, limit: Optional[float]) -> None:
+        self.limit = limit
+        self.available = float(limit) if limit else 0.0
+        self.updated = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        if self.limit:
+            self.available = min(self.limit, self.available + (now - self.updated) * self.limit / 60.0)
+        self.updated = now
+
+    def wait_for(self, amount: float) -> float:
+        """Seconds until `amount` (capped at the limit) is available."""
+        if not self.limit:
+            return 0.0
+        deficit = min(amount, self.limit) - self.available
+        return max(0.0, deficit * 60.0 / self.limit)
+
+
+class Reservation:
+    """Budget taken by one call; `record` corrects it with the usage the response reports."""
+    __slots__ = ("governor", "time", "tokens")
+
+    def __init__(self, governor: "ModelGovernor", when: float, tokens: int):
+        self.governor = governor
+        self.time = when
+        self.tokens = tokens
+
+    def record(self, actual: Optional[int]) -> None:
+        if actual is None:
+            return
+        self.governor.tokens.available += self.tokens - actual
+        self.tokens = actual
+
+
+class ModelGovernor:
+    def __init__(self, provider: str, model: str, rpm: Optional[float], tpm: Optional[float], max_concurrency: int):
+        self.provider = provider
+        self.model = model
+        self.requests = _Budget(rpm)
+        self.tokens = _Budget(tpm)
+        self.paused_until = 0.0
+        self.consecutive_throttles = 0
+        self.throttled = 0
+        self.queued = 0
+        self.semaphore = asyncio.Semaphore(max_concurrency) if max_concurrency else None
+        self._lock = asyncio.Lock()
+        # Reservations of the last minute, for utilisation
+        self._window: deque = deque()
+
+    @asynccontextmanager
+    async def permit(self, estimated_tokens: int):
+        """
+        Wait for budget (raising `LLMRateLimited` if it won't come in time)
+        and hold a concurrency slot; yields the `Reservation`.
+        """
+        reservation = await self._reserve(estimated_tokens)
+        if self.semaphore:
+            async with self.semaphore:
+                yield reservation
+        else:
+            yield reservation
+
+    async def _reserve(self, amount: int) -> Reservation:
+        start = time.monotonic()
+        self.queued += 1
+        try:
+            # The lock makes waiting calls take their turn in arrival order
+            async with self._lock:
+                while True:
+                    now = time.monotonic()
+                    self.requests.refill(now)
+                    self.tokens.refill(now)
+                    wait = max(self.paused_until - now, self.requests.wait_for(1), self.tokens.wait_for(amount))
+                    if wait <= 0:
+                        break
+                    if now + wait - start > settings.LLM_GOVERNOR_MAX_WAIT:
+                        LLM_GOVERNOR_REJECTED.labels(provider=self.provider, model=self.model).inc()
+                        raise LLMRateLimited(
+                            f"{self.provider}/{self.model} rate limit: no budget within {settings.LLM_GOVERNOR_MAX_WAIT}s"
+                        )
+                    await asyncio.sleep(wait)
+                self.requests.available -= 1
+                self.tokens.available -= amount
+                reservation = Reservation(self, now, amount)
+                self._window.append(reservation)
+                self._prune(now)
+        finally:
+            self.queued -= 1
+        LLM_GOVERNOR_WAIT_SECONDS.labels(provider=self.provider, model=self.model).observe(time.monotonic() - start)
+        return reservation
+
+    def on_response(self, status_code: int, headers) -> None:
+        """Adapt to the provider's rate-limit headers; a 429 pauses the model."""
+        self._adopt_headers(headers)
+        if status_code != 429:
+            self.consecutive_throttles = 0
+            return
+
+        self.throttled += 1
+        self.consecutive_throttles += 1
+        LLM_GOVERNOR_THROTTLED.labels(provider=self.provider, model=self.model).inc()
+        delay = parse_retry_after(headers.get("retry-after"))
+        if delay is None:
+            delay = max(
+                parse_duration(headers.get("x-ratelimit-reset-requests")) or 0.0,
+                parse_duration(headers.get("x-ratelimit-reset-tokens")) or 0.0,
+            ) or DEFAULT_THROTTLE_PAUSE * self.consecutive_throttles + backoff_delay(self.consecutive_throttles - 1)
+        self.paused_until = max(self.paused_until, time.monotonic() + delay)
+        self.requests.available = min(self.requests.available, 0.0)
+
+    def _adopt_headers(self, headers) -> None:
+        for budget, kind in ((self.requests, "requests"), (self.tokens, "tokens")):
+            limit, remaining = self._header_values(headers, kind)
+            if limit and (budget.limit is None or budget.learned):
+                if budget.limit != limit:
+                    budget.configure(limit)
+                budget.learned = True
+            if remaining is not None and budget.limit:
+                budget.available = min(budget.available, remaining)
+
+    @staticmethod
+    def _header_values(headers, kind: str) -> Tuple[Optional[float], Optional[float]]:
+        values = []
+        for field in ("limit", "remaining"):
+            value = None
+            for prefix in _RATE_LIMIT_HEADERS:
+                name = f"{prefix}{field}-{kind}" if prefix == "x-ratelimit-" else f"{prefix}{kind}-{field}"
+                if headers.get(name) is not None:
+                    try:
+                        value = float(headers[name])
+                    except ValueError:
+                        pass
+                    break
+            values.append(value)
+        return values[0], values[1]
+
+    def _prune(self, now: float) -> None:
+        while self._window and now - self._window[0].time > 60.0:
+            self._window.popleft()
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        self._prune(now)
+        used_tokens = sum(reservation.tokens for reservation in self._window)
+        return {
+            "provider": self.provider,
+            "model": self.model,
+            "rpm_limit": self.requests.limit,
+            "tpm_limit": self.tokens.limit,
+            "requests_last_minute": len(self._window),
+            "tokens_last_minute": used_tokens,
+            "request_utilisation": round(len(self._window) / self.requests.limit, 4) if self.requests.limit else None,
+            "token_utilisation": round(used_tokens / self.tokens.limit, 4) if self.tokens.limit else None,
+            "queued": self.queued,
+            "throttled": self.throttled,
+            "paused_for": round(max(0.0, self.paused_until - now), 3),
+        }
+
+
+class LLMGovernorRegistry:
+    def __init__(self):
+        self._governors: Dict[Tuple[str, str], ModelGovernor] = {}
+
+    def get(self, provider: str, model: str) -> ModelGovernor:
+        governor = self._governors.get((provider, model))
+        if governor is None:
+            limits = settings.LLM_RATE_LIMITS.get(f"{provider}/{model}") or settings.LLM_RATE_LIMITS.get(provider) or {}
+            governor = ModelGovernor(
+                provider, model, limits.get("rpm"), limits.get("tpm"),
+                int(limits.get("max_concurrency", settings.LLM_MAX_CONCURRENCY) or 0)
+            )
+            self._governors[(provider, model)] = governor
+        return governor
+
+    def stats(self) -> list:
+        return [governor.stats() for governor in list(self._governors.values())]
+
+
+llm_governors = LLMGovernorRegistry()
+
+
+def _samples(key: str):
+    return [
+        ({"provider": s["provider"], "model": s["model"]}, s[key])
+        for s in llm_governors.stats() if s[key] is not None
+    ]
+
+
+metrics.collector(
+    "llm_governor_request_utilisation", "gauge", "Requests in the last minute as a share of the RPM limit",
+    lambda: _samples("request_utilisation"),
+)
+metrics.collector(
+    "llm_governor_token_utilisation", "gauge", "Tokens in the last minute as a share of the TPM limit",
+    lambda: _samples("token_utilisation"),
+)
+metrics.collector(
+    "llm_governor_queued", "gauge", "LLM calls waiting for request/token budget",
+    lambda: _samples("queued"),
+)
@@ -1,9 +1,22 @@
 """
 LLM Service for intelligent parameter extraction and query processing.
 """
+import functools
 import json
-from typing import Dict, List, Any
+import logging
+import time
+from typing import Dict, List, Any, Tuple
+from app.core import capture
+from app.core.config import settings
+from app.core.metrics import LLM_REQUEST_SECONDS, QUERY_DECISIONS, time_stage
+from app.core.tracing import start_span, KIND_CLIENT
 from app.services.vault import vault
+from app.services.llm_governor import llm_governors, estimate_tokens, usage_tokens
+
+logger = logging.getLogger(__name__)
+
+# Output cap of every completion request (also the per-call token estimate's upper bound)
+MAX_OUTPUT_TOKENS = 500
 
 async def extract_parameters_with_llm(
     query: str,
@@ -25,6 +38,19 @@ async def extract_parameters_with_llm(
     """
     # Get LLM configuration
     config = vault.get_secrets("system", "global_config")
+    provider = config.get("agentProvider", "openai") if config else "none"
+    with start_span("llm.extract_parameters", attributes={"llm.provider": provider, "parameters": len(param_definitions)}):
+        with time_stage("parameter_extraction", provider=provider):
+            return await _extract_parameters(query, param_definitions, operation_summary, operation_description, config)
+
+
+async def _extract_parameters(
+    query: str,
+    param_definitions: List[Dict[str, Any]],
+    operation_summary: str,
+    operation_description: str,
+    config: Dict[str, Any]
+) -> Dict[str, Any]:
     if not config:
         # Fallback to simple extraction if no LLM configured
         return _fallback_extraction(query, param_definitions)
@@ -50,7 +76,7 @@ async def extract_parameters_with_llm(
         return _parse_llm_response(result, param_definitions)
     
     except Exception as e:
-        print(f"LLM extraction failed: {e}, falling back to regex")
+        logger.warning("LLM extraction failed, falling back to regex", extra={"error": str(e)})
         return _fallback_extraction(query, param_definitions)
 
 
@@ -102,10 +128,70 @@ Response:"""
     return prompt
 
 
-async def _call_openai(prompt: str, model: str, api_key: str) -> str:
-    """Call OpenAI API for parameter extraction."""
+async def _post_governed(
+    provider: str,
+    model: str,
+    prompt: str,
+    url: str,
+    payload: Dict[str, Any],
+    headers: Dict[str, str] = None
+) -> Dict[str, Any]:
+    """
+    POST a completion request within the provider/model's request and token
+    budget. 429s pause the model and are retried (up to LLM_MAX_RETRIES) once
+    the governor lets the call through again.
+    """
     import httpx
     
+    governor = llm_governors.get(provider, model)
+    estimated = estimate_tokens(prompt, MAX_OUTPUT_TOKENS)
+    for attempt in range(settings.LLM_MAX_RETRIES + 1):
+        async with governor.permit(estimated) as reservation:
+            async with httpx.AsyncClient(timeout=30.0) as client:
+                started = time.monotonic()
+                response = await client.post(url, headers=headers, json=payload)
+            if capture.capturing():
+                capture.record(
+                    "llm", started, provider=provider, model=model, prompt=capture.prompt_key(prompt),
+                    status=response.status_code, headers={
+                        name: value for name, value in response.headers.items()
+                        if name == "retry-after" or "ratelimit" in name
+                    },
+                    **capture.llm_body(response.content),
+                )
+            governor.on_response(response.status_code, response.headers)
+            if response.status_code == 429 and attempt < settings.LLM_MAX_RETRIES:
+                # Rejected calls don't count against the token limit
+                reservation.record(0)
+                continue
+            response.raise_for_status()
+            result = response.json()
+            reservation.record(usage_tokens(result))
+            return result
+
+
+def _record_llm_call(provider: str):
+    """Trace calls to an LLM provider and record their latency and outcome."""
+    def decorator(call):
+        @functools.wraps(call)
+        async def wrapper(prompt: str, model: str, api_key: str) -> str:
+            start = time.perf_counter()
+            outcome = "error"
+            attributes = {"gen_ai.system": provider, "gen_ai.request.model": model}
+            try:
+                with start_span(f"llm.{provider}", KIND_CLIENT, attributes):
+                    result = await call(prompt, model, api_key)
+                outcome = "success"
+                return result
+            finally:
+                LLM_REQUEST_SECONDS.labels(provider=provider, outcome=outcome).observe(time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+@_record_llm_call("openai")
+async def _call_openai(prompt: str, model: str, api_key: str) -> str:
+    """Call OpenAI API for parameter extraction."""
     headers = {
         "Authorization": f"Bearer {api_key}",
         "Content-Type": "application/json"
@@ -118,24 +204,16 @@ async def _call_openai(prompt: str, model: str, api_key: str) -> str:
             {"role": "user", "content": prompt}
         ],
         "temperature": 0.1,
-        "max_tokens": 500  # Increased from 200
+        "max_tokens": MAX_OUTPUT_TOKENS
     }
     
-    async with httpx.AsyncClient(timeout=30.0) as client:
-        response = await client.post(
-            "https://api.openai.com/v1/chat/completions",
-            headers=headers,
-            json=payload
-        )
-        response.raise_for_status()
-        result = response.json()
-        return result["choices"][0]["message"]["content"]
+    result = await _post_governed("openai", model, prompt, f"{settings.OPENAI_BASE_URL}/v1/chat/completions", payload, headers)
+    return result["choices"][0]["message"]["content"]
 
 
+@_record_llm_call("anthropic")
 async def _call_anthropic(prompt: str, model: str, api_key: str) -> str:
     """Call Anthropic API for parameter extraction."""
-    import httpx
-    
     headers = {
         "x-api-key": api_key,
         "anthropic-version": "2023-06-01",
@@ -144,33 +222,25 @@ async def _call_anthropic(prompt: str, model: str, api_key: str) -> str:
     
     payload = {
         "model": model,
-        "max_tokens": 500,  # Increased from 200
+        "max_tokens": MAX_OUTPUT_TOKENS,
         "temperature": 0.1,
         "messages": [
             {"role": "user", "content": prompt}
         ]
     }
     
-    async with httpx.AsyncClient(timeout=30.0) as client:
-        response = await client.post(
-            "https://api.anthropic.com/v1/messages",
-            headers=headers,
-            json=payload
-        )
-        response.raise_for_status()
-        result = response.json()
-        return result["content"][0]["text"]
+    result = await _post_governed("anthropic", model, prompt, f"{settings.ANTHROPIC_BASE_URL}/v1/messages", payload, headers)
+    return result["content"][0]["text"]
 
 
+@_record_llm_call("google")
 async def _call_google(prompt: str, model: str, api_key: str) -> str:
     """Call Google Gemini API for parameter extraction."""
-    import httpx
-    
     # Strip 'models/' prefix if present
     if model.startswith("models/"):
         model = model[7:]
     
-    url = f"https://generativelanguage.googleapis.com/v1beta/models/{model}:generateContent?key={api_key}"
+    url = f"{settings.GOOGLE_AI_BASE_URL}/v1beta/models/{model}:generateContent?key={api_key}"
     
     payload = {
         "contents": [{
@@ -178,44 +248,39 @@ async def _call_google(prompt: str, model: str, api_key: str) -> str:
         }],
         "generationConfig": {
             "temperature": 0.1,
-            "maxOutputTokens": 500  # Increased from 200 to prevent MAX_TOKENS cutoff
+            "maxOutputTokens": MAX_OUTPUT_TOKENS  # 200 was cut off with MAX_TOKENS
         }
     }
     
-    async with httpx.AsyncClient(timeout=30.0) as client:
-        response = await client.post(url, json=payload)
-        response.raise_for_status()
-        result = response.json()
-        
-        # Debug: print the response structure
-        print(f"[DEBUG] Google API response keys: {result.keys()}")
-        
-        # Handle different response structures
-        if "candidates" not in result:
-            raise ValueError(f"No candidates in response. Response: {result}")
-        
-        if not result["candidates"]:
-            raise ValueError(f"Empty candidates list. Response: {result}")
-        
-        candidate = result["candidates"][0]
-        
-        # Check for content filtering or blocked content
-        if "content" not in candidate:
-            # Check if there's a finish reason
-            finish_reason = candidate.get("finishReason", "UNKNOWN")
-            safety_ratings = candidate.get("safetyRatings", [])
-            raise ValueError(f"No content in candidate. Finish reason: {finish_reason}, Safety ratings: {safety_ratings}")
-        
-        content = candidate["content"]
-        
-        # Check if content is empty (common with content filtering)
-        if "parts" not in content or not content.get("parts"):
-            # This often happens with content filtering or safety blocks
-            finish_reason = candidate.get("finishReason", "UNKNOWN")
-            safety_ratings = candidate.get("safetyRatings", [])
-            raise ValueError(f"Empty or missing parts in content (likely content filtering). Content: {content}, Finish reason: {finish_reason}, Safety ratings: {safety_ratings}")
-        
-        return content["parts"][0]["text"]
+    result = await _post_governed("google", model, prompt, url, payload)
+    logger.debug("Google API response keys", extra={"keys": list(result.keys())})
+    
+    # Handle different response structures
+    if "candidates" not in result:
+        raise ValueError(f"No candidates in response. Response: {result}")
+    
+    if not result["candidates"]:
+        raise ValueError(f"Empty candidates list. Response: {result}")
+    
+    candidate = result["candidates"][0]
+    
+    # Check for content filtering or blocked content
+    if "content" not in candidate:
+        # Check if there's a finish reason
+        finish_reason = candidate.get("finishReason", "UNKNOWN")
+        safety_ratings = candidate.get("safetyRatings", [])
+        raise ValueError(f"No content in candidate. Finish reason: {finish_reason}, Safety ratings: {safety_ratings}")
+    
+    content = candidate["content"]
+    
+    # Check if content is empty (common with content filtering)
+    if "parts" not in content or not content.get("parts"):
+        # This often happens with content filtering or safety blocks
+        finish_reason = candidate.get("finishReason", "UNKNOWN")
+        safety_ratings = candidate.get("safetyRatings", [])
+        raise ValueError(f"Empty or missing parts in content (likely content filtering). Content: {content}, Finish reason: {finish_reason}, Safety ratings: {safety_ratings}")
+    
+    return content["parts"][0]["text"]
 
 
 def _parse_llm_response(response: str, param_definitions: List[Dict[str, Any]]) -> Dict[str, Any]:
@@ -234,15 +299,30 @@ def _parse_llm_response(response: str, param_definitions: List[Dict[str, Any]])
         # Parse JSON
         params = json.loads(response)
         
-        # Validate and convert types based on parameter definitions
-        validated_params = {}
-        for param_def in param_definitions:
-            param_name = param_def.get("name")
-            if param_name in params:
-                param_type = param_def.get("schema", {}).get("type", "string")
-                value = params[param_name]
-                
-                # Convert to correct type
+        return _coerce_parameters(params, param_definitions)
+    
+    except Exception as e:
+        logger.warning("Failed to parse LLM response", extra={"error": str(e)})
+        logger.debug("Unparseable LLM response", extra={"response": response})
+        return {}
+
+
+def _coerce_parameters(
+    params: Dict[str, Any], param_definitions: List[Dict[str, Any]], drop_invalid: bool = False
+) -> Dict[str, Any]:
+    """
+    Keep only defined parameters and convert them to their declared types.
+    A value that doesn't convert raises, or with `drop_invalid` is left out.
+    """
+    validated_params = {}
+    for param_def in param_definitions:
+        param_name = param_def.get("name")
+        if param_name in params:
+            param_type = param_def.get("schema", {}).get("type", "string")
+            value = params[param_name]
+            
+            # Convert to correct type
+            try:
                 if param_type == "integer":
                     validated_params[param_name] = int(value)
                 elif param_type == "number":
@@ -251,13 +331,12 @@ def _parse_llm_response(response: str, param_definitions: List[Dict[str, Any]])
                     validated_params[param_name] = bool(value)
                 else:
                     validated_params[param_name] = str(value)
-        
-        return validated_params
+            except (TypeError, ValueError):
+                if not drop_invalid:
+                    raise
+                logger.warning("Dropping parameter of the wrong type", extra={"parameter": param_name, "type": param_type})
     
-    except Exception as e:
-        print(f"Failed to parse LLM response: {e}")
-        print(f"Response was: {response}")
-        return {}
+    return validated_params
 
 
 def _fallback_extraction(query: str, param_definitions: List[Dict[str, Any]]) -> Dict[str, Any]:
@@ -320,16 +399,29 @@ async def assess_function_matches(
     """
     # Get LLM configuration
     config = vault.get_secrets("system", "global_config")
-    
+    provider = config.get("agentProvider", "openai") if config else "none"
+    with time_stage("assessment", provider=provider):
+        source, assessment = await _assess_function_matches(query, candidates, config)
+    decision = f"{source}_{'selected' if assessment.get('selected') else 'rejected'}"
+    QUERY_DECISIONS.labels(decision=decision, provider=provider).inc()
+    return assessment
+
+
+async def _assess_function_matches(
+    query: str,
+    candidates: List[Dict[str, Any]],
+    config: Dict[str, Any]
+) -> Tuple[str, Dict[str, Any]]:
+    """Assessment plus how it was decided: "similarity", "llm" or "fallback"."""
     # Log assessment details
-    print(f"[ASSESSMENT] Query: {query}")
-    print(f"[ASSESSMENT] Candidates: {len(candidates)}")
-    print(f"[ASSESSMENT] LLM configured: {config is not None}")
-    if candidates and len(candidates) > 0:
-        top_distance = candidates[0].get("distance", 1.0)
-        top_similarity = 1 - top_distance
-        print(f"[ASSESSMENT] Top candidate similarity: {top_similarity:.3f}")
-        print(f"[ASSESSMENT] Top candidate: {candidates[0].get('metadata', {}).get('operation_id', 'unknown')}")
+    if candidates and logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Assessing candidates", extra={
+            "query": query,
+            "candidates": len(candidates),
+            "llm_configured": config is not None,
+            "top_similarity": round(1 - candidates[0].get("distance", 1.0), 3),
+            "top_candidate": candidates[0].get("metadata", {}).get("operation_id", "unknown"),
+        })
     
     if not config:
         # No LLM configured - use similarity threshold
@@ -339,8 +431,8 @@ async def assess_function_matches(
             
             # Use reasonable threshold (0.40+) for auto-selection
             if similarity >= 0.40:
-                print(f"[ASSESSMENT] No LLM configured, but reasonable similarity ({similarity:.3f}) - auto-selecting")
-                return {
+                logger.info("No LLM configured, auto-selecting top candidate", extra={"similarity": round(similarity, 3)})
+                return "similarity", {
                     "selected": True,
                     "index": 0,
                     "reasoning": f"No LLM configured. Auto-selected top result with similarity ({similarity:.2f}). Configure an LLM for better assessment.",
@@ -348,8 +440,8 @@ async def assess_function_matches(
                 }
         
         # Reject if no LLM and low similarity
-        print(f"[ASSESSMENT] No LLM configured and similarity too low ({similarity:.3f}) - rejecting")
-        return {
+        logger.info("No LLM configured and similarity too low, rejecting", extra={"similarity": round(similarity, 3)})
+        return "similarity", {
             "selected": False,
             "index": None,
             "reasoning": f"No LLM configured and similarity too low ({similarity:.2f}). Please configure an LLM provider in settings for intelligent function assessment.",
@@ -372,7 +464,7 @@ async def assess_function_matches(
             result = await _call_google(prompt, model, config.get("googleApiKey"))
         else:
             # Fallback: use the top result
-            return {
+            return "fallback", {
                 "selected": True,
                 "index": 0,
                 "reasoning": "Unknown LLM provider, using top vector DB result",
@@ -380,12 +472,10 @@ async def assess_function_matches(
             }
         
         # Parse the LLM assessment response
-        return _parse_assessment_response(result, len(candidates))
+        return "llm", _parse_assessment_response(result, len(candidates))
     
     except Exception as e:
-        print(f"[ASSESSMENT] LLM assessment failed: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("LLM assessment failed")
         
         # When LLM fails, use similarity threshold as fallback
         if candidates and len(candidates) > 0:
@@ -394,8 +484,8 @@ async def assess_function_matches(
             
             # Use reasonable threshold (0.40+) when LLM fails
             if similarity >= 0.40:
-                print(f"[ASSESSMENT] LLM failed but reasonable similarity ({similarity:.3f}) - auto-selecting with warning")
-                return {
+                logger.warning("LLM failed, auto-selecting top candidate", extra={"similarity": round(similarity, 3)})
+                return "fallback", {
                     "selected": True,
                     "index": 0,
                     "reasoning": f"LLM assessment failed ({str(e)}), but auto-selected due to reasonable similarity ({similarity:.2f}). Please check LLM configuration.",
@@ -403,8 +493,8 @@ async def assess_function_matches(
                 }
         
         # Reject if LLM failed and similarity is too low
-        print(f"[ASSESSMENT] LLM failed and similarity too low ({similarity:.3f}) - rejecting for safety")
-        return {
+        logger.warning("LLM failed and similarity too low, rejecting", extra={"similarity": round(similarity, 3)})
+        return "fallback", {
             "selected": False,
             "index": None,
             "reasoning": f"LLM assessment failed ({str(e)}) and similarity too low ({similarity:.2f}). Please check your LLM configuration in settings.",
@@ -510,7 +600,7 @@ def _parse_assessment_response(response: str, num_candidates: int) -> Dict[str,
         
         # Validate index
         if selected and (index is None or not isinstance(index, int) or index < 0 or index >= num_candidates):
-            print(f"Warning: Invalid index {index}, defaulting to 0")
+            logger.warning("Invalid candidate index from LLM, defaulting to 0", extra={"index": index})
             index = 0
         
         return {
@@ -521,8 +611,8 @@ def _parse_assessment_response(response: str, num_candidates: int) -> Dict[str,
         }
     
     except Exception as e:
-        print(f"Failed to parse LLM assessment response: {e}")
-        print(f"Response was: {response}")
+        logger.warning("Failed to parse LLM assessment response", extra={"error": str(e)})
+        logger.debug("Unparseable LLM assessment response", extra={"response": response})
         
         # Fallback: assume top result is best if we have candidates
         if num_candidates > 0:
@@ -539,3 +629,155 @@ def _parse_assessment_response(response: str, num_candidates: int) -> Dict[str,
                 "reasoning": "No candidates available",
                 "confidence": "none"
             }
+
+
+
+async def plan_function_calls(
+    query: str,
+    candidates: List[Dict[str, Any]],
+    max_operations: int = 5
+) -> Dict[str, Any]:
+    """
+    Use LLM to plan one or more independent function calls that together answer the query.
+    
+    Unlike assess_function_matches, the same candidate may be used several
+    times with different parameters (e.g. "compare order 5 and order 9"), and
+    candidates from different connectors may be combined.
+    
+    Args:
+        query: The natural language query from the user
+        candidates: Candidate functions from vector DB, as for
+            assess_function_matches, plus an optional "parameters" list of
+            parameter definitions per candidate
+        max_operations: Upper bound on the number of planned calls
+    
+    Returns:
+        Dictionary with:
+        - selected: bool - Whether at least one suitable call was planned
+        - operations: list of {"index": int, "parameters": dict}
+        - reasoning: str - Explanation of the plan
+        - confidence: str - "high", "medium", "low", or "none"
+    """
+    config = vault.get_secrets("system", "global_config")
+    provider = config.get("agentProvider", "openai") if config else None
+    
+    if provider in ("openai", "anthropic", "google"):
+        model = config.get("agentModel", "gpt-4o")
+        prompt = _build_plan_prompt(query, candidates, max_operations)
+        try:
+            with time_stage("planning", provider=provider):
+                if provider == "openai":
+                    result = await _call_openai(prompt, model, config.get("openaiApiKey"))
+                elif provider == "anthropic":
+                    result = await _call_anthropic(prompt, model, config.get("anthropicApiKey"))
+                else:
+                    result = await _call_google(prompt, model, config.get("googleApiKey"))
+            plan = _parse_plan_response(result, len(candidates), max_operations)
+            for operation in plan["operations"]:
+                # Undefined and invalid values are dropped, never sent upstream;
+                # a required one is then missing and extracted again by the caller
+                definitions = candidates[operation["index"]].get("parameters") or []
+                operation["parameters"] = _coerce_parameters(operation["parameters"], definitions, drop_invalid=True)
+            return plan
+        except Exception as e:
+            logger.warning("LLM planning failed, falling back to single function assessment", extra={"error": str(e)})
+    
+    # No (working) LLM: degrade to a single-operation plan
+    assessment = await assess_function_matches(query, candidates)
+    return {
+        "selected": assessment.get("selected", False),
+        "operations": [{"index": assessment["index"], "parameters": {}}] if assessment.get("selected") else [],
+        "reasoning": assessment.get("reasoning", ""),
+        "confidence": assessment.get("confidence", "none")
+    }
+
+
+def _build_plan_prompt(query: str, candidates: List[Dict[str, Any]], max_operations: int) -> str:
+    """Build a prompt for the LLM to plan multiple function calls."""
+    
+    candidates_info = []
+    for i, candidate in enumerate(candidates):
+        metadata = candidate.get("metadata", {})
+        params = []
+        for param in candidate.get("parameters", []):
+            params.append(
+                f"{param.get('name', '')} ({param.get('in', '')}, {param.get('schema', {}).get('type', 'string')})"
+                f"{' [REQUIRED]' if param.get('required') else ''}"
+            )
+        candidates_info.append(
+            f"""Candidate {i}:
+  Operation: {metadata.get("operation_id", "unknown")}
+  Endpoint: {metadata.get("method", "unknown").upper()} {metadata.get("path", "unknown")}
+  Description: {candidate.get("document", "")}
+  Parameters: {", ".join(params) or "none"}"""
+        )
+    
+    candidates_text = "\n\n".join(candidates_info)
+    
+    prompt = f"""You are an API call planner. Decide which API calls (if any) are needed to answer the user's request.
+
+User Query: "{query}"
+
+Available Functions:
+{candidates_text}
+
+RULES:
+1. Plan only calls that DIRECTLY provide the requested data; reject greetings, general questions and other domains
+2. Use as few calls as possible, at most {max_operations}
+3. The same function may be called several times with different parameters (e.g. to compare two records)
+4. Calls must be independent of each other - they will run at the same time
+5. Extract parameter values from the query and convert them to the declared types
+6. When in doubt, REJECT rather than planning incorrect calls
+
+Respond with a JSON object in this exact format:
+{{
+  "selected": true or false,
+  "operations": [{{"index": <candidate number>, "parameters": {{"name": value}}}}],
+  "reasoning": "<brief explanation of your plan>",
+  "confidence": "<high|medium|low|none>"
+}}
+
+Example - "compare the status of order 5 and order 9" with getOrderById as Candidate 0:
+{{"selected": true, "operations": [{{"index": 0, "parameters": {{"orderId": 5}}}}, {{"index": 0, "parameters": {{"orderId": 9}}}}], "reasoning": "Two lookups of getOrderById", "confidence": "high"}}
+
+Response:"""
+    
+    return prompt
+
+
+def _parse_plan_response(response: str, num_candidates: int, max_operations: int) -> Dict[str, Any]:
+    """Parse the LLM plan response, dropping invalid or duplicate operations."""
+    response = response.strip()
+    
+    # Remove markdown code blocks if present
+    if response.startswith("```"):
+        lines = response.split("\n")
+        response = "\n".join(lines[1:-1]) if len(lines) > 2 else response
+        response = response.replace("```json", "").replace("```", "").strip()
+    
+    plan = json.loads(response)
+    if not isinstance(plan, dict):
+        raise ValueError("Response is not a JSON object")
+    
+    operations = []
+    seen = set()
+    for operation in plan.get("operations") or []:
+        index = operation.get("index") if isinstance(operation, dict) else None
+        if not isinstance(index, int) or not 0 <= index < num_candidates:
+            continue
+        parameters = operation.get("parameters") or {}
+        if not isinstance(parameters, dict):
+            parameters = {}
+        key = (index, json.dumps(parameters, sort_keys=True))
+        if key in seen:
+            continue
+        seen.add(key)
+        operations.append({"index": index, "parameters": parameters})
+    
+    operations = operations[:max_operations]
+    return {
+        "selected": bool(plan.get("selected")) and bool(operations),
+        "operations": operations,
+        "reasoning": str(plan.get("reasoning", "No reasoning provided")),
+        "confidence": str(plan.get("confidence", "low"))
+    }
@@ -0,0 +1,299 @@
+"""
+OAuth2 access tokens for upstream calls (`x-auth-type: oauth2`).
+
+Tokens are obtained with the client-credentials grant, or with the
+refresh-token grant when a refresh token is available. They are cached per
+user, connector and scope set, and persisted (encrypted) in the vault, so
+neither a request nor a restart pays for a token round trip while a token is
+still valid.
+
+- Concurrent requests for the same key share one token fetch (singleflight).
+- A token used close to its expiry is renewed in the background, and the
+  current one is returned meanwhile.
+- A token that was used since it was issued is also renewed shortly before
+  it expires, by a timer.
+
+Connector secrets: `client_id`, `client_secret`, optionally `refresh_token`,
+`token_url` (overrides the spec's `tokenUrl`), `scope` (used when the spec
+names no scopes) and `client_auth` (`basic`, the default, or `post`).
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import httpx
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.services.singleflight import SingleFlight
+from app.services.vault import vault
+
+logger = logging.getLogger(__name__)
+
+# Vault entry (next to the connector's secrets) holding its issued tokens
+TOKENS_SUFFIX = ".oauth-tokens"
+
+OAUTH_TOKEN_FETCHES = metrics.counter(
+    "oauth_token_fetches_total", "OAuth2 token requests by grant and outcome", ("connector", "grant", "outcome")
+)
+
+
+class OAuthError(Exception):
+    pass
+
+
+def _oauth_scheme(spec: Dict[str, Any]) -> Tuple[Optional[str], Dict[str, Any]]:
+    """Name and definition of the spec's first OAuth2 security scheme."""
+    schemes = spec.get("components", {}).get("securitySchemes") or spec.get("securityDefinitions") or {}
+    for name, scheme in schemes.items():
+        if scheme.get("type") == "oauth2":
+            return name, scheme
+    return None, {}
+
+
+def _token_url(scheme: Dict[str, Any]) -> Optional[str]:
+    flows = scheme.get("flows", {})
+    for flow in ("clientCredentials", "authorizationCode", "password"):
+        if flows.get(flow, {}).get("tokenUrl"):
+            return flows[flow]["tokenUrl"]
+    # Swagger 2
+    return scheme.get("tokenUrl")
+
+
+def required_scopes(spec: Dict[str, Any], path: str, method: str, scheme_name: Optional[str]) -> List[str]:
+    """Scopes the operation (or, failing that, the whole API) requires from the OAuth2 scheme."""
+    operation = spec.get("paths", {}).get(path, {}).get(method.lower(), {})
+    requirements = operation.get("security", spec.get("security", []))
+    for requirement in requirements or []:
+        if scheme_name in requirement:
+            return sorted(requirement[scheme_name])
+    return []
+
+
+class TokenManager:
+    def __init__(self):
+        self.flights = SingleFlight()
+        self._tokens: Dict[str, Dict[str, Any]] = {}
+        self._used: Set[str] = set()
+        self._timers: Dict[str, asyncio.TimerHandle] = {}
+        self._background: Set[asyncio.Task] = set()
+
+    @staticmethod
+    def cache_key(user_id: str, connector_id: str, scope: str) -> str:
+        return f"{user_id}|{connector_id}|{scope}"
+
+    async def authorization(
+        self,
+        client: httpx.AsyncClient,
+        connector,
+        user_id: str,
+        secrets: Dict[str, Any],
+        path: str,
+        method: str
+    ) -> Tuple[str, str]:
+        """`Authorization` header value for an operation and the cache key of its token."""
+        spec = connector.full_schema_json
+        scheme_name, scheme = _oauth_scheme(spec)
+        token_url = secrets.get("token_url") or _token_url(scheme)
+        if not token_url:
+            raise OAuthError(f"No OAuth2 token URL for connector '{connector.name}': add a tokenUrl to the spec or a 'token_url' secret.")
+        scopes = required_scopes(spec, path, method, scheme_name) or sorted((secrets.get("scope") or "").split())
+        scope = " ".join(scopes)
+
+        token = await self.get_token(client, connector.connector_id, user_id, secrets, token_url, scope)
+        return f"{token.get('token_type') or 'Bearer'} {token['access_token']}", self.cache_key(user_id, connector.connector_id, scope)
+
+    async def get_token(
+        self,
+        client: httpx.AsyncClient,
+        connector_id: str,
+        user_id: str,
+        secrets: Dict[str, Any],
+        token_url: str,
+        scope: str
+    ) -> Dict[str, Any]:
+        key = self.cache_key(user_id, connector_id, scope)
+        request = (client, connector_id, user_id, secrets, token_url, scope)
+        token = self._tokens.get(key)
+        if token is None:
+            # Issued before a restart
+            token = self._load(user_id, connector_id).get(scope)
+            if token:
+                self._tokens[key] = token
+                self._schedule_refresh(key, token, request)
+
+        now = time.time()
+        if token and now < token["expires_at"] - settings.OAUTH_EXPIRY_MARGIN:
+            self._used.add(key)
+            if now >= token["expires_at"] - settings.OAUTH_REFRESH_AHEAD and not self.flights.in_flight(key):
+                self._refresh_in_background(request)
+            return token
+        return await self.flights.do(key, lambda: self._fetch(*request))
+
+    def invalidate(self, key: str) -> None:
+        """
+        Expire a token the upstream rejected, so the next call fetches a new
+        one (still through its refresh token, if any).
+        """
+        token = self._tokens.get(key)
+        if token is None:
+            return
+        self._tokens[key] = {**token, "expires_at": 0}
+        self._cancel_timer(key)
+        user_id, connector_id, _ = key.split("|", 2)
+        self._store(user_id, connector_id)
+
+    def forget(self, user_id: str, connector_id: str) -> None:
+        """Drop all tokens of a connector (its credentials changed or it was deleted)."""
+        prefix = self.cache_key(user_id, connector_id, "")
+        for key in [key for key in self._tokens if key.startswith(prefix)]:
+            del self._tokens[key]
+            self._cancel_timer(key)
+        vault.delete_secrets(user_id, f"{connector_id}{TOKENS_SUFFIX}")
+
+    def _cancel_timer(self, key: str) -> None:
+        timer = self._timers.pop(key, None)
+        if timer:
+            timer.cancel()
+
+    async def _fetch(
+        self,
+        client: httpx.AsyncClient,
+        connector_id: str,
+        user_id: str,
+        secrets: Dict[str, Any],
+        token_url: str,
+        scope: str
+    ) -> Dict[str, Any]:
+        key = self.cache_key(user_id, connector_id, scope)
+        previous = self._tokens.get(key) or {}
+        refresh_token = previous.get("refresh_token") or secrets.get("refresh_token")
+        has_client_secret = bool(secrets.get("client_id") and secrets.get("client_secret"))
+
+        token = None
+        if refresh_token:
+            token = await self._request(client, connector_id, secrets, token_url, scope, {
+                "grant_type": "refresh_token", "refresh_token": refresh_token
+            }, raise_error=not has_client_secret)
+            if token is not None and not token.get("refresh_token"):
+                # Servers that don't rotate refresh tokens keep the old one valid
+                token["refresh_token"] = refresh_token
+        if token is None:
+            if not has_client_secret:
+                raise OAuthError(f"Connector '{connector_id}' needs 'client_id' and 'client_secret' (or a 'refresh_token') for OAuth2.")
+            token = await self._request(client, connector_id, secrets, token_url, scope, {"grant_type": "client_credentials"})
+
+        self._tokens[key] = token
+        self._used.discard(key)
+        self._store(user_id, connector_id)
+        self._schedule_refresh(key, token, (client, connector_id, user_id, secrets, token_url, scope))
+        return token
+
+    async def _request(
+        self,
+        client: httpx.AsyncClient,
+        connector_id: str,
+        secrets: Dict[str, Any],
+        token_url: str,
+        scope: str,
+        form: Dict[str, str],
+        raise_error: bool = True
+    ) -> Optional[Dict[str, Any]]:
+        """Token endpoint call; returns the token record, or None on failure when not raising."""
+        grant = form["grant_type"]
+        form = dict(form)
+        if scope:
+            form["scope"] = scope
+        auth = None
+        if secrets.get("client_id"):
+            if secrets.get("client_auth", "basic") == "post":
+                form["client_id"] = secrets["client_id"]
+                if secrets.get("client_secret"):
+                    form["client_secret"] = secrets["client_secret"]
+            else:
+                auth = (secrets["client_id"], secrets.get("client_secret", ""))
+
+        try:
+            response = await client.post(
+                token_url, data=form, auth=auth, headers={"Accept": "application/json"}, timeout=settings.OAUTH_TOKEN_TIMEOUT
+            )
+            payload = response.json() if response.content else {}
+            if response.status_code >= 400 or not payload.get("access_token"):
+                detail = payload.get("error_description") or payload.get("error") or f"HTTP {response.status_code}"
+                raise OAuthError(f"OAuth2 {grant} grant failed for connector '{connector_id}': {detail}")
+        except (httpx.HTTPError, ValueError, OAuthError) as e:
+            OAUTH_TOKEN_FETCHES.labels(connector=connector_id, grant=grant, outcome="error").inc()
+            logger.warning("OAuth2 token request failed", extra={"connector_id": connector_id, "grant": grant, "error": str(e)})
+            if not raise_error:
+                return None
+            raise e if isinstance(e, OAuthError) else OAuthError(f"OAuth2 token request failed for connector '{connector_id}': {e}")
+
+        OAUTH_TOKEN_FETCHES.labels(connector=connector_id, grant=grant, outcome="success").inc()
+        expires_in = float(payload.get("expires_in") or settings.OAUTH_DEFAULT_TOKEN_TTL)
+        token = {
+            "access_token": payload["access_token"],
+            "token_type": "Bearer" if payload.get("token_type", "").lower() in ("", "bearer") else payload["token_type"],
+            "expires_at": time.time() + expires_in,
+        }
+        if payload.get("refresh_token"):
+            token["refresh_token"] = payload["refresh_token"]
+        return token
+
+    def _refresh_in_background(self, request: tuple) -> None:
+        key = self.cache_key(request[2], request[1], request[5])
+
+        async def refresh():
+            try:
+                await self.flights.do(key, lambda: self._fetch(*request))
+            except Exception as e:
+                # The current token stays in use until it expires
+                logger.warning("Background OAuth2 token refresh failed", extra={"connector_id": request[1], "error": str(e)})
+
+        task = asyncio.get_running_loop().create_task(refresh())
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    def _schedule_refresh(self, key: str, token: Dict[str, Any], request: tuple) -> None:
+        """Renew the token shortly before expiry, if it is used until then."""
+        self._cancel_timer(key)
+        delay = token["expires_at"] - settings.OAUTH_REFRESH_AHEAD - time.time()
+        if delay <= 0:
+            return
+
+        def fire():
+            self._timers.pop(key, None)
+            if key in self._used and self._tokens.get(key) is token:
+                self._refresh_in_background(request)
+
+        self._timers[key] = asyncio.get_running_loop().call_later(delay, fire)
+
+    def _load(self, user_id: str, connector_id: str) -> Dict[str, Dict[str, Any]]:
+        return vault.get_secrets(user_id, f"{connector_id}{TOKENS_SUFFIX}")
+
+    def _store(self, user_id: str, connector_id: str) -> None:
+        prefix = self.cache_key(user_id, connector_id, "")
+        tokens = {key[len(prefix):]: token for key, token in self._tokens.items() if key.startswith(prefix)}
+        vault.store_secrets(user_id, f"{connector_id}{TOKENS_SUFFIX}", tokens)
+
+    async def aclose(self) -> None:
+        for timer in self._timers.values():
+            timer.cancel()
+        self._timers.clear()
+        for task in list(self._background):
+            task.cancel()
+
+    def stats(self) -> Dict[str, int]:
+        return {"cached": len(self._tokens), "scheduled_refreshes": len(self._timers), **self.flights.stats()}
+
+
+token_manager = TokenManager()
+
+metrics.collector(
+    "oauth_tokens_cached", "gauge", "OAuth2 access tokens held in memory",
+    lambda: [({}, token_manager.stats()["cached"])],
+)
+metrics.collector(
+    "oauth_token_fetches_coalesced_total", "counter", "Token requests that joined an in-flight fetch for the same key",
+    lambda: [({}, token_manager.stats()["coalesced"])],
+)
@@ -0,0 +1,192 @@
+"""
+Local embeddings with ONNX Runtime (embedding provider "onnx").
+
+This runs an exported, optionally int8-quantized, ONNX version of a
+sentence-transformers model (e.g. all-MiniLM-L6-v2) on CPU. It gives the
+same vectors as the PyTorch "local" provider without importing torch, with
+a fraction of its memory and usually faster encoding.
+
+The model directory (ONNX_EMBEDDING_MODEL_PATH, or the model's Hugging Face
+repository downloaded on first use) needs:
+- `tokenizer.json`
+- the ONNX file (ONNX_EMBEDDING_FILE), e.g. `onnx/model.onnx`, or the
+  quantized `onnx/model_quint8_avx2.onnx`
+- optionally `modules.json` and `1_Pooling/config.json`, which select the
+  pooling mode and normalization as sentence-transformers would
+
+Tokenized texts are kept in a bounded LRU cache, since the same queries and
+operation descriptions come back.
+"""
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Hugging Face organisation of models referred to by their short name
+DEFAULT_ORGANISATION = "sentence-transformers"
+
+
+def _model_directory(model_name: str) -> str:
+    if settings.ONNX_EMBEDDING_MODEL_PATH:
+        return settings.ONNX_EMBEDDING_MODEL_PATH
+    from huggingface_hub import snapshot_download
+
+    repo_id = model_name if "/" in model_name else f"{DEFAULT_ORGANISATION}/{model_name}"
+    return snapshot_download(
+        repo_id,
+        allow_patterns=["tokenizer.json", "modules.json", "1_Pooling/config.json", settings.ONNX_EMBEDDING_FILE],
+    )
+
+
+def _pooling(directory: str) -> Tuple[str, bool]:
+    """(pooling mode, normalize) as configured for sentence-transformers; mean pooling by default."""
+    mode, normalize = "mean", False
+    try:
+        with open(os.path.join(directory, "modules.json")) as f:
+            modules = json.load(f)
+        normalize = any(module.get("type", "").endswith("Normalize") for module in modules)
+    except (OSError, ValueError):
+        # Without modules.json, behave like the sentence-transformers defaults of MiniLM-style models
+        normalize = True
+    try:
+        with open(os.path.join(directory, "1_Pooling", "config.json")) as f:
+            config = json.load(f)
+        if config.get("pooling_mode_cls_token"):
+            mode = "cls"
+        elif config.get("pooling_mode_max_tokens"):
+            mode = "max"
+    except (OSError, ValueError):
+        pass
+    return mode, normalize
+
+
+class OnnxEmbeddingFunction:
+    """Chroma-compatible embedding function backed by an ONNX Runtime session."""
+
+    def __init__(self, model_name: str):
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        self.model_name = model_name
+        directory = _model_directory(model_name)
+        self.tokenizer = Tokenizer.from_file(os.path.join(directory, "tokenizer.json"))
+        self.tokenizer.no_padding()
+        self.tokenizer.enable_truncation(max_length=settings.ONNX_MAX_SEQUENCE_LENGTH)
+        self.pooling, self.normalize = _pooling(directory)
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.execution_mode = onnxruntime.ExecutionMode.ORT_SEQUENTIAL
+        if settings.ONNX_NUM_THREADS:
+            options.intra_op_num_threads = settings.ONNX_NUM_THREADS
+        options.inter_op_num_threads = 1
+        self.session = onnxruntime.InferenceSession(
+            os.path.join(directory, settings.ONNX_EMBEDDING_FILE), options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+
+        self._cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self.cache_hits = 0
+        self.cache_misses = 0
+        logger.info(
+            "ONNX embedding model loaded",
+            extra={"model": model_name, "file": settings.ONNX_EMBEDDING_FILE, "pooling": self.pooling,
+                   "threads": settings.ONNX_NUM_THREADS or "default"},
+        )
+
+    @staticmethod
+    def name() -> str:
+        return "onnx-runtime"
+
+    def _token_ids(self, texts: List[str]) -> List[np.ndarray]:
+        """Token ids per text, through the LRU cache."""
+        ids: List[Optional[np.ndarray]] = [None] * len(texts)
+        missing: Dict[str, List[int]] = {}
+        with self._cache_lock:
+            for index, text in enumerate(texts):
+                cached = self._cache.get(text)
+                if cached is None:
+                    missing.setdefault(text, []).append(index)
+                else:
+                    self._cache.move_to_end(text)
+                    ids[index] = cached
+            self.cache_hits += len(texts) - sum(map(len, missing.values()))
+            self.cache_misses += len(missing)
+        if not missing:
+            return ids
+
+        encodings = self.tokenizer.encode_batch(list(missing))
+        with self._cache_lock:
+            for (text, indexes), encoding in zip(missing.items(), encodings):
+                token_ids = np.asarray(encoding.ids, dtype=np.int64)
+                for index in indexes:
+                    ids[index] = token_ids
+                if settings.ONNX_TOKENIZER_CACHE_SIZE > 0:
+                    self._cache[text] = token_ids
+            while len(self._cache) > settings.ONNX_TOKENIZER_CACHE_SIZE:
+                self._cache.popitem(last=False)
+        return ids
+
+    def _encode_batch(self, token_ids: List[np.ndarray]) -> np.ndarray:
+        length = max(len(ids) for ids in token_ids)
+        input_ids = np.zeros((len(token_ids), length), dtype=np.int64)
+        attention_mask = np.zeros((len(token_ids), length), dtype=np.int64)
+        for row, ids in enumerate(token_ids):
+            input_ids[row, :len(ids)] = ids
+            attention_mask[row, :len(ids)] = 1
+        feed = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self.input_names:
+            feed["token_type_ids"] = np.zeros_like(input_ids)
+        hidden = self.session.run(None, feed)[0]
+
+        if self.pooling == "cls":
+            pooled = hidden[:, 0]
+        elif self.pooling == "max":
+            pooled = np.where(attention_mask[..., None] > 0, hidden, -np.inf).max(axis=1)
+        else:
+            mask = attention_mask[..., None].astype(hidden.dtype)
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        if self.normalize:
+            pooled = pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+        return pooled.astype(np.float32)
+
+    def __call__(self, input: List[str]) -> List[np.ndarray]:
+        if not input:
+            return []
+        token_ids = self._token_ids(list(input))
+        # Batch texts of similar length together so little compute goes to padding
+        order = sorted(range(len(token_ids)), key=lambda index: len(token_ids[index]))
+        embeddings: List[Optional[np.ndarray]] = [None] * len(token_ids)
+        batch_size = max(1, settings.ONNX_BATCH_SIZE)
+        for start in range(0, len(order), batch_size):
+            batch = order[start:start + batch_size]
+            for index, vector in zip(batch, self._encode_batch([token_ids[index] for index in batch])):
+                embeddings[index] = vector
+        return embeddings
+
+    def stats(self) -> Dict[str, int]:
+        return {"cached_texts": len(self._cache), "cache_hits": self.cache_hits, "cache_misses": self.cache_misses}
+
+
+_functions: Dict[str, OnnxEmbeddingFunction] = {}
+_functions_lock = threading.Lock()
+
+
+def onnx_embedding_function(model_name: str) -> OnnxEmbeddingFunction:
+    """Shared embedding function per model (sessions are thread-safe and expensive to create)."""
+    function = _functions.get(model_name)
+    if function is None:
+        with _functions_lock:
+            function = _functions.get(model_name)
+            if function is None:
+                function = _functions[model_name] = OnnxEmbeddingFunction(model_name)
+    return function
@@ -0,0 +1,147 @@
+"""
+Pagination style detection and next-page resolution for upstream list operations.
+"""
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+from urllib.parse import urljoin
+
+import httpx
+
+# Keys commonly used for the list of items in a paginated response envelope
+ITEMS_KEYS = ("items", "data", "results", "records", "entries", "values", "objects")
+# Dotted paths commonly holding the next cursor or next page URL
+CURSOR_PATHS = (
+    "next", "next_cursor", "nextCursor", "next_page_token", "nextPageToken",
+    "cursor.next", "links.next", "_links.next.href", "meta.next_cursor",
+    "meta.next", "pagination.next_cursor", "pagination.next", "paging.next",
+)
+CURSOR_PARAMS = ("cursor", "page_token", "pageToken", "after", "starting_after", "next", "continuation")
+OFFSET_PARAMS = ("offset", "skip", "start")
+LIMIT_PARAMS = ("limit", "per_page", "page_size", "pageSize", "size", "count", "top")
+PAGE_PARAMS = ("page", "page_number", "pageNumber")
+
+
+@dataclass
+class PaginationConfig:
+    style: Optional[str] = None  # link | cursor | offset | page; None = detect from the first response
+    items_path: Optional[str] = None
+    cursor_path: Optional[str] = None
+    cursor_param: Optional[str] = None
+    offset_param: Optional[str] = None
+    page_param: Optional[str] = None
+    limit_param: Optional[str] = None
+    page_size: Optional[int] = None
+
+    @property
+    def predictable(self) -> bool:
+        """Offset and page numbered styles allow fetching several pages ahead."""
+        return self.style in ("offset", "page")
+
+
+def _get_path(data: Any, path: str) -> Any:
+    for part in path.split("."):
+        if not isinstance(data, dict):
+            return None
+        data = data.get(part)
+    return data
+
+
+def detect_config(
+    operation_spec: Dict[str, Any], default_page_size: int, parameters: Optional[List[Dict[str, Any]]] = None
+) -> PaginationConfig:
+    """
+    Build the pagination config from the operation's `x-pagination` extension,
+    falling back to well-known query parameter names declared on the operation
+    (`parameters`: its resolved parameter list, when available).
+    """
+    extension = operation_spec.get("x-pagination") or {}
+    config = PaginationConfig(
+        style=extension.get("style"),
+        items_path=extension.get("items-path"),
+        cursor_path=extension.get("cursor-path"),
+        cursor_param=extension.get("cursor-param"),
+        offset_param=extension.get("offset-param"),
+        page_param=extension.get("page-param"),
+        limit_param=extension.get("limit-param"),
+        page_size=extension.get("page-size"),
+    )
+
+    query_params = {
+        p.get("name") for p in (operation_spec.get("parameters", []) if parameters is None else parameters)
+        if isinstance(p, dict) and p.get("in") == "query"
+    }
+    config.limit_param = config.limit_param or next((p for p in LIMIT_PARAMS if p in query_params), None)
+    config.cursor_param = config.cursor_param or next((p for p in CURSOR_PARAMS if p in query_params), None)
+    if config.style is None:
+        offset_param = next((p for p in OFFSET_PARAMS if p in query_params), None)
+        page_param = next((p for p in PAGE_PARAMS if p in query_params), None)
+        if offset_param and config.limit_param:
+            config.style, config.offset_param = "offset", offset_param
+        elif page_param:
+            config.style, config.page_param = "page", page_param
+    if config.style == "offset":
+        config.offset_param = config.offset_param or "offset"
+        config.limit_param = config.limit_param or "limit"
+    if config.style == "page":
+        config.page_param = config.page_param or "page"
+    if config.predictable or config.limit_param:
+        config.page_size = int(config.page_size or default_page_size)
+    return config
+
+
+def extract_items(data: Any, config: PaginationConfig) -> List[Any]:
+    """Return the list of items in a page (a bare array or a list inside an envelope)."""
+    if config.items_path:
+        items = _get_path(data, config.items_path)
+        return items if isinstance(items, list) else []
+    if isinstance(data, list):
+        return data
+    if isinstance(data, dict):
+        for key in ITEMS_KEYS:
+            if isinstance(data.get(key), list):
+                return data[key]
+        lists = [value for value in data.values() if isinstance(value, list)]
+        if len(lists) == 1:
+            return lists[0]
+    return []
+
+
+def next_page_url(response: httpx.Response, data: Any, config: PaginationConfig) -> Optional[str]:
+    """
+    Resolve the URL of the next page for link and cursor styles, detecting the
+    style from the first response when it was not declared.
+    """
+    current_url = str(response.request.url)
+
+    if config.style in (None, "link"):
+        link = response.links.get("next", {}).get("url")
+        if link:
+            config.style = "link"
+            return urljoin(current_url, link)
+
+    if config.style in (None, "cursor") and isinstance(data, dict):
+        paths = (config.cursor_path,) if config.cursor_path else CURSOR_PATHS
+        for path in paths:
+            cursor = _get_path(data, path)
+            if isinstance(cursor, dict):
+                cursor = cursor.get("href") or cursor.get("url")
+            if not cursor or isinstance(cursor, bool) or not isinstance(cursor, (str, int)):
+                continue
+            config.style, config.cursor_path = "cursor", path
+            cursor = str(cursor)
+            if cursor.startswith(("http://", "https://", "/")):
+                return urljoin(current_url, cursor)
+            param = config.cursor_param or "cursor"
+            return str(httpx.URL(current_url).copy_merge_params({param: cursor}))
+
+    return None
+
+
+def numbered_page_url(base_url: str, config: PaginationConfig, index: int) -> str:
+    """URL of the `index`-th (0-based) page for offset and page numbered styles."""
+    params = {config.limit_param: config.page_size} if config.limit_param else {}
+    if config.style == "offset":
+        params[config.offset_param] = index * config.page_size
+    else:
+        params[config.page_param] = index + 1
+    return str(httpx.URL(base_url).copy_merge_params(params))
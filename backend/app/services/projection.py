@@ -0,0 +1,272 @@
+"""
+Response projection: keep only the fields a caller needs from an upstream
+JSON body, with array-length caps and a byte budget applied while decoding.
+"""
+import json
+import re
+from dataclasses import dataclass, field
+from json.decoder import scanstring
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from app.core.config import settings
+
+# Marker for "keep this value as a whole"
+KEEP = True
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+_STRING = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"', re.S)
+_STRUCTURAL = re.compile(r'["\[\]{}]')
+_SCALAR = re.compile(r"[^,\]}\s]+")
+_decoder = json.JSONDecoder()
+
+FieldTree = Union[bool, Dict[str, Any]]
+
+
+@dataclass
+class Projection:
+    """What to keep from a response: a field tree plus size limits."""
+    tree: FieldTree = KEEP
+    fields: List[str] = field(default_factory=list)
+    max_items: Optional[int] = None
+    max_bytes: Optional[int] = None
+
+    @property
+    def is_noop(self) -> bool:
+        return self.tree is KEEP and self.max_items is None and self.max_bytes is None
+
+
+def parse_fields(fields: List[str]) -> FieldTree:
+    """
+    Build a field tree from simple JSONPath expressions or dotted field names,
+    e.g. ["$.items[*].id", "items.name", "owner.login"]. Arrays are
+    transparent: a path applies to every element of an array it crosses.
+    """
+    tree: Dict[str, Any] = {}
+    for expression in fields:
+        expression = expression.strip()
+        if expression.startswith("$"):
+            expression = expression[1:]
+        parts = [p for p in re.split(r"\.|\[\*\]|\[\]", expression) if p]
+        if not parts:
+            return KEEP
+
+        node = tree
+        for i, part in enumerate(parts):
+            last = i == len(parts) - 1
+            existing = node.get(part)
+            if existing is KEEP:
+                break
+            if last:
+                node[part] = KEEP
+            else:
+                node = node.setdefault(part, {})
+    return tree or KEEP
+
+
+def _resolve_ref(spec: Dict[str, Any], schema: Dict[str, Any]) -> Dict[str, Any]:
+    ref = schema.get("$ref") if isinstance(schema, dict) else None
+    if not ref or not ref.startswith("#/"):
+        return schema or {}
+    node: Any = spec
+    for part in ref[2:].split("/"):
+        node = node.get(part, {}) if isinstance(node, dict) else {}
+    return node
+
+
+def fields_from_schema(spec: Dict[str, Any], operation_spec: Dict[str, Any], depth: int = 4) -> FieldTree:
+    """Derive a field tree from the declared properties of the 2xx JSON response schema."""
+    responses = operation_spec.get("responses", {})
+    response = next((responses[code] for code in sorted(responses) if str(code).startswith("2")), None)
+    if not response:
+        return KEEP
+    schema = response.get("content", {}).get("application/json", {}).get("schema")
+    if not schema:
+        return KEEP
+
+    def walk(node: Dict[str, Any], level: int, seen: frozenset) -> FieldTree:
+        ref = node.get("$ref") if isinstance(node, dict) else None
+        if ref in seen:
+            return KEEP
+        node = _resolve_ref(spec, node)
+        seen = seen | {ref} if ref else seen
+        if node.get("type") == "array" or "items" in node:
+            return walk(node.get("items", {}), level, seen)
+        properties = node.get("properties")
+        if not properties or level >= depth or node.get("additionalProperties"):
+            return KEEP
+        return {name: walk(prop, level + 1, seen) for name, prop in properties.items()}
+
+    return walk(schema, 0, frozenset())
+
+
+def projection_for(
+    spec: Dict[str, Any],
+    operation_spec: Dict[str, Any],
+    fields: Optional[List[str]] = None,
+    max_items: Optional[int] = None,
+    max_bytes: Optional[int] = None
+) -> Optional[Projection]:
+    """
+    Choose the projection for a call: fields from the request win over the
+    operation's `x-response-fields` extension, which may also be "schema" to
+    keep only the properties declared in the response schema.
+    """
+    max_items = max_items or operation_spec.get("x-response-max-items") or settings.PROJECTION_MAX_ITEMS
+    max_bytes = max_bytes or operation_spec.get("x-response-max-bytes") or settings.PROJECTION_MAX_BYTES
+    fields = fields or operation_spec.get("x-response-fields")
+
+    if fields == "schema":
+        projection = Projection(tree=fields_from_schema(spec, operation_spec), fields=["schema"])
+    elif fields:
+        projection = Projection(tree=parse_fields(fields), fields=list(fields))
+    else:
+        projection = Projection()
+
+    projection.max_items = int(max_items) if max_items else None
+    projection.max_bytes = int(max_bytes) if max_bytes else None
+    return None if projection.is_noop else projection
+
+
+class _ProjectingDecoder:
+    """
+    Recursive-descent JSON decoder that only materializes projected values.
+
+    Unwanted members and array elements beyond the caps are skipped with a
+    lightweight scanner, so the full upstream document is never built as
+    Python objects.
+    """
+
+    def __init__(self, text: str, projection: Projection):
+        self.text = text
+        self.max_items = projection.max_items
+        self.max_bytes = projection.max_bytes
+        self.used = 0
+        self.truncated = False
+
+    def decode(self, tree: FieldTree) -> Any:
+        value, end = self.value(self._ws(0), tree)
+        if self._ws(end) != len(self.text):
+            raise ValueError("Extra data after JSON document")
+        return value
+
+    def _ws(self, i: int) -> int:
+        return _WHITESPACE.match(self.text, i).end()
+
+    def _over_budget(self) -> bool:
+        return self.max_bytes is not None and self.used >= self.max_bytes
+
+    def value(self, i: int, tree: FieldTree) -> Tuple[Any, int]:
+        char = self.text[i]
+        if char == "{":
+            if tree is KEEP and self.max_items is None and self.max_bytes is None:
+                return self._raw(i)
+            return self.object(i + 1, tree)
+        if char == "[":
+            if tree is KEEP and self.max_items is None and self.max_bytes is None:
+                return self._raw(i)
+            return self.array(i + 1, tree)
+        return self._raw(i)
+
+    def _raw(self, i: int) -> Tuple[Any, int]:
+        value, end = _decoder.raw_decode(self.text, i)
+        self.used += end - i
+        return value, end
+
+    def object(self, i: int, tree: FieldTree) -> Tuple[Dict[str, Any], int]:
+        result: Dict[str, Any] = {}
+        i = self._ws(i)
+        if self.text[i] == "}":
+            return result, i + 1
+        while True:
+            key, i = scanstring(self.text, i + 1)
+            i = self._ws(i)
+            if self.text[i] != ":":
+                raise ValueError(f"Expecting ':' at position {i}")
+            i = self._ws(i + 1)
+
+            wanted = tree is KEEP or key in tree
+            if wanted and self._over_budget():
+                self.truncated = True
+                wanted = False
+            if wanted:
+                self.used += len(key) + 4
+                result[key], i = self.value(i, KEEP if tree is KEEP else tree[key])
+            else:
+                i = self.skip(i)
+
+            i = self._ws(i)
+            if self.text[i] == "}":
+                return result, i + 1
+            if self.text[i] != ",":
+                raise ValueError(f"Expecting ',' or '}}' at position {i}")
+            i = self._ws(i + 1)
+
+    def array(self, i: int, tree: FieldTree) -> Tuple[List[Any], int]:
+        result: List[Any] = []
+        i = self._ws(i)
+        if self.text[i] == "]":
+            return result, i + 1
+        while True:
+            if (self.max_items is not None and len(result) >= self.max_items) or self._over_budget():
+                self.truncated = True
+                i = self.skip(i)
+            else:
+                item, i = self.value(i, tree)
+                result.append(item)
+                self.used += 1
+
+            i = self._ws(i)
+            if self.text[i] == "]":
+                return result, i + 1
+            if self.text[i] != ",":
+                raise ValueError(f"Expecting ',' or ']' at position {i}")
+            i = self._ws(i + 1)
+
+    def skip(self, i: int) -> int:
+        """Return the end index of the value starting at `i` without decoding it."""
+        char = self.text[i]
+        if char == '"':
+            return _STRING.match(self.text, i).end()
+        if char not in "[{":
+            return _SCALAR.match(self.text, i).end()
+
+        depth = 0
+        position = i
+        while True:
+            match = _STRUCTURAL.search(self.text, position)
+            if match is None:
+                raise ValueError("Unterminated JSON container")
+            token = match.group()
+            if token == '"':
+                position = _STRING.match(self.text, match.start()).end()
+                continue
+            depth += 1 if token in "[{" else -1
+            position = match.end()
+            if depth == 0:
+                return position
+
+
+def decode_projected(content: bytes, encoding: str, projection: Projection) -> Tuple[Any, Dict[str, Any]]:
+    """
+    Decode a JSON document applying the projection.
+
+    Returns the projected data and a report with upstream/returned byte counts.
+    Raises ValueError for documents that are not valid JSON.
+    """
+    decoder = _ProjectingDecoder(content.decode(encoding), projection)
+    try:
+        data = decoder.decode(projection.tree)
+    except (IndexError, AttributeError) as e:
+        raise ValueError(f"Invalid JSON document: {e}")
+
+    bytes_upstream = len(content)
+    bytes_returned = len(json.dumps(data, separators=(",", ":"), ensure_ascii=False).encode("utf-8"))
+    return data, {
+        "fields": projection.fields or None,
+        "max_items": projection.max_items,
+        "max_bytes": projection.max_bytes,
+        "truncated": decoder.truncated,
+        "bytes_upstream": bytes_upstream,
+        "bytes_returned": bytes_returned,
+        "bytes_saved": max(0, bytes_upstream - bytes_returned),
+    }
@@ -1,10 +1,14 @@
 from typing import Dict, Any, Optional
+from app.core import capture
 from app.services.vector_db import vector_db
 from app.services.vault import vault
 from app.db.session import SessionLocal
 from app.db.models import Connector
 import httpx
 import json
+import logging
+
+logger = logging.getLogger(__name__)
 
 class ProxyAgent:
     def __init__(self):
@@ -18,12 +22,12 @@ class ProxyAgent:
             # B) Execution with data
             # For demo purposes, we assume the query implies an action on the data.
             # We search for a tool that matches the query AND can handle the data.
-            print(f"Processing execution request with context: {user_context_data}")
+            logger.debug("Processing execution request with context", extra={"context_keys": sorted(user_context_data)})
             pass
         else:
             # A) Search
-            print(f"Processing search request: {user_query}")
-            results = vector_db.search_functions(user_query, n_results=1)
+            logger.debug("Processing search request", extra={"query": user_query})
+            results = await vector_db.asearch_functions(user_query, n_results=1)
             
             if not results['documents'][0]:
                 return {
@@ -42,6 +46,7 @@ class ProxyAgent:
             if not connector:
                 db.close()
                 return {"status": "FAILURE", "error_message": "Connector not found."}
+            capture.note_connector(connector)
                 
             # Get secrets
             secrets = vault.get_secrets(connector.user_id, connector_id)
@@ -0,0 +1,263 @@
+"""
+Per-connector outbound rate limiting and concurrency caps.
+"""
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Optional, Tuple
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.services.vault import vault
+
+logger = logging.getLogger(__name__)
+
+SYSTEM_USER_ID = "system"
+RATE_LIMITS_CONFIG_ID = "rate_limits"
+
+# Adaptive behaviour: halve the rate on throttling, recover a little per success
+THROTTLE_FACTOR = 0.5
+RECOVERY_STEP = 0.05
+MIN_RATE_FRACTION = 0.05
+# Without a configured rate, throttling starts an adaptive rate from the
+# throughput of the last OBSERVED_WINDOW seconds (at least MIN_ADAPTIVE_RATE)
+OBSERVED_WINDOW = 10.0
+MIN_ADAPTIVE_RATE = 1.0
+
+UPSTREAM_LIMITER_WAIT_SECONDS = metrics.histogram(
+    "upstream_limiter_wait_seconds", "Time upstream requests waited for a connector slot or token", ("connector",)
+)
+
+
+class ConnectorLimiter:
+    """
+    Token bucket (`rate` requests/second, `burst` capacity) plus an optional
+    max-in-flight semaphore for one connector.
+
+    When the upstream answers 429 or sends Retry-After, the effective rate is
+    halved and sending pauses for the requested time; it then recovers
+    additively towards the configured rate on successful responses. Without
+    a configured rate, throttling starts an adaptive rate at the throughput
+    observed just before; once it has recovered to that, the limiter is
+    unlimited again.
+    """
+
+    def __init__(self, connector_id: str, rate: Optional[float], burst: Optional[float], max_concurrency: int):
+        self.connector_id = connector_id
+        self.waits = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.queued = 0
+        self.throttled = 0
+        self.sent: deque = deque()
+        self.configure(rate, burst, max_concurrency)
+
+    def configure(self, rate: Optional[float], burst: Optional[float], max_concurrency: int) -> None:
+        self.configured_rate = rate
+        self.rate = rate
+        self.ceiling = rate  # rate recovered towards after throttling
+        self.burst = burst or max(1.0, rate or 1.0)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.max_concurrency = max_concurrency
+        self.semaphore = asyncio.Semaphore(max_concurrency) if max_concurrency else None
+
+    @asynccontextmanager
+    async def slot(self):
+        """Wait for a concurrency slot and a token, recording the queue wait."""
+        semaphore = self.semaphore
+        start = time.monotonic()
+        self.queued += 1
+        try:
+            if semaphore:
+                await semaphore.acquire()
+            try:
+                await self._take_token()
+            except BaseException:
+                if semaphore:
+                    semaphore.release()
+                raise
+        finally:
+            self.queued -= 1
+
+        now = time.monotonic()
+        waited = now - start
+        UPSTREAM_LIMITER_WAIT_SECONDS.labels(connector=self.connector_id).observe(waited)
+        self.sent.append(now)
+        while self.sent and self.sent[0] < now - OBSERVED_WINDOW:
+            self.sent.popleft()
+        self.waits += 1
+        self.total_wait += waited
+        self.max_wait = max(self.max_wait, waited)
+        try:
+            yield
+        finally:
+            if semaphore:
+                semaphore.release()
+
+    async def _take_token(self) -> None:
+        while True:
+            now = time.monotonic()
+            if now < self.paused_until:
+                await asyncio.sleep(self.paused_until - now)
+                continue
+            if not self.rate:
+                return
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def observed_rate(self) -> float:
+        """Requests/second sent over the last OBSERVED_WINDOW seconds."""
+        now = time.monotonic()
+        recent = [sent for sent in self.sent if sent >= now - OBSERVED_WINDOW]
+        if not recent:
+            return 0.0
+        return len(recent) / max(1.0, now - recent[0])
+
+    def on_throttled(self, retry_after: Optional[float]) -> None:
+        now = time.monotonic()
+        self.throttled += 1
+        if retry_after:
+            self.paused_until = max(self.paused_until, now + retry_after)
+        if not self.rate:
+            # No configured rate: adapt from what the upstream accepted so far
+            self.ceiling = max(MIN_ADAPTIVE_RATE, self.observed_rate())
+            self.rate = self.ceiling
+            self.tokens = 0.0
+            self.updated = now
+        self.rate = max(self.ceiling * MIN_RATE_FRACTION, self.rate * THROTTLE_FACTOR)
+        self.tokens = min(self.tokens, 0.0)
+
+    def on_success(self) -> None:
+        if self.rate and self.rate < self.ceiling:
+            self.rate = min(self.ceiling, self.rate + self.ceiling * RECOVERY_STEP)
+            if self.configured_rate is None and self.rate >= self.ceiling:
+                # Recovered: back to unlimited
+                self.rate = self.ceiling = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "connector_id": self.connector_id,
+            "configured_rate": self.configured_rate,
+            "current_rate": round(self.rate, 3) if self.rate else None,
+            "adaptive": self.configured_rate is None and self.rate is not None,
+            "burst": self.burst,
+            "max_concurrency": self.max_concurrency or None,
+            "in_flight": (self.max_concurrency - self.semaphore._value) if self.semaphore else None,
+            "queued": self.queued,
+            "throttled": self.throttled,
+            "waits": self.waits,
+            "avg_wait_seconds": round(self.total_wait / self.waits, 4) if self.waits else 0.0,
+            "max_wait_seconds": round(self.max_wait, 4),
+        }
+
+
+def _positive(config: Dict[str, Any], key: str) -> Optional[float]:
+    value = config.get(key)
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value) or value <= 0:
+        raise ValueError(f"{key} must be a positive number, got {value!r}")
+    return float(value)
+
+
+def parse_limits(config: Dict[str, Any]) -> Tuple[Optional[float], Optional[float], int]:
+    """
+    Read `requests` per `period` seconds, `burst` and `max-concurrency` from an
+    `x-rate-limit` style mapping. Raises ValueError unless `requests`, `period`
+    and `burst` are positive numbers and `max-concurrency` a non-negative int.
+    """
+    if not isinstance(config, dict):
+        raise ValueError("rate limits must be an object")
+    requests = _positive(config, "requests")
+    period = _positive(config, "period") or 1.0
+    burst = _positive(config, "burst")
+    max_concurrency = config.get("max-concurrency", config.get("max_concurrency"))
+    if max_concurrency is None:
+        max_concurrency = 0
+    if isinstance(max_concurrency, bool) or not isinstance(max_concurrency, int) or max_concurrency < 0:
+        raise ValueError(f"max-concurrency must be a non-negative integer, got {max_concurrency!r}")
+    rate = requests / period if requests else None
+    return rate, burst, max_concurrency
+
+
+class RateLimiterRegistry:
+    def __init__(self):
+        self._limiters: Dict[str, ConnectorLimiter] = {}
+        self._overrides: Optional[Dict[str, Dict[str, Any]]] = None
+        self._invalid: Dict[str, Any] = {}  # connector -> invalid limits already logged
+
+    def get_overrides(self) -> Dict[str, Dict[str, Any]]:
+        """Per-connector limits saved through the admin API (take precedence over the spec)."""
+        if self._overrides is None:
+            self._overrides = vault.get_secrets(SYSTEM_USER_ID, RATE_LIMITS_CONFIG_ID)
+        return self._overrides
+
+    def set_override(self, connector_id: str, limits: Optional[Dict[str, Any]]) -> None:
+        """Save (or with empty `limits`, remove) an override; raises ValueError for invalid limits."""
+        if limits:
+            parse_limits(limits)
+        overrides = dict(self.get_overrides())
+        if limits:
+            overrides[connector_id] = limits
+        else:
+            overrides.pop(connector_id, None)
+        vault.store_secrets(SYSTEM_USER_ID, RATE_LIMITS_CONFIG_ID, overrides)
+        self._overrides = overrides
+
+    def get(self, connector_id: str, spec: Dict[str, Any]) -> ConnectorLimiter:
+        config = self.get_overrides().get(connector_id) or spec.get("x-rate-limit") or {}
+        try:
+            rate, burst, max_concurrency = parse_limits(config)
+        except ValueError as e:
+            # Don't fail every call to the connector over a bad spec: run without its limits
+            if self._invalid.get(connector_id) != config:
+                self._invalid[connector_id] = config
+                logger.warning("Ignoring invalid rate limits", extra={"connector_id": connector_id, "error": str(e)})
+            rate, burst, max_concurrency = None, None, 0
+        if rate is None:
+            rate = settings.UPSTREAM_DEFAULT_RATE_LIMIT
+        if not max_concurrency:
+            max_concurrency = settings.UPSTREAM_DEFAULT_MAX_CONCURRENCY
+
+        limiter = self._limiters.get(connector_id)
+        if limiter is None:
+            limiter = ConnectorLimiter(connector_id, rate, burst, max_concurrency)
+            self._limiters[connector_id] = limiter
+        elif (limiter.configured_rate, limiter.max_concurrency) != (rate, max_concurrency) or (
+            burst and burst != limiter.burst
+        ):
+            limiter.configure(rate, burst, max_concurrency)
+        return limiter
+
+    def stats(self) -> list:
+        return [limiter.stats() for limiter in self._limiters.values()]
+
+
+rate_limiters = RateLimiterRegistry()
+
+
+def _limiter_samples(key: str):
+    return [({"connector": s["connector_id"]}, s[key] or 0) for s in rate_limiters.stats()]
+
+
+metrics.collector(
+    "upstream_limiter_in_flight", "gauge", "Upstream requests holding a connector concurrency slot",
+    lambda: _limiter_samples("in_flight"),
+)
+metrics.collector(
+    "upstream_limiter_queued", "gauge", "Upstream requests waiting for a connector slot or token",
+    lambda: _limiter_samples("queued"),
+)
+metrics.collector(
+    "upstream_limiter_throttled_total", "counter", "Throttling responses (429 / Retry-After) per connector",
+    lambda: _limiter_samples("throttled"),
+)
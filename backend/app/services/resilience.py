@@ -0,0 +1,161 @@
+"""
+Retry backoff and per-host circuit breakers for upstream API calls.
+"""
+import enum
+import random
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Optional
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+
+class CircuitState(str, enum.Enum):
+    CLOSED = "CLOSED"
+    OPEN = "OPEN"
+    HALF_OPEN = "HALF_OPEN"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream host whose breaker is open."""
+
+    def __init__(self, host: str, retry_in: float):
+        self.host = host
+        self.retry_in = retry_in
+        super().__init__(
+            f"Upstream host '{host}' is currently unavailable (circuit open). "
+            f"Retry in {retry_in:.0f}s."
+        )
+
+
+class CircuitBreaker:
+    """
+    Classic three-state breaker.
+
+    CLOSED counts consecutive failures and opens after `failure_threshold`.
+    OPEN rejects calls until `reset_timeout` has passed, then moves to
+    HALF_OPEN, which lets a single trial call through: success closes the
+    breaker, failure opens it again.
+    """
+
+    def __init__(self, host: str, failure_threshold: int, reset_timeout: float):
+        self.host = host
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CircuitState.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trial_in_flight = False
+        self.total_failures = 0
+        self.total_rejections = 0
+
+    def allow_request(self) -> bool:
+        if self.state == CircuitState.OPEN:
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                self.total_rejections += 1
+                return False
+            self.state = CircuitState.HALF_OPEN
+            self.trial_in_flight = False
+
+        if self.state == CircuitState.HALF_OPEN:
+            if self.trial_in_flight:
+                self.total_rejections += 1
+                return False
+            self.trial_in_flight = True
+
+        return True
+
+    def raise_if_open(self) -> None:
+        """Reject right away while open, before the caller queues for a rate limiter slot."""
+        if self.state == CircuitState.OPEN and time.monotonic() - self.opened_at < self.reset_timeout:
+            self.total_rejections += 1
+            raise CircuitOpenError(self.host, self.retry_in())
+
+    def release_trial(self) -> None:
+        """Give up the half-open trial without an outcome (cancelled, or failed before reaching the host)."""
+        if self.state == CircuitState.HALF_OPEN:
+            self.trial_in_flight = False
+
+    def retry_in(self) -> float:
+        if self.state != CircuitState.OPEN:
+            return 0.0
+        return max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+
+    def record_success(self) -> None:
+        self.state = CircuitState.CLOSED
+        self.failures = 0
+        self.trial_in_flight = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self.total_failures += 1
+        self.trial_in_flight = False
+        if self.state == CircuitState.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = CircuitState.OPEN
+            self.opened_at = time.monotonic()
+
+    def reset(self) -> None:
+        self.record_success()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "host": self.host,
+            "state": self.state.value,
+            "consecutive_failures": self.failures,
+            "retry_in": round(self.retry_in(), 1),
+            "total_failures": self.total_failures,
+            "total_rejections": self.total_rejections,
+        }
+
+
+class CircuitBreakerRegistry:
+    def __init__(self):
+        self._breakers: Dict[str, CircuitBreaker] = {}
+
+    def get(self, host: str) -> CircuitBreaker:
+        breaker = self._breakers.get(host)
+        if breaker is None:
+            breaker = CircuitBreaker(
+                host,
+                failure_threshold=settings.CIRCUIT_BREAKER_FAILURE_THRESHOLD,
+                reset_timeout=settings.CIRCUIT_BREAKER_RESET_TIMEOUT,
+            )
+            self._breakers[host] = breaker
+        return breaker
+
+    def find(self, host: str) -> Optional[CircuitBreaker]:
+        return self._breakers.get(host)
+
+    def snapshot(self) -> list:
+        return [breaker.snapshot() for breaker in self._breakers.values()]
+
+
+def backoff_delay(attempt: int) -> float:
+    """Exponential backoff with full jitter for the given (0-based) retry attempt."""
+    ceiling = min(settings.UPSTREAM_RETRY_BACKOFF_MAX, settings.UPSTREAM_RETRY_BACKOFF_BASE * (2 ** attempt))
+    return random.uniform(0, ceiling)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header given either in seconds or as an HTTP date."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+circuit_breakers = CircuitBreakerRegistry()
+
+_STATE_VALUES = {CircuitState.CLOSED: 0, CircuitState.HALF_OPEN: 1, CircuitState.OPEN: 2}
+
+metrics.collector(
+    "upstream_circuit_state", "gauge", "Circuit breaker state per host (0 closed, 1 half-open, 2 open)",
+    lambda: [({"host": b.host}, _STATE_VALUES[b.state]) for b in list(circuit_breakers._breakers.values())],
+)
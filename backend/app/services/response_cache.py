@@ -0,0 +1,193 @@
+"""
+In-memory HTTP response cache for read-only upstream calls.
+"""
+import hashlib
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Optional
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+# Request headers that never change the upstream representation and must not
+# split the cache key (validators and per-request tracing headers).
+IGNORED_KEY_HEADERS = {"if-none-match", "if-modified-since", "traceparent", "tracestate", "x-request-id"}
+
+
+@dataclass
+class CachedResponse:
+    status_code: int
+    content: bytes
+    encoding: str
+    etag: Optional[str]
+    expires_at: float
+
+    @property
+    def size(self) -> int:
+        return len(self.content)
+
+    def is_fresh(self) -> bool:
+        return time.monotonic() < self.expires_at
+
+
+def _parse_cache_control(value: str) -> Dict[str, Optional[str]]:
+    """Parse a Cache-Control header into a directive -> argument mapping."""
+    directives = {}
+    for part in value.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        name, _, arg = part.partition("=")
+        directives[name.strip().lower()] = arg.strip().strip('"') or None
+    return directives
+
+
+def freshness_lifetime(headers, ttl_override: Optional[float] = None) -> Optional[float]:
+    """
+    Compute how long a response may be served without revalidation.
+
+    Returns None when the response must not be stored at all, otherwise the
+    lifetime in seconds (0 means "store, but revalidate before every use").
+    """
+    directives = _parse_cache_control(headers.get("cache-control", ""))
+    if "no-store" in directives or headers.get("vary", "").strip() == "*":
+        return None
+
+    age = 0.0
+    try:
+        age = float(headers.get("age", 0))
+    except ValueError:
+        pass
+
+    if ttl_override is not None:
+        lifetime = float(ttl_override)
+    elif "no-cache" in directives:
+        lifetime = 0.0
+    elif directives.get("s-maxage") or directives.get("max-age"):
+        try:
+            lifetime = float(directives.get("s-maxage") or directives.get("max-age"))
+        except ValueError:
+            lifetime = 0.0
+    elif headers.get("expires"):
+        try:
+            expires = parsedate_to_datetime(headers["expires"])
+            date = parsedate_to_datetime(headers["date"]) if headers.get("date") else None
+            base = date.timestamp() if date else time.time()
+            lifetime = expires.timestamp() - base
+        except (TypeError, ValueError):
+            # Invalid Expires values (e.g. "0") mean "already expired"
+            lifetime = 0.0
+    else:
+        lifetime = 0.0
+
+    return max(0.0, lifetime - age)
+
+
+class ResponseCache:
+    """
+    LRU cache of raw upstream response bodies, bounded by total body size.
+
+    Entries are keyed by connector, resolved URL and a digest of the request
+    headers, so responses fetched with different credentials never mix.
+    """
+
+    def __init__(self, max_bytes: int, max_entry_bytes: int):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self._entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self._size = 0
+        self.hits = 0
+        self.revalidations = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(connector_id: str, url: str, headers: Dict[str, str]) -> str:
+        relevant = sorted(
+            (name.lower(), value) for name, value in headers.items()
+            if name.lower() not in IGNORED_KEY_HEADERS
+        )
+        digest = hashlib.sha256(repr(relevant).encode()).hexdigest()
+        return f"{connector_id}|{url}|{digest}"
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def store(self, key: str, response, ttl_override: Optional[float] = None) -> None:
+        """Store an upstream httpx response if its headers allow it."""
+        lifetime = freshness_lifetime(response.headers, ttl_override)
+        etag = response.headers.get("etag")
+        if lifetime is None or (lifetime == 0 and not etag):
+            return
+        if len(response.content) > self.max_entry_bytes:
+            return
+
+        self._remove(key)
+        entry = CachedResponse(
+            status_code=response.status_code,
+            content=response.content,
+            encoding=response.encoding or "utf-8",
+            etag=etag,
+            expires_at=time.monotonic() + lifetime,
+        )
+        self._entries[key] = entry
+        self._size += entry.size
+        while self._size > self.max_bytes and self._entries:
+            _, evicted = self._entries.popitem(last=False)
+            self._size -= evicted.size
+
+    def refresh(self, key: str, headers, ttl_override: Optional[float] = None) -> Optional[CachedResponse]:
+        """Extend an entry's lifetime after a 304 Not Modified revalidation."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        lifetime = freshness_lifetime(headers, ttl_override)
+        if lifetime is None:
+            self._remove(key)
+            return entry
+        entry.expires_at = time.monotonic() + lifetime
+        entry.etag = headers.get("etag", entry.etag)
+        return entry
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._size -= entry.size
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._size = 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": settings.RESPONSE_CACHE_ENABLED,
+            "entries": len(self._entries),
+            "bytes": self._size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "revalidations": self.revalidations,
+            "misses": self.misses,
+        }
+
+
+response_cache = ResponseCache(
+    max_bytes=settings.RESPONSE_CACHE_MAX_BYTES,
+    max_entry_bytes=settings.RESPONSE_CACHE_MAX_ENTRY_BYTES,
+)
+
+metrics.collector(
+    "upstream_cache_lookups_total", "counter", "Response cache lookups by result",
+    lambda: [
+        ({"result": "hit"}, response_cache.hits),
+        ({"result": "revalidated"}, response_cache.revalidations),
+        ({"result": "miss"}, response_cache.misses),
+    ],
+)
+metrics.collector(
+    "upstream_cache_bytes", "gauge", "Bytes held by the response cache",
+    lambda: [({}, response_cache.stats()["bytes"])],
+)
@@ -0,0 +1,60 @@
+"""
+Coalescing of identical concurrent calls ("singleflight").
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict
+
+
+class _Call:
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Runs at most one call per key at a time; callers that arrive while a call
+    is in flight await the same result instead of starting their own.
+
+    The shared call is shielded from cancellation of individual waiters and
+    is only cancelled once every waiter has gone away.
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, _Call] = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(asyncio.ensure_future(fn()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _: self._forget(key, call))
+            self.calls += 1
+        else:
+            self.coalesced += 1
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                # Last interested caller was cancelled; nobody needs the result
+                self._forget(key, call)
+                call.task.cancel()
+
+    def in_flight(self, key: str) -> bool:
+        return key in self._calls
+
+    def _forget(self, key: str, call: _Call) -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "in_flight": len(self._calls),
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+        }
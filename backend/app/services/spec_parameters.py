@@ -0,0 +1,140 @@
+"""
+Effective parameter lists of OpenAPI operations, resolved once at ingest.
+
+For every operation, path-level and operation-level `parameters` are merged
+(the operation wins on the same name and location), `$ref`s to
+`components/parameters` (or Swagger 2 `parameters`) are resolved and each
+schema is flattened: nested `$ref`s are resolved, `allOf` is merged and the
+first `oneOf` / `anyOf` alternative stands in for the union. The result is
+stored on the connector (`Connector.operation_parameters`), so requests read
+a ready list instead of walking the spec.
+"""
+from typing import Any, Dict, List, Optional
+
+HTTP_METHODS = ("get", "post", "put", "delete", "patch", "head", "options")
+
+# Nested object properties kept when flattening schemas
+_MAX_DEPTH = 3
+
+# Keys carried over from Swagger 2 parameters that define their type inline
+_INLINE_SCHEMA_KEYS = ("type", "format", "enum", "items", "default", "minimum", "maximum", "pattern")
+
+
+def resolve_ref(spec: Dict[str, Any], ref: str) -> Optional[Dict[str, Any]]:
+    """Follow a local JSON pointer such as `#/components/parameters/Limit`; None when unresolvable."""
+    if not ref.startswith("#/"):
+        return None
+    node: Any = spec
+    for part in ref[2:].split("/"):
+        part = part.replace("~1", "/").replace("~0", "~")
+        if not isinstance(node, dict) or part not in node:
+            return None
+        node = node[part]
+    return node if isinstance(node, dict) else None
+
+
+def _deref(spec: Dict[str, Any], node: Any, seen: frozenset = frozenset()) -> Dict[str, Any]:
+    """Resolve chained `$ref`s of a node (cycles end in an empty dict)."""
+    while isinstance(node, dict) and "$ref" in node:
+        ref = node["$ref"]
+        if ref in seen:
+            return {}
+        seen = seen | {ref}
+        node = resolve_ref(spec, ref)
+    return node if isinstance(node, dict) else {}
+
+
+def flatten_schema(spec: Dict[str, Any], schema: Any, depth: int = 0, seen: frozenset = frozenset()) -> Dict[str, Any]:
+    """Self-contained copy of a schema without `$ref`, `allOf`, `oneOf` or `anyOf`."""
+    if isinstance(schema, dict) and "$ref" in schema:
+        ref = schema["$ref"]
+        if ref in seen:
+            return {"type": "object"}
+        return flatten_schema(spec, _deref(spec, schema), depth, seen | {ref})
+    if not isinstance(schema, dict):
+        return {}
+
+    flat = {key: value for key, value in schema.items() if key not in ("allOf", "oneOf", "anyOf", "properties", "items")}
+    for part in schema.get("allOf", []):
+        merged = flatten_schema(spec, part, depth, seen)
+        flat.setdefault("type", merged.get("type"))
+        for key, value in merged.items():
+            if key == "properties":
+                flat.setdefault("properties", {}).update(value)
+            elif key == "required":
+                flat["required"] = sorted(set(flat.get("required", [])) | set(value))
+            else:
+                flat.setdefault(key, value)
+    alternatives = schema.get("oneOf") or schema.get("anyOf")
+    if alternatives:
+        first = flatten_schema(spec, alternatives[0], depth, seen)
+        for key, value in first.items():
+            flat.setdefault(key, value)
+
+    if "items" in schema:
+        flat["items"] = flatten_schema(spec, schema["items"], depth + 1, seen)
+    if "properties" in schema:
+        if depth < _MAX_DEPTH:
+            flat.setdefault("properties", {}).update({
+                name: flatten_schema(spec, prop, depth + 1, seen) for name, prop in schema["properties"].items()
+            })
+        else:
+            flat.setdefault("type", "object")
+    if flat.get("type") is None:
+        flat.pop("type", None)
+    return flat
+
+
+def resolve_parameters(spec: Dict[str, Any], path: str, method: str) -> List[Dict[str, Any]]:
+    """Effective parameters of one operation, with resolved and flattened schemas."""
+    path_item = _deref(spec, spec.get("paths", {}).get(path))
+    operation = _deref(spec, path_item.get(method.lower()))
+
+    merged: Dict[tuple, Dict[str, Any]] = {}
+    for raw in list(path_item.get("parameters", [])) + list(operation.get("parameters", [])):
+        parameter = _deref(spec, raw)
+        if not parameter.get("name"):
+            continue
+        merged[(parameter["name"], parameter.get("in"))] = parameter
+
+    resolved = []
+    for parameter in merged.values():
+        schema = parameter.get("schema")
+        if schema is None:
+            # Swagger 2 (non-body) parameters declare their type inline
+            schema = {key: parameter[key] for key in _INLINE_SCHEMA_KEYS if key in parameter}
+        entry = {
+            "name": parameter["name"],
+            "in": parameter.get("in", ""),
+            "required": bool(parameter.get("required", parameter.get("in") == "path")),
+            "description": parameter.get("description", ""),
+            "schema": flatten_schema(spec, schema),
+        }
+        if "example" in parameter:
+            entry["example"] = parameter["example"]
+        resolved.append(entry)
+    return resolved
+
+
+def operation_key(path: str, method: str) -> str:
+    return f"{method.lower()} {path}"
+
+
+def build_operation_parameters(spec: Dict[str, Any]) -> Dict[str, List[Dict[str, Any]]]:
+    """Resolved parameters of every operation in the spec, keyed by `operation_key`."""
+    index = {}
+    for path, path_item in spec.get("paths", {}).items():
+        path_item = _deref(spec, path_item)
+        for method in path_item:
+            if method in HTTP_METHODS:
+                index[operation_key(path, method)] = resolve_parameters(spec, path, method)
+    return index
+
+
+def operation_parameters(connector, path: str, method: str) -> List[Dict[str, Any]]:
+    """Resolved parameters of an operation of a connector."""
+    index = connector.operation_parameters
+    if index is None:
+        # Connector stored before parameters were resolved at ingest
+        index = build_operation_parameters(connector.full_schema_json)
+    return index.get(operation_key(path, method), [])
@@ -0,0 +1,558 @@
+"""
+Storage backends for function embeddings.
+
+`VectorDB` computes embeddings itself and hands vectors, documents and
+metadata to a backend selected by VECTOR_BACKEND:
+- "chroma": a Chroma persistent collection (the original store)
+- "numpy": an in-process store of normalized vectors in memory-mapped
+  .npy files (optionally float16 or int8 with exact re-scoring) with
+  vectorized cosine top-k, or an HNSW index when VECTOR_INDEX="hnsw" and
+  hnswlib is installed
+
+Query results use Chroma's shape (`{"ids": [[...]], "documents": [[...]],
+"metadatas": [[...]], "distances": [[...]]}`) whichever backend serves them.
+"""
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from app.core.config import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows: writers are only serialized within one process
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+COLLECTION_NAME = "connector_functions"
+
+_COMPACT_BLOCK = 2048
+# Below Chroma's per-call limit on SQLite (~5461 records)
+_CHROMA_BATCH = 5000
+
+# (ids, embeddings, documents, metadatas) for a batch of records
+Records = Tuple[List[str], List[List[float]], List[str], List[Dict[str, Any]]]
+
+
+class VectorBackend:
+    """Interface implemented by every vector store."""
+
+    name = ""
+
+    def add(self, ids: List[str], embeddings: Sequence, documents: List[str], metadatas: List[Dict[str, Any]]) -> None:
+        """Insert records, replacing any with the same id."""
+        raise NotImplementedError
+
+    def query(self, embeddings: Sequence, n_results: int, where: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Nearest records to each query embedding, optionally restricted by a metadata filter."""
+        raise NotImplementedError
+
+    def delete(self, where: Dict[str, Any]) -> None:
+        raise NotImplementedError
+
+    def count(self) -> int:
+        raise NotImplementedError
+
+    def iter_records(self, batch_size: int = 1000) -> Iterator[Records]:
+        """All stored records in batches, embeddings included (used for migrations)."""
+        raise NotImplementedError
+
+
+class ChromaBackend(VectorBackend):
+    name = "chroma"
+
+    def __init__(self, path: Optional[str] = None):
+        import chromadb
+
+        self.client = chromadb.PersistentClient(path=path or settings.CHROMA_DB_PATH)
+
+    def _collection(self):
+        # Embeddings are always supplied by VectorDB, so the collection's own
+        # embedding function is never invoked
+        return self.client.get_or_create_collection(name=COLLECTION_NAME)
+
+    def add(self, ids, embeddings, documents, metadatas):
+        collection = self._collection()
+        for start in range(0, len(ids), _CHROMA_BATCH):
+            end = start + _CHROMA_BATCH
+            collection.upsert(
+                ids=ids[start:end], embeddings=embeddings[start:end],
+                documents=documents[start:end], metadatas=metadatas[start:end],
+            )
+
+    def query(self, embeddings, n_results, where=None):
+        return self._collection().query(query_embeddings=embeddings, n_results=n_results, where=where)
+
+    def delete(self, where):
+        try:
+            self.client.get_collection(name=COLLECTION_NAME).delete(where=where)
+        except Exception as e:
+            # If the collection doesn't exist there is nothing to delete
+            logger.debug("Nothing deleted from vector DB", extra={"where": where, "error": str(e)})
+
+    def count(self):
+        return self._collection().count()
+
+    def iter_records(self, batch_size=1000):
+        collection = self._collection()
+        offset = 0
+        while True:
+            batch = collection.get(include=["embeddings", "documents", "metadatas"], limit=batch_size, offset=offset)
+            if not batch["ids"]:
+                return
+            yield batch["ids"], [list(map(float, e)) for e in batch["embeddings"]], batch["documents"], batch["metadatas"]
+            offset += len(batch["ids"])
+
+
+def matches_where(metadata: Dict[str, Any], where: Optional[Dict[str, Any]]) -> bool:
+    """
+    Evaluate a Chroma-style metadata filter: field equality, the operators
+    $eq, $ne, $in, $nin, $gt, $gte, $lt, $lte, and $and / $or.
+    """
+    if not where:
+        return True
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(matches_where(metadata, clause) for clause in condition):
+                return False
+        elif key == "$or":
+            if not any(matches_where(metadata, clause) for clause in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = metadata.get(key)
+            for op, expected in condition.items():
+                if not _compare(op, value, expected):
+                    return False
+        elif metadata.get(key) != condition:
+            return False
+    return True
+
+
+def _compare(op: str, value: Any, expected: Any) -> bool:
+    if op == "$eq":
+        return value == expected
+    if op == "$ne":
+        return value != expected
+    if op == "$in":
+        return value in expected
+    if op == "$nin":
+        return value not in expected
+    if value is None:
+        return False
+    if op == "$gt":
+        return value > expected
+    if op == "$gte":
+        return value >= expected
+    if op == "$lt":
+        return value < expected
+    if op == "$lte":
+        return value <= expected
+    raise ValueError(f"Unsupported filter operator '{op}'")
+
+
+class _Documents:
+    """Chunk texts concatenated in one memory-mapped file; only the requested ones are decoded."""
+    __slots__ = ("data", "offsets")
+
+    def __init__(self, data, offsets):
+        self.data = data
+        self.offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        return self.data[self.offsets[i]:self.offsets[i + 1]].tobytes().decode("utf-8")
+
+
+class _Snapshot:
+    """Immutable view of the store; searches use it without taking the write lock."""
+    __slots__ = ("vectors", "scales", "exact", "ids", "documents", "metadatas", "index")
+
+    def __init__(self, vectors, scales, exact, ids, documents, metadatas, index=None):
+        self.vectors = vectors
+        self.scales = scales
+        self.exact = exact
+        self.ids = ids
+        self.documents = documents
+        self.metadatas = metadatas
+        self.index = index
+
+
+class NumpyBackend(VectorBackend):
+    """
+    In-process store of normalized vectors in memory-mapped .npy files.
+
+    Each version of the store is a directory holding:
+    - `vectors.npy`: the scanned vectors as float32, float16 or int8 (with
+      per-vector scales in `scales.npy`)
+    - `exact.npy`: float32 copies for compact dtypes, read only to re-score
+      the top VECTOR_RESCORE_CANDIDATES of each query
+    - `documents.bin` / `offsets.npy`: chunk texts, kept on disk and
+      decoded only for returned results
+    - `records.json`: ids and metadata (kept in memory for filtering)
+
+    Writes build a new version and switch the `CURRENT` pointer atomically,
+    which suits catalogs that change per connector upload rather than per
+    request. Several processes (uvicorn workers) can share one store:
+    searches reopen the store when another process has switched `CURRENT`,
+    and writers take an exclusive lock on the `LOCK` file and start from
+    the latest version, so no worker's records are lost. Distances are
+    squared L2 between unit vectors (2 - 2 * cosine), the same values
+    Chroma's default space gives for normalized embeddings, so similarity
+    thresholds mean the same on both backends.
+    """
+
+    name = "numpy"
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        dtype: Optional[str] = None,
+        index: Optional[str] = None,
+        rescore_candidates: Optional[int] = None,
+    ):
+        import numpy as np
+
+        self.np = np
+        self.path = path or settings.VECTOR_STORE_PATH
+        self.dtype = np.dtype(dtype or settings.VECTOR_DTYPE)
+        if self.dtype not in (np.float32, np.float16, np.int8):
+            raise ValueError(f"Unsupported VECTOR_DTYPE '{self.dtype}', expected float32, float16 or int8")
+        self.rescore_candidates = settings.VECTOR_RESCORE_CANDIDATES if rescore_candidates is None else rescore_candidates
+        self.use_hnsw = (index or settings.VECTOR_INDEX).lower() == "hnsw"
+        if self.use_hnsw:
+            try:
+                import hnswlib  # noqa: F401
+            except ImportError:
+                logger.warning("VECTOR_INDEX=hnsw but hnswlib is not installed, using exact search")
+                self.use_hnsw = False
+        os.makedirs(self.path, exist_ok=True)
+        self._pointer = os.path.join(self.path, "CURRENT")
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self._version: Optional[str] = None  # version directory of the snapshot
+        self._pointer_state: Optional[Tuple[int, int]] = None  # CURRENT's (inode, mtime) when last read
+        with self._write_lock():
+            self._snapshot = self._load()
+
+    # Persistence
+
+    @contextmanager
+    def _write_lock(self):
+        """Serialize writers across threads and (with fcntl) across processes sharing the store."""
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            with open(os.path.join(self.path, "LOCK"), "a") as handle:
+                fcntl.flock(handle, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(handle, fcntl.LOCK_UN)
+
+    def _pointer_stat(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(self._pointer)
+        except FileNotFoundError:
+            return None
+        # os.replace gives CURRENT a new inode on every switch
+        return stat.st_ino, stat.st_mtime_ns
+
+    def _current(self) -> _Snapshot:
+        """The snapshot, reopened first if another process has switched CURRENT since it was read."""
+        state = self._pointer_stat()
+        if state is None or state == self._pointer_state:
+            return self._snapshot
+        with self._reload_lock:
+            if state != self._pointer_state:
+                self._reload()
+        return self._snapshot
+
+    def _reload(self) -> None:
+        for _ in range(3):
+            state = self._pointer_stat()
+            with open(self._pointer) as f:
+                name = f.read().strip()
+            if name != self._version:
+                try:
+                    snapshot = self._open_version(os.path.join(self.path, name))
+                except FileNotFoundError:
+                    # Replaced and cleaned up while being opened; CURRENT has moved on
+                    continue
+                self._snapshot, self._version = snapshot, name
+            self._pointer_state = state
+            return
+
+    def _load(self) -> _Snapshot:
+        np = self.np
+        if os.path.exists(self._pointer):
+            with open(self._pointer) as f:
+                self._version = f.read().strip()
+            self._pointer_state = self._pointer_stat()
+            snapshot = self._open_version(os.path.join(self.path, self._version))
+        else:
+            return _Snapshot(np.zeros((0, 0), dtype=self.dtype), None, None, [], _Documents(np.zeros(0, np.uint8), [0]), [])
+
+        if snapshot.vectors.dtype != self.dtype:
+            # Stored with another VECTOR_DTYPE; rewrite once in the configured one
+            self._write(self._full_precision(snapshot), snapshot.ids, list(snapshot.documents), snapshot.metadatas)
+            return self._snapshot
+        return snapshot
+
+    def _open_version(self, version: str) -> _Snapshot:
+        np = self.np
+
+        def mapped(name: str):
+            file = os.path.join(version, name)
+            return np.load(file, mmap_mode="r") if os.path.exists(file) else None
+
+        with open(os.path.join(version, "records.json")) as f:
+            records = json.load(f)
+        data_file = os.path.join(version, "documents.bin")
+        # np.memmap refuses empty files
+        data = np.memmap(data_file, dtype=np.uint8, mode="r") if os.path.getsize(data_file) else np.zeros(0, np.uint8)
+        documents = _Documents(data, np.load(os.path.join(version, "offsets.npy")))
+        return self._snapshot_of(
+            mapped("vectors.npy"), mapped("scales.npy"), mapped("exact.npy"), records["ids"], documents, records["metadatas"]
+        )
+
+    def _snapshot_of(self, vectors, scales, exact, ids, documents, metadatas) -> _Snapshot:
+        index = None
+        if self.use_hnsw and len(ids):
+            import hnswlib
+
+            full = exact if exact is not None else vectors
+            index = hnswlib.Index(space="ip", dim=full.shape[1])
+            index.init_index(max_elements=len(ids), ef_construction=200, M=16)
+            index.add_items(self.np.asarray(full, dtype=self.np.float32), self.np.arange(len(ids)))
+            index.set_ef(max(50, settings.VECTOR_HNSW_EF))
+        return _Snapshot(vectors, scales, exact, ids, documents, metadatas, index)
+
+    def _write(self, vectors, ids: List[str], documents: List[str], metadatas: List[Dict[str, Any]]) -> None:
+        """Persist a new version from normalized float32 `vectors` and make it current."""
+        np = self.np
+        version = tempfile.mkdtemp(prefix="v-", dir=self.path)
+
+        def save(name: str, array) -> None:
+            with open(os.path.join(version, name), "wb") as f:
+                np.save(f, np.ascontiguousarray(array))
+
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if self.dtype == np.int8:
+            scales = np.abs(vectors).max(axis=1) / 127.0 if len(vectors) else np.zeros(0, np.float32)
+            scales[scales == 0] = 1.0
+            save("vectors.npy", np.round(vectors / scales[:, None]).astype(np.int8))
+            save("scales.npy", scales.astype(np.float32))
+        else:
+            save("vectors.npy", vectors.astype(self.dtype))
+        if self.dtype != np.float32:
+            save("exact.npy", vectors)
+
+        encoded = [document.encode("utf-8") for document in documents]
+        with open(os.path.join(version, "documents.bin"), "wb") as f:
+            f.write(b"".join(encoded))
+        save("offsets.npy", np.concatenate([[0], np.cumsum([len(e) for e in encoded], dtype=np.int64)]).astype(np.int64))
+        with open(os.path.join(version, "records.json"), "w") as f:
+            json.dump({"ids": ids, "metadatas": metadatas}, f)
+
+        replaced = self._version
+        with open(self._pointer + ".tmp", "w") as f:
+            f.write(os.path.basename(version))
+        os.replace(self._pointer + ".tmp", self._pointer)
+        self._snapshot = self._open_version(version)
+        self._version = os.path.basename(version)
+        self._pointer_state = self._pointer_stat()
+        self._remove_versions_before(replaced)
+
+    def _remove_versions_before(self, replaced: Optional[str]) -> None:
+        """
+        Delete versions older than the one just replaced. That one is kept,
+        since other processes may still be opening it; open snapshots keep
+        their mappings after the files are unlinked.
+        """
+        if not replaced:
+            return
+        try:
+            cutoff = os.stat(os.path.join(self.path, replaced)).st_mtime_ns
+        except FileNotFoundError:
+            return
+        for entry in os.listdir(self.path):
+            full_path = os.path.join(self.path, entry)
+            if entry in (replaced, self._version) or not entry.startswith("v-") or not os.path.isdir(full_path):
+                continue
+            if os.stat(full_path).st_mtime_ns < cutoff:
+                shutil.rmtree(full_path, ignore_errors=True)
+
+    def _full_precision(self, snapshot: _Snapshot, rows=None):
+        """Float32 vectors of `rows` (default all) of a snapshot."""
+        np = self.np
+        rows = slice(None) if rows is None else rows
+        if snapshot.exact is not None:
+            return np.asarray(snapshot.exact[rows], dtype=np.float32)
+        vectors = np.asarray(snapshot.vectors[rows], dtype=np.float32)
+        if snapshot.scales is not None:
+            vectors = vectors * np.asarray(snapshot.scales[rows])[:, None]
+        return vectors
+
+    # Operations
+
+    def _normalize(self, embeddings: Sequence):
+        np = self.np
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        if vectors.ndim == 1:
+            vectors = vectors.reshape(1, -1)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def add(self, ids, embeddings, documents, metadatas):
+        if not ids:
+            return
+        np = self.np
+        new_vectors = self._normalize(embeddings)
+        with self._write_lock():
+            current = self._current()
+            if len(current.ids) and current.vectors.shape[1] != new_vectors.shape[1]:
+                raise ValueError(
+                    f"Embedding dimension {new_vectors.shape[1]} does not match the store ({current.vectors.shape[1]}); "
+                    "re-ingest connectors after changing the embedding model"
+                )
+            replaced = set(ids)
+            keep = [i for i, existing in enumerate(current.ids) if existing not in replaced]
+            kept_vectors = self._full_precision(current, keep) if len(current.ids) else \
+                np.zeros((0, new_vectors.shape[1]), dtype=np.float32)
+            self._write(
+                np.concatenate([kept_vectors, new_vectors]),
+                [current.ids[i] for i in keep] + list(ids),
+                [current.documents[i] for i in keep] + list(documents),
+                [current.metadatas[i] for i in keep] + list(metadatas),
+            )
+
+    def query(self, embeddings, n_results, where=None):
+        np = self.np
+        snapshot = self._current()
+        queries = self._normalize(embeddings)
+        result = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        if not snapshot.ids:
+            for key in result:
+                result[key] = [[] for _ in range(len(queries))]
+            return result
+
+        candidates = None
+        if where:
+            candidates = np.array([i for i, m in enumerate(snapshot.metadatas) if matches_where(m, where)], dtype=np.int64)
+
+        for query in queries:
+            if snapshot.index is not None and candidates is None:
+                k = min(n_results, len(snapshot.ids))
+                labels, distances = snapshot.index.knn_query(query, k=k)
+                # hnswlib's "ip" distance is 1 - cosine
+                top, similarities = labels[0].tolist(), (1.0 - distances[0]).tolist()
+            else:
+                top, similarities = self._top_k(snapshot, query, n_results, candidates)
+            result["ids"].append([snapshot.ids[i] for i in top])
+            result["documents"].append([snapshot.documents[i] for i in top])
+            result["metadatas"].append([snapshot.metadatas[i] for i in top])
+            result["distances"].append([max(0.0, float(2.0 - 2.0 * s)) for s in similarities])
+        return result
+
+    def _top_k(self, snapshot: _Snapshot, query, n_results: int, candidates=None):
+        """
+        Score every (candidate) vector in the stored dtype; for compact dtypes
+        re-score the best VECTOR_RESCORE_CANDIDATES against exact float32 copies.
+        """
+        np = self.np
+        rows = candidates if candidates is not None else np.arange(len(snapshot.ids))
+        if not len(rows):
+            return [], []
+        vectors = snapshot.vectors[candidates] if candidates is not None else snapshot.vectors
+        similarities = self._similarities(vectors, query)
+        if snapshot.scales is not None:
+            similarities *= snapshot.scales[candidates] if candidates is not None else snapshot.scales
+
+        rescore = snapshot.exact is not None and self.rescore_candidates > 0
+        k = min(max(n_results, self.rescore_candidates) if rescore else n_results, len(similarities))
+        top = np.argpartition(-similarities, k - 1)[:k]
+        rows = rows[top]
+        if rescore:
+            # Ascending rows read the exact copies in file order
+            rows = np.sort(rows)
+            similarities = snapshot.exact[rows] @ query
+        else:
+            similarities = similarities[top]
+        best = np.argsort(-similarities)[:n_results]
+        return rows[best].tolist(), similarities[best].tolist()
+
+    def _similarities(self, vectors, query):
+        np = self.np
+        if vectors.dtype == np.float32:
+            return vectors @ query
+        # float16 and int8 have no BLAS kernels; widen small, cache-sized blocks
+        # to float32 (a few times the float32 scan time for 1/2 or 1/4 the memory)
+        out = np.empty(len(vectors), dtype=np.float32)
+        for start in range(0, len(vectors), _COMPACT_BLOCK):
+            block = vectors[start:start + _COMPACT_BLOCK]
+            out[start:start + len(block)] = block.astype(np.float32) @ query
+        return out
+
+    def delete(self, where):
+        with self._write_lock():
+            current = self._current()
+            keep = [i for i, m in enumerate(current.metadatas) if not matches_where(m, where)]
+            if len(keep) == len(current.ids):
+                return
+            self._write(
+                self._full_precision(current, keep),
+                [current.ids[i] for i in keep],
+                [current.documents[i] for i in keep],
+                [current.metadatas[i] for i in keep],
+            )
+
+    def count(self):
+        return len(self._current().ids)
+
+    def iter_records(self, batch_size=1000):
+        snapshot = self._current()
+        for start in range(0, len(snapshot.ids), batch_size):
+            end = min(start + batch_size, len(snapshot.ids))
+            yield (
+                snapshot.ids[start:end],
+                self._full_precision(snapshot, slice(start, end)).tolist(),
+                [snapshot.documents[i] for i in range(start, end)],
+                snapshot.metadatas[start:end],
+            )
+
+
+BACKENDS: Dict[str, Callable[[], VectorBackend]] = {
+    "chroma": ChromaBackend,
+    "numpy": NumpyBackend,
+}
+
+
+def register_backend(name: str, factory: Callable[[], VectorBackend]) -> None:
+    """Make a VectorBackend implementation selectable via VECTOR_BACKEND."""
+    BACKENDS[name] = factory
+
+
+def create_backend(name: Optional[str] = None) -> VectorBackend:
+    name = (name or settings.VECTOR_BACKEND).lower()
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown VECTOR_BACKEND '{name}', expected one of: {', '.join(BACKENDS)}")
+    return BACKENDS[name]()
+
+
+def migrate(source: VectorBackend, target: VectorBackend, batch_size: int = 10000) -> int:
+    """Copy every record (with its stored embedding) from `source` into `target`."""
+    copied = 0
+    for ids, embeddings, documents, metadatas in source.iter_records(batch_size):
+        target.add(ids, embeddings, documents, metadatas)
+        copied += len(ids)
+    return copied
@@ -1,24 +1,35 @@
-import chromadb
-from chromadb.config import Settings as ChromaSettings
-from chromadb.utils import embedding_functions
+import asyncio
+from app.core import capture
 from app.core.config import settings
+from app.core.metrics import time_stage
+from app.core.tracing import start_span
 from app.services.vault import vault
+from app.services.vector_backends import create_backend
+import logging
+import time
 import uuid
 
+logger = logging.getLogger(__name__)
+
 # Constants for config lookup
 SYSTEM_USER_ID = "system"
 GLOBAL_CONFIG_ID = "global_config"
 
 class VectorDB:
     def __init__(self):
-        self.client = chromadb.PersistentClient(path=settings.CHROMA_DB_PATH)
-        # We don't initialize collection here anymore because we need the embedding function
-        # which depends on the config at runtime.
+        # Storage is pluggable (VECTOR_BACKEND); embeddings are computed here
+        # with the function selected by the runtime config
+        self.backend = create_backend()
 
     def _get_embedding_function(self):
         """
         Retrieves the configured embedding function based on system settings.
         """
+        return self._get_embedding_function_and_provider()[0]
+
+    def _get_embedding_function_and_provider(self):
+        from chromadb.utils import embedding_functions
+
         config = vault.get_secrets(SYSTEM_USER_ID, GLOBAL_CONFIG_ID)
         provider = config.get("embeddingProvider", "local")
         model_name = config.get("embeddingModel", "all-MiniLM-L6-v2")
@@ -28,60 +39,60 @@ class VectorDB:
             if api_key:
                 return embedding_functions.OpenAIEmbeddingFunction(
                     api_key=api_key,
-                    model_name=model_name
-                )
+                    model_name=model_name,
+                    api_base=f"{settings.OPENAI_BASE_URL}/v1"
+                ), provider
         elif provider == "google":
             api_key = config.get("googleApiKey")
             if api_key:
                 return embedding_functions.GoogleGenerativeAiEmbeddingFunction(
                     api_key=api_key,
                     model_name=model_name if model_name else "models/embedding-001"
-                )
+                ), provider
+        elif provider == "onnx":
+            from app.services.onnx_embeddings import onnx_embedding_function
+
+            return onnx_embedding_function(model_name), provider
+        elif provider == "sidecar":
+            from app.services.embedding_sidecar import sidecar_embedding_function
+
+            return sidecar_embedding_function(model_name), provider
         
         # Default / Local
-        return embedding_functions.SentenceTransformerEmbeddingFunction(model_name=model_name)
-
-    def _get_collection(self):
-        """
-        Gets the collection with the current embedding function.
-        """
-        ef = self._get_embedding_function()
-        return self.client.get_or_create_collection(
-            name="connector_functions",
-            embedding_function=ef
-        )
+        return embedding_functions.SentenceTransformerEmbeddingFunction(model_name=model_name), "local"
 
     def add_function_chunks(self, chunks: list, metadatas: list, ids: list):
         if not chunks:
             return
         
-        collection = self._get_collection()
-        collection.add(
-            documents=chunks,
-            metadatas=metadatas,
-            ids=ids
-        )
+        embeddings = self._get_embedding_function()(chunks)
+        self.backend.add(ids, embeddings, chunks, metadatas)
 
     def search_functions(self, query: str, n_results: int = 5):
-        collection = self._get_collection()
-        results = collection.query(
-            query_texts=[query],
-            n_results=n_results
-        )
+        replayed = capture.replayed_search(query, n_results)
+        if replayed is not None:
+            return replayed
+        started = time.monotonic()
+        ef, provider = self._get_embedding_function_and_provider()
+        with start_span("vector_db.search_functions", attributes={"embedding.provider": provider, "n_results": n_results}):
+            # Embed separately so embedding and index search are timed as distinct stages
+            with time_stage("embedding", provider=provider):
+                embeddings = ef([query])
+            with time_stage("vector_search"):
+                results = self.backend.query(embeddings, n_results=n_results)
+        capture.record("vector", started, query=query, n_results=n_results, result=results)
         return results
 
+    async def asearch_functions(self, query: str, n_results: int = 5):
+        """
+        `search_functions` in a worker thread, for async callers. Every
+        embedding provider (sidecar, local models, provider APIs) blocks, and
+        concurrent searches reach the sidecar together so it can batch them.
+        """
+        return await asyncio.to_thread(self.search_functions, query, n_results)
+
     def delete_connector_functions(self, connector_id: str):
-        # For deletion, we don't need to specify an embedding function
-        # Get the collection without embedding function to avoid conflicts
-        try:
-            collection = self.client.get_collection(name="connector_functions")
-            collection.delete(
-                where={"connector_id": connector_id}
-            )
-        except Exception as e:
-            print(f"Error deleting from vector DB: {str(e)}")
-            # If collection doesn't exist, that's fine - nothing to delete
-            pass
+        self.backend.delete(where={"connector_id": connector_id})
 
 vector_db = VectorDB()
 
@@ -0,0 +1,239 @@
+"""
+Local embedding providers compared: PyTorch sentence-transformers ("local")
+against ONNX Runtime ("onnx", optionally with a quantized model file).
+
+Each provider runs in its own process, so import cost and memory are its own.
+The workers measure:
+- model load time (including imports)
+- single-text encode latency, as for a search query
+- batch throughput on operation descriptions, as at ingestion
+- resident memory after loading and peak resident memory
+
+The parent then compares every provider's vectors with the first provider's:
+cosine similarity of the same texts, and how often queries find the same
+nearest operation.
+
+Texts come from the synthetic catalogs of `benchmarks.vector_bench`. Models
+are loaded as the app would (downloaded on first use unless
+ONNX_EMBEDDING_MODEL_PATH points at a local export).
+
+Usage (from backend/):
+    python -m benchmarks.embedding_bench --output embeddings.json
+    python -m benchmarks.embedding_bench --providers local,onnx,onnx:onnx/model_quint8_avx2.onnx --threads 1,4
+    python -m benchmarks.embedding_bench --providers onnx --baseline embeddings.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from benchmarks.loadtest import BACKEND_DIR, percentile
+from benchmarks.vector_bench import _queries, synthetic_spec
+
+
+def sample_texts(chunks: int, queries: int, seed: int) -> Dict[str, List[str]]:
+    """Operation descriptions (worded like ingestion does) and queries written for them."""
+    spec = synthetic_spec("Bench Catalog", chunks)
+    documents = [
+        f"Connector: {spec['info']['title']}. Function: {details['operationId']}. "
+        f"Path: {method.upper()} {path}. Description: {details['summary']} "
+        for path, methods in spec["paths"].items()
+        for method, details in methods.items()
+    ]
+    return {"documents": documents, "queries": [query for query, _ in _queries([("bench", spec)], queries, seed)]}
+
+
+def _memory_kib() -> Dict[str, int]:
+    memory = {}
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                name, _, value = line.partition(":")
+                if name in ("VmRSS", "VmHWM"):
+                    memory[name] = int(value.split()[0])
+    except OSError:
+        pass
+    return memory
+
+
+def _load(provider: str, model: str):
+    if provider == "local":
+        from chromadb.utils import embedding_functions
+
+        return embedding_functions.SentenceTransformerEmbeddingFunction(model_name=model)
+    from app.services.onnx_embeddings import OnnxEmbeddingFunction
+
+    return OnnxEmbeddingFunction(model)
+
+
+def worker(args: argparse.Namespace) -> None:
+    """Measure one provider; prints a JSON result and saves the vectors to --vectors."""
+    with open(args.texts) as f:
+        texts = json.load(f)
+    rss_start = _memory_kib().get("VmRSS", 0)
+    start = time.perf_counter()
+    function = _load(args.worker, args.model)
+    function(["warm up"])
+    load_seconds = time.perf_counter() - start
+    rss_loaded = _memory_kib().get("VmRSS", 0)
+
+    latencies = []
+    for query in texts["queries"]:
+        # Bypass the tokenizer cache: every query text is new to the model
+        started = time.perf_counter()
+        function([f"{query} "])
+        latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    documents = function(texts["documents"])
+    batch_seconds = time.perf_counter() - started
+    queries = function(texts["queries"])
+    np.save(args.vectors, np.asarray(list(documents) + list(queries), dtype=np.float32))
+
+    memory = _memory_kib()
+    print(json.dumps({
+        "load_s": round(load_seconds, 3),
+        "encode_ms": {
+            "mean": round(sum(latencies) / len(latencies), 3),
+            "p50": round(percentile(latencies, 50), 3),
+            "p95": round(percentile(latencies, 95), 3),
+        },
+        "throughput_texts_per_s": round(len(texts["documents"]) / batch_seconds, 1),
+        "rss_mib": {
+            "start": round(rss_start / 1024, 1),
+            "loaded": round(rss_loaded / 1024, 1),
+            "peak": round(memory.get("VmHWM", 0) / 1024, 1),
+        },
+        "dimensions": int(np.asarray(documents[0]).shape[0]),
+    }))
+
+
+def agreement(reference: np.ndarray, candidate: np.ndarray, documents: int) -> Dict[str, float]:
+    """Cosine similarity of matching vectors and top-1 search agreement of the queries."""
+    def normalized(vectors):
+        return vectors / np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+
+    reference, candidate = normalized(reference), normalized(candidate)
+    cosine = (reference * candidate).sum(axis=1)
+    nearest_reference = (reference[documents:] @ reference[:documents].T).argmax(axis=1)
+    nearest_candidate = (candidate[documents:] @ candidate[:documents].T).argmax(axis=1)
+    return {
+        "cosine_mean": round(float(cosine.mean()), 5),
+        "cosine_min": round(float(cosine.min()), 5),
+        "top1_agreement": round(float((nearest_reference == nearest_candidate).mean()), 4),
+    }
+
+
+def run_provider(spec: str, threads: int, args: argparse.Namespace, texts_path: str, workdir: str) -> Dict[str, Any]:
+    provider, _, model_file = spec.partition(":")
+    vectors_path = os.path.join(workdir, f"{len(os.listdir(workdir))}.npy")
+    env = {**os.environ, "ONNX_NUM_THREADS": str(threads)}
+    if model_file:
+        env["ONNX_EMBEDDING_FILE"] = model_file
+    if provider == "local" and threads:
+        env["OMP_NUM_THREADS"] = str(threads)
+    command = [sys.executable, "-m", "benchmarks.embedding_bench", "--worker", provider, "--model", args.model,
+               "--texts", texts_path, "--vectors", vectors_path]
+    completed = subprocess.run(command, cwd=BACKEND_DIR, env=env, capture_output=True, text=True)
+    if completed.returncode != 0:
+        return {"provider": spec, "threads": threads, "error": completed.stderr.strip().splitlines()[-1:]}
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    result.update({"provider": spec, "threads": threads, "vectors": vectors_path})
+    return result
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any]) -> None:
+    """Print encode latency, throughput and peak memory changes against a previous report."""
+    previous = {(run["provider"], run["threads"]): run for run in baseline.get("runs", []) if "error" not in run}
+    for run in report["runs"]:
+        old = previous.get((run["provider"], run["threads"]))
+        if not old or "error" in run:
+            continue
+        changes = (
+            ("p50", run["encode_ms"]["p50"], old["encode_ms"]["p50"]),
+            ("throughput", run["throughput_texts_per_s"], old["throughput_texts_per_s"]),
+            ("peak RSS", run["rss_mib"]["peak"], old["rss_mib"]["peak"]),
+        )
+        print(f"{run['provider']} threads={run['threads']}: " + "  ".join(
+            f"{name} {(new / before - 1):+.1%}" for name, new, before in changes if before
+        ))
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Compare local embedding providers")
+    parser.add_argument("--providers", type=lambda v: v.split(","), default=["local", "onnx"],
+                        help="comma-separated: local (PyTorch), onnx, or onnx:<model file> such as "
+                             "onnx:onnx/model_quint8_avx2.onnx; the first is the reference for agreement")
+    parser.add_argument("--threads", type=lambda v: [int(t) for t in v.split(",")], default=[0],
+                        help="comma-separated thread counts to run each provider with (0 = library default)")
+    parser.add_argument("--model", default="all-MiniLM-L6-v2")
+    parser.add_argument("--documents", type=int, default=1000, help="operation descriptions encoded in batch")
+    parser.add_argument("--queries", type=int, default=200, help="queries encoded one at a time")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write the JSON report here (default: stdout)")
+    parser.add_argument("--baseline", help="previous JSON report to compare against")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("--texts", help=argparse.SUPPRESS)
+    parser.add_argument("--vectors", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        worker(args)
+        return
+
+    with tempfile.TemporaryDirectory(prefix="api-connector-embedding-bench-") as workdir:
+        texts = sample_texts(args.documents, args.queries, args.seed)
+        texts_path = os.path.join(workdir, "texts.json")
+        with open(texts_path, "w") as f:
+            json.dump(texts, f)
+        vectors_dir = os.path.join(workdir, "vectors")
+        os.makedirs(vectors_dir)
+
+        runs = []
+        for spec in args.providers:
+            for threads in args.threads:
+                run = run_provider(spec, threads, args, texts_path, vectors_dir)
+                runs.append(run)
+                if "error" in run:
+                    print(f"{spec} threads={threads}: failed: {run['error']}", file=sys.stderr)
+                    continue
+                print(
+                    f"{spec:<40} threads={threads:<3} load={run['load_s']}s p50={run['encode_ms']['p50']}ms "
+                    f"throughput={run['throughput_texts_per_s']}/s peak RSS={run['rss_mib']['peak']}MiB",
+                    file=sys.stderr,
+                )
+
+        completed = [run for run in runs if "error" not in run]
+        if completed:
+            reference = np.load(completed[0]["vectors"])
+            for run in completed:
+                run["agreement"] = agreement(reference, np.load(run["vectors"]), len(texts["documents"]))
+        for run in runs:
+            run.pop("vectors", None)
+
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "config": {key: value for key, value in vars(args).items()
+                   if key not in ("output", "baseline", "worker", "texts", "vectors")},
+        "reference": completed[0]["provider"] if completed else None,
+        "runs": runs,
+    }
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(report, json.load(f))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}", file=sys.stderr)
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
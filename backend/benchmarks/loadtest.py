@@ -0,0 +1,314 @@
+"""
+Offline end-to-end load test for POST /api/v1/query/query.
+
+Starts the mock upstream / LLM server and the FastAPI app (with a throwaway
+database, vault and Chroma directory, and provider base URLs pointed at the
+mocks), uploads the mock connector, then drives the query endpoint at each
+concurrency level. Throughput, latency percentiles and the per-stage
+breakdown from /metrics are written as JSON so runs can be compared.
+
+Usage (from backend/):
+    python -m benchmarks.loadtest --concurrency 1,4,8 --requests 200 --output bench.json
+    python -m benchmarks.loadtest --provider anthropic --llm-latency-ms 800 --baseline bench.json
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+from cryptography.fernet import Fernet
+
+from benchmarks import mock_services
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+API_KEY = "test-api-key-12345"
+
+PROVIDER_MODELS = {"openai": "gpt-4o", "anthropic": "claude-3-5-sonnet-latest", "google": "gemini-1.5-pro"}
+
+QUERY_TEMPLATES = (
+    "Get order {n}",
+    "What is the status of order number {n}?",
+    "Show me the profile of customer {n}",
+    "What is the price and stock level of product {n}?",
+    "How many items are available in the inventory?",
+)
+
+_SAMPLE = re.compile(r'^(\w+)(?:\{(.*)\})? (\S+)$')
+_LABEL = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Nearest-rank percentile of `values` (0 when empty)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered), max(1, math.ceil(q / 100 * len(ordered)))) - 1]
+
+
+def parse_metrics(text: str) -> Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float]:
+    samples = {}
+    for line in text.splitlines():
+        match = _SAMPLE.match(line)
+        if not match:
+            continue
+        name, labels, value = match.groups()
+        key = (name, tuple(sorted(_LABEL.findall(labels or ""))))
+        samples[key] = float(value)
+    return samples
+
+
+def histogram_breakdown(
+    before: Dict, after: Dict, metric: str, group_by: str
+) -> Dict[str, Dict[str, float]]:
+    """
+    Per-group count, mean and estimated p50/p95/p99 (milliseconds) of a
+    histogram over the interval between two scrapes.
+    """
+    buckets: Dict[str, Dict[float, float]] = defaultdict(lambda: defaultdict(float))
+    sums: Dict[str, float] = defaultdict(float)
+    counts: Dict[str, float] = defaultdict(float)
+    for (name, labels), value in after.items():
+        delta = value - before.get((name, labels), 0.0)
+        label_map = dict(labels)
+        group = label_map.get(group_by, "")
+        if name == f"{metric}_bucket":
+            bound = float("inf") if label_map["le"] == "+Inf" else float(label_map["le"])
+            buckets[group][bound] += delta
+        elif name == f"{metric}_sum":
+            sums[group] += delta
+        elif name == f"{metric}_count":
+            counts[group] += delta
+
+    result = {}
+    for group, count in counts.items():
+        if count <= 0:
+            continue
+        bounds = sorted(buckets[group].items())
+        entry = {"count": int(count), "mean_ms": round(sums[group] / count * 1000, 3)}
+        for q in (50, 95, 99):
+            entry[f"p{q}_ms"] = round(_bucket_quantile(bounds, q / 100) * 1000, 3)
+        result[group] = entry
+    return result
+
+
+def _bucket_quantile(bounds: List[Tuple[float, float]], q: float) -> float:
+    """Linear interpolation inside cumulative buckets, like Prometheus' histogram_quantile."""
+    total = bounds[-1][1] if bounds else 0
+    if not total:
+        return 0.0
+    rank = q * total
+    lower_bound, lower_count = 0.0, 0.0
+    for bound, cumulative in bounds:
+        if cumulative >= rank:
+            if bound == float("inf"):
+                return lower_bound
+            if cumulative == lower_count:
+                return bound
+            return lower_bound + (bound - lower_bound) * (rank - lower_count) / (cumulative - lower_count)
+        lower_bound, lower_count = bound, cumulative
+    return lower_bound
+
+
+def _random_query() -> str:
+    return random.choice(QUERY_TEMPLATES).format(n=random.randint(1, 5000))
+
+
+async def _wait_ready(url: str, process: subprocess.Popen, timeout: float = 60.0) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError(f"Process exited with code {process.returncode} before {url} became ready")
+            try:
+                await client.get(url)
+                return
+            except httpx.TransportError:
+                await asyncio.sleep(0.2)
+    raise RuntimeError(f"Timed out waiting for {url}")
+
+
+async def _setup(client: httpx.AsyncClient, mock_url: str, provider: str) -> None:
+    config = {
+        "agentProvider": provider,
+        "agentModel": PROVIDER_MODELS[provider],
+        "embeddingProvider": "openai",
+        "embeddingModel": "text-embedding-3-small",
+        "logLevel": "WARNING",
+        "openaiApiKey": "bench",
+        "anthropicApiKey": "bench",
+        "googleApiKey": "bench",
+    }
+    (await client.post("/api/v1/config/", json=config)).raise_for_status()
+
+    async with httpx.AsyncClient() as mock:
+        spec = (await mock.get(f"{mock_url}/openapi.json")).content
+    upload = await client.post("/api/v1/connectors/upload", files={"file": ("bench_store.json", spec, "application/json")})
+    upload.raise_for_status()
+    connector_id = upload.json()["connector_id"]
+    (await client.post(f"/api/v1/connectors/{connector_id}/secrets", json={"api_key": "bench"})).raise_for_status()
+
+
+async def _run_level(client: httpx.AsyncClient, concurrency: int, requests: int) -> Dict[str, Any]:
+    latencies: List[float] = []
+    errors: Dict[str, int] = defaultdict(int)
+    remaining = iter(range(requests))
+
+    async def worker():
+        for _ in remaining:
+            start = time.perf_counter()
+            try:
+                response = await client.post("/api/v1/query/query", json={"query": _random_query()}, headers={"x-api-key": API_KEY})
+                ok = response.status_code == 200 and response.json().get("success")
+                if not ok:
+                    errors[f"http_{response.status_code}" if response.status_code != 200 else "unsuccessful"] += 1
+            except httpx.HTTPError as e:
+                errors[type(e).__name__] += 1
+            latencies.append(time.perf_counter() - start)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    ms = [latency * 1000 for latency in latencies]
+    return {
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": dict(errors),
+        "error_rate": round(sum(errors.values()) / max(1, len(latencies)), 4),
+        "duration_s": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": {
+            "mean": round(sum(ms) / len(ms), 3) if ms else 0.0,
+            "p50": round(percentile(ms, 50), 3),
+            "p95": round(percentile(ms, 95), 3),
+            "p99": round(percentile(ms, 99), 3),
+            "max": round(max(ms), 3) if ms else 0.0,
+        },
+    }
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    workdir = tempfile.mkdtemp(prefix="api-connector-bench-")
+    mock_url = f"http://127.0.0.1:{args.mock_port}"
+    app_url = f"http://127.0.0.1:{args.app_port}"
+
+    mock_cmd = [sys.executable, "-m", "benchmarks.mock_services", "--port", str(args.mock_port)]
+    for name in ("upstream_latency_ms", "upstream_jitter_ms", "upstream_failure_rate",
+                 "llm_latency_ms", "llm_jitter_ms", "llm_failure_rate", "embedding_latency_ms"):
+        mock_cmd += [f"--{name.replace('_', '-')}", str(getattr(args, name))]
+
+    app_env = {
+        **os.environ,
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        "CHROMA_DB_PATH": os.path.join(workdir, "chroma"),
+        "VECTOR_STORE_PATH": os.path.join(workdir, "vectors"),
+        "VAULT_PATH": os.path.join(workdir, "vault"),
+        "VAULT_ENCRYPTION_KEY": Fernet.generate_key().decode(),
+        "OPENAI_BASE_URL": mock_url,
+        "ANTHROPIC_BASE_URL": mock_url,
+        "GOOGLE_AI_BASE_URL": mock_url,
+        "LOG_LEVEL": "WARNING",
+    }
+    app_cmd = [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(args.app_port),
+               "--log-level", "warning", "--no-access-log", "--workers", str(args.workers)]
+
+    processes = []
+    try:
+        processes.append(subprocess.Popen(mock_cmd, cwd=BACKEND_DIR))
+        await _wait_ready(f"{mock_url}/stats", processes[-1])
+        processes.append(subprocess.Popen(app_cmd, cwd=BACKEND_DIR, env=app_env))
+        await _wait_ready(app_url, processes[-1])
+
+        limits = httpx.Limits(max_connections=max(args.concurrency) + 10)
+        async with httpx.AsyncClient(base_url=app_url, timeout=120.0, limits=limits) as client:
+            await _setup(client, mock_url, args.provider)
+            if args.warmup:
+                await _run_level(client, min(args.concurrency), args.warmup)
+
+            levels = []
+            for concurrency in args.concurrency:
+                before = parse_metrics((await client.get("/metrics")).text)
+                level = await _run_level(client, concurrency, args.requests)
+                after = parse_metrics((await client.get("/metrics")).text)
+                level["stages"] = histogram_breakdown(before, after, "query_stage_seconds", "stage")
+                level["llm"] = histogram_breakdown(before, after, "llm_request_seconds", "provider")
+                levels.append(level)
+                print(
+                    f"concurrency={concurrency:<4} rps={level['throughput_rps']:<8} "
+                    f"p50={level['latency_ms']['p50']}ms p95={level['latency_ms']['p95']}ms "
+                    f"p99={level['latency_ms']['p99']}ms errors={level['error_rate']:.2%}"
+                )
+            async with httpx.AsyncClient() as mock:
+                mock_stats = (await mock.get(f"{mock_url}/stats")).json()
+    finally:
+        for process in reversed(processes):
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        if not args.keep_data:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "baseline")},
+        "mock_calls": mock_stats,
+        "levels": levels,
+    }
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any]) -> None:
+    """Print throughput and p95 changes against a previous report, per concurrency level."""
+    previous = {level["concurrency"]: level for level in baseline.get("levels", [])}
+    for level in report["levels"]:
+        old = previous.get(level["concurrency"])
+        if not old:
+            continue
+        rps_change = (level["throughput_rps"] / old["throughput_rps"] - 1) if old["throughput_rps"] else 0.0
+        p95_change = (level["latency_ms"]["p95"] / old["latency_ms"]["p95"] - 1) if old["latency_ms"]["p95"] else 0.0
+        print(f"concurrency={level['concurrency']:<4} throughput {rps_change:+.1%}  p95 {p95_change:+.1%}")
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Offline load test for the query endpoint")
+    parser.add_argument("--concurrency", type=lambda v: [int(c) for c in v.split(",")], default=[1, 4, 8],
+                        help="comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=200, help="requests per concurrency level")
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--provider", choices=sorted(PROVIDER_MODELS), default="openai")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="uvicorn worker processes for the app (stage breakdown then covers one worker per scrape)")
+    parser.add_argument("--app-port", type=int, default=8765)
+    parser.add_argument("--mock-port", type=int, default=9100)
+    parser.add_argument("--output", help="write the JSON report here (default: stdout)")
+    parser.add_argument("--baseline", help="previous JSON report to compare against")
+    parser.add_argument("--keep-data", action="store_true", help="keep the temporary database/vault/Chroma directory")
+    mock_services.add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(run(args))
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(report, json.load(f))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}")
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
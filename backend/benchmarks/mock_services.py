@@ -0,0 +1,227 @@
+"""
+Offline stand-ins for everything the query pipeline calls out to.
+
+One server provides:
+- a small OpenAPI upstream ("Bench Store") under /store, with its spec at /openapi.json
+- an OpenAI-compatible API (/v1/chat/completions, /v1/embeddings)
+- an Anthropic-compatible API (/v1/messages)
+- a Gemini-compatible API (/v1beta/models/{model}:generateContent)
+
+Latency and failure rates are configurable per side. Embeddings are
+deterministic hashed bag-of-words vectors, so vector search behaves
+sensibly without any model.
+
+Usage:
+    python -m benchmarks.mock_services --port 9100 --llm-latency-ms 300 --upstream-failure-rate 0.01
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import random
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, List
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+EMBEDDING_DIMENSIONS = 256
+
+
+@dataclass
+class MockConfig:
+    base_url: str = "http://127.0.0.1:9100"
+    upstream_latency_ms: float = 20.0
+    upstream_jitter_ms: float = 5.0
+    upstream_failure_rate: float = 0.0
+    llm_latency_ms: float = 300.0
+    llm_jitter_ms: float = 50.0
+    llm_failure_rate: float = 0.0
+    embedding_latency_ms: float = 30.0
+
+
+def store_spec(base_url: str) -> Dict[str, Any]:
+    """OpenAPI spec of the mock upstream, pointing at `base_url`/store."""
+    def by_id(resource: str, param: str, summary: str) -> Dict[str, Any]:
+        return {"get": {
+            "operationId": f"get{resource.capitalize()}ById",
+            "summary": summary,
+            "parameters": [{"name": param, "in": "path", "required": True, "schema": {"type": "integer"},
+                            "description": f"ID of the {resource}"}],
+            "responses": {"200": {"description": "OK"}},
+        }}
+
+    return {
+        "openapi": "3.0.0",
+        "info": {"title": "Bench Store", "version": "1.0.0"},
+        "servers": [{"url": f"{base_url}/store"}],
+        "x-auth-type": "api-key",
+        "components": {"securitySchemes": {"api_key": {"type": "apiKey", "in": "header", "name": "X-API-Key"}}},
+        "paths": {
+            "/orders/{orderId}": by_id("order", "orderId", "Get an order by its ID, including status and line items"),
+            "/customers/{customerId}": by_id("customer", "customerId", "Get a customer profile by customer ID"),
+            "/products/{productId}": by_id("product", "productId", "Get a product with price and stock level"),
+            "/inventory": {"get": {
+                "operationId": "getInventory",
+                "summary": "Get inventory counts by status for the whole store",
+                "responses": {"200": {"description": "OK"}},
+            }},
+        },
+    }
+
+
+def embed(text: str) -> List[float]:
+    """Deterministic hashed bag-of-words embedding, L2-normalized."""
+    vector = [0.0] * EMBEDDING_DIMENSIONS
+    for token in re.findall(r"[a-z]+", text.lower()):
+        digest = hashlib.md5(token.encode()).digest()
+        index = int.from_bytes(digest[:4], "little") % EMBEDDING_DIMENSIONS
+        vector[index] += 1.0 if digest[4] & 1 else -1.0
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+
+def answer(prompt: str) -> str:
+    """Produce the JSON the pipeline expects for its assessment, planning and extraction prompts."""
+    if prompt.startswith("You are a function selection assistant"):
+        return json.dumps({"selected": True, "index": 0, "reasoning": "Top candidate matches.", "confidence": "high"})
+    if prompt.startswith("You are an API call planner"):
+        return json.dumps({"selected": True, "operations": [{"index": 0, "parameters": {}}],
+                           "reasoning": "Single call.", "confidence": "high"})
+
+    # Parameter extraction: assign numbers from the query to the listed parameters in order
+    query = re.search(r'User Query: "(.*)"', prompt)
+    numbers = re.findall(r"\b\d+\b", query.group(1) if query else "")
+    params = {}
+    for name, param_type in re.findall(r"^- (\w+) \(\w*, (\w+)\)", prompt, re.M):
+        if not numbers:
+            break
+        value = numbers.pop(0)
+        params[name] = int(value) if param_type == "integer" else value
+    return json.dumps(params)
+
+
+def create_app(config: MockConfig) -> FastAPI:
+    app = FastAPI(title="Benchmark mock services", openapi_url=None, docs_url=None, redoc_url=None)
+    stats = {"upstream": 0, "llm": 0, "embeddings": 0, "failures": 0}
+
+    async def delay(mean_ms: float, jitter_ms: float = 0.0) -> None:
+        await asyncio.sleep(max(0.0, random.gauss(mean_ms, jitter_ms)) / 1000)
+
+    def failed(rate: float) -> bool:
+        if rate and random.random() < rate:
+            stats["failures"] += 1
+            return True
+        return False
+
+    @app.get("/openapi.json")
+    async def get_spec():
+        return store_spec(config.base_url)
+
+    @app.get("/stats")
+    async def get_stats():
+        return stats
+
+    # Upstream API
+
+    @app.get("/store/{resource}/{item_id}")
+    async def get_item(resource: str, item_id: int):
+        stats["upstream"] += 1
+        await delay(config.upstream_latency_ms, config.upstream_jitter_ms)
+        if failed(config.upstream_failure_rate):
+            return JSONResponse({"error": "Service unavailable"}, status_code=503)
+        return {"id": item_id, "type": resource.rstrip("s"), "status": "available",
+                "items": [{"sku": f"SKU-{item_id}-{i}", "quantity": i + 1} for i in range(5)]}
+
+    @app.get("/store/inventory")
+    async def get_inventory():
+        stats["upstream"] += 1
+        await delay(config.upstream_latency_ms, config.upstream_jitter_ms)
+        if failed(config.upstream_failure_rate):
+            return JSONResponse({"error": "Service unavailable"}, status_code=503)
+        return {"available": 120, "pending": 14, "sold": 873}
+
+    # LLM providers
+
+    async def llm_reply(prompt: str):
+        stats["llm"] += 1
+        await delay(config.llm_latency_ms, config.llm_jitter_ms)
+        if failed(config.llm_failure_rate):
+            return None
+        return answer(prompt)
+
+    @app.post("/v1/chat/completions")
+    async def openai_chat(request: Request):
+        body = await request.json()
+        text = await llm_reply(body["messages"][-1]["content"])
+        if text is None:
+            return JSONResponse({"error": {"message": "Overloaded"}}, status_code=503)
+        return {"id": "chatcmpl-bench", "object": "chat.completion", "model": body.get("model"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}]}
+
+    @app.post("/v1/embeddings")
+    async def openai_embeddings(request: Request):
+        body = await request.json()
+        inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        stats["embeddings"] += 1
+        await delay(config.embedding_latency_ms)
+        return {"object": "list", "model": body.get("model"),
+                "data": [{"object": "embedding", "index": i, "embedding": embed(str(text))} for i, text in enumerate(inputs)],
+                "usage": {"prompt_tokens": 0, "total_tokens": 0}}
+
+    @app.post("/v1/messages")
+    async def anthropic_messages(request: Request):
+        body = await request.json()
+        text = await llm_reply(body["messages"][-1]["content"])
+        if text is None:
+            return JSONResponse({"type": "error", "error": {"type": "overloaded_error"}}, status_code=529)
+        return {"id": "msg_bench", "type": "message", "role": "assistant", "model": body.get("model"),
+                "content": [{"type": "text", "text": text}], "stop_reason": "end_turn"}
+
+    @app.post("/v1beta/models/{model}:generateContent")
+    async def gemini_generate(model: str, request: Request):
+        body = await request.json()
+        text = await llm_reply(body["contents"][-1]["parts"][0]["text"])
+        if text is None:
+            return JSONResponse({"error": {"code": 503, "status": "UNAVAILABLE"}}, status_code=503)
+        return {"candidates": [{"content": {"role": "model", "parts": [{"text": text}]}, "finishReason": "STOP"}]}
+
+    return app
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    defaults = MockConfig()
+    parser.add_argument("--upstream-latency-ms", type=float, default=defaults.upstream_latency_ms)
+    parser.add_argument("--upstream-jitter-ms", type=float, default=defaults.upstream_jitter_ms)
+    parser.add_argument("--upstream-failure-rate", type=float, default=defaults.upstream_failure_rate)
+    parser.add_argument("--llm-latency-ms", type=float, default=defaults.llm_latency_ms)
+    parser.add_argument("--llm-jitter-ms", type=float, default=defaults.llm_jitter_ms)
+    parser.add_argument("--llm-failure-rate", type=float, default=defaults.llm_failure_rate)
+    parser.add_argument("--embedding-latency-ms", type=float, default=defaults.embedding_latency_ms)
+
+
+def config_from_args(args: argparse.Namespace, base_url: str) -> MockConfig:
+    return MockConfig(
+        base_url=base_url,
+        upstream_latency_ms=args.upstream_latency_ms,
+        upstream_jitter_ms=args.upstream_jitter_ms,
+        upstream_failure_rate=args.upstream_failure_rate,
+        llm_latency_ms=args.llm_latency_ms,
+        llm_jitter_ms=args.llm_jitter_ms,
+        llm_failure_rate=args.llm_failure_rate,
+        embedding_latency_ms=args.embedding_latency_ms,
+    )
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Run the benchmark mock upstream and LLM providers")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    add_arguments(parser)
+    args = parser.parse_args()
+    config = config_from_args(args, f"http://{args.host}:{args.port}")
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
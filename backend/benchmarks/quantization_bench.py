@@ -0,0 +1,168 @@
+"""
+Recall / memory / latency trade-off of the numpy vector backend's storage dtypes.
+
+Builds one store per VECTOR_DTYPE (float32, float16, int8), with and
+without exact re-scoring, from the same embeddings, and compares each
+against exact float32 search:
+- recall@k: share of returned ids scoring at least the exact k-th best
+  score (so ties, common with hashed embeddings, are not counted as misses)
+- search latency (single-threaded)
+- scanned bytes: the vectors (and scales) read by every query, i.e. the
+  per-worker working set (shared between workers through the page cache)
+- disk bytes, split into vectors, exact copies and chunk text
+
+Embeddings are either clustered random unit vectors (`--data clustered`, the
+default, at a model-like dimension) or hashed embeddings of a synthetic
+catalog (`--data catalog`).
+
+Usage (from backend/):
+    python -m benchmarks.quantization_bench --size 100000 --dimensions 384 --output quantization.json
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from benchmarks import mock_services
+from benchmarks.loadtest import percentile
+from benchmarks.vector_bench import OPERATIONS, _queries, synthetic_spec
+
+CONFIGS = (("float32", 0), ("float16", 0), ("float16", 50), ("int8", 0), ("int8", 50), ("int8", 200))
+
+
+def clustered_data(size: int, dimensions: int, queries: int, seed: int) -> Tuple[np.ndarray, List[str], np.ndarray]:
+    """Unit vectors around size/20 centers, with queries perturbed from stored vectors."""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(max(1, size // 20), dimensions)).astype(np.float32)
+    vectors = centers[rng.integers(len(centers), size=size)] + rng.normal(scale=0.35, size=(size, dimensions)).astype(np.float32)
+    documents = [f"Function: operation{i}. Description: synthetic operation {i}" for i in range(size)]
+    picked = vectors[rng.integers(size, size=queries)]
+    query_vectors = picked + rng.normal(scale=0.35, size=picked.shape).astype(np.float32)
+    return vectors, documents, query_vectors
+
+
+def catalog_data(size: int, queries: int, seed: int, connector_size: int = 500) -> Tuple[np.ndarray, List[str], np.ndarray]:
+    """Hashed embeddings of a synthetic catalog and of queries written for its operations."""
+    specs = []
+    for index in range(0, size, connector_size):
+        connector_id = f"bench-{index // connector_size:05d}"
+        specs.append((connector_id, synthetic_spec(f"Bench API {connector_id}", min(connector_size, size - index), index // len(OPERATIONS))))
+    documents = [
+        f"Connector: {spec['info']['title']}. Function: {details['operationId']}. Path: {method.upper()} {path}. "
+        f"Description: {details['summary']} "
+        for _, spec in specs
+        for path, methods in spec["paths"].items()
+        for method, details in methods.items()
+    ]
+    vectors = np.asarray([mock_services.embed(document) for document in documents], dtype=np.float32)
+    query_vectors = np.asarray([mock_services.embed(query) for query, _ in _queries(specs, queries, seed)], dtype=np.float32)
+    return vectors, documents, query_vectors
+
+
+def _file_bytes(directory: str, *names: str) -> int:
+    return sum(os.path.getsize(os.path.join(directory, name)) for name in names if os.path.exists(os.path.join(directory, name)))
+
+
+def run_config(
+    dtype: str, rescore: int, vectors: np.ndarray, documents: List[str], query_vectors: np.ndarray,
+    unit: np.ndarray, thresholds: np.ndarray, k: int, workdir: str
+) -> Dict[str, Any]:
+    from app.services.vector_backends import NumpyBackend
+
+    path = os.path.join(workdir, f"{dtype}-{rescore}")
+    ids = [str(i) for i in range(len(vectors))]
+    store = NumpyBackend(path=path, dtype=dtype, index="exact", rescore_candidates=rescore)
+    store.add(ids, vectors, documents, [{"connector_id": "bench"}] * len(ids))
+
+    latencies = []
+    overlap = 0
+    for query, threshold in zip(query_vectors, thresholds):
+        start = time.perf_counter()
+        found = store.query([query], n_results=k)["ids"][0]
+        latencies.append((time.perf_counter() - start) * 1000)
+        exact = unit[[int(i) for i in found]] @ (query / np.linalg.norm(query))
+        overlap += int(np.sum(exact >= threshold - 1e-6))
+
+    snapshot = store._snapshot
+    with open(os.path.join(path, "CURRENT")) as f:
+        version = os.path.join(path, f.read().strip())
+    result = {
+        "dtype": dtype,
+        "rescore_candidates": rescore,
+        f"recall_at_{k}": round(overlap / (k * len(thresholds)), 4),
+        "latency_ms": {
+            "mean": round(sum(latencies) / len(latencies), 3),
+            "p50": round(percentile(latencies, 50), 3),
+            "p95": round(percentile(latencies, 95), 3),
+        },
+        "scanned_bytes": int(snapshot.vectors.nbytes + (snapshot.scales.nbytes if snapshot.scales is not None else 0)),
+        "disk_bytes": {
+            "vectors": _file_bytes(version, "vectors.npy", "scales.npy"),
+            "exact": _file_bytes(version, "exact.npy"),
+            "documents": _file_bytes(version, "documents.bin", "offsets.npy"),
+            "records": _file_bytes(version, "records.json"),
+        },
+    }
+    shutil.rmtree(path, ignore_errors=True)
+    print(
+        f"dtype={dtype:<8} rescore={rescore:<4} recall@{k}={result[f'recall_at_{k}']:.4f} "
+        f"p50={result['latency_ms']['p50']}ms scanned={result['scanned_bytes'] / 2**20:.1f}MiB",
+        file=sys.stderr,
+    )
+    return result
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Recall and memory trade-off of compact vector storage")
+    parser.add_argument("--size", type=int, default=50000, help="stored vectors")
+    parser.add_argument("--dimensions", type=int, default=384, help="vector size for --data clustered")
+    parser.add_argument("--data", choices=("clustered", "catalog"), default="clustered")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=5, help="results per query (recall@k)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write the JSON report here (default: stdout)")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="api-connector-quantization-bench-")
+    os.environ["VECTOR_STORE_PATH"] = os.path.join(workdir, "vectors")
+
+    if args.data == "catalog":
+        vectors, documents, query_vectors = catalog_data(args.size, args.queries, args.seed)
+    else:
+        vectors, documents, query_vectors = clustered_data(args.size, args.dimensions, args.queries, args.seed)
+
+    # Ground truth: the k-th best exact float32 cosine score of each query
+    unit = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    thresholds = np.array([
+        np.partition(unit @ (query / np.linalg.norm(query)), -args.k)[-args.k] for query in query_vectors
+    ])
+
+    try:
+        results = [
+            run_config(dtype, rescore, vectors, documents, query_vectors, unit, thresholds, args.k, workdir)
+            for dtype, rescore in CONFIGS
+        ]
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "config": {key: value for key, value in vars(args).items() if key != "output"},
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}", file=sys.stderr)
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
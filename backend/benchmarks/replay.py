@@ -0,0 +1,325 @@
+"""
+Replay captured traffic (see app/core/capture.py) against the current build.
+
+Starts the replay stand-ins and the FastAPI app. The app gets a throwaway
+database holding the captured connectors, with their servers pointed at the
+stand-ins and auth switched off. It also gets provider base URLs pointed at
+the stand-ins and CAPTURE_REPLAY_PATH, so function search returns the
+recorded results.
+
+Each captured request is then sent again. By default requests go out at their
+original offsets, divided by --speed; with --concurrency they go closed-loop,
+as fast as the app answers. --speed also scales the recorded vector, LLM and
+upstream latencies.
+
+The report compares each request's latency and status with the recording,
+and includes the per-stage breakdown from /metrics and the app's resident and
+peak memory. Pass --baseline with the report of another build to compare
+latency and memory between builds.
+
+Usage (from backend/):
+    python -m benchmarks.replay --capture ./captures --output replay.json
+    python -m benchmarks.replay --capture ./captures --speed 4 --baseline replay.json
+    python -m benchmarks.replay --capture ./captures --speed 0 --concurrency 8
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlsplit
+
+import httpx
+from cryptography.fernet import Fernet
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.core.capture import read_capture
+from benchmarks.loadtest import API_KEY, BACKEND_DIR, _wait_ready, histogram_breakdown, parse_metrics, percentile
+
+REPLAY_USER_ID = "demo-user-123"
+
+
+def load_capture(paths: List[str]) -> Dict[str, Any]:
+    """Captured requests (in time order) and the latest snapshot of each connector."""
+    requests: List[Dict[str, Any]] = []
+    connectors: Dict[str, Dict[str, Any]] = {}
+    for line in read_capture(paths):
+        if line.get("type") == "request":
+            requests.append(line)
+        elif line.get("type") == "connector":
+            connectors[line["connector_id"]] = line
+    requests.sort(key=lambda request: request["ts"])
+    return {"requests": requests, "connectors": connectors}
+
+
+def _replay_schema(snapshot: Dict[str, Any], standin_url: str) -> Dict[str, Any]:
+    """Connector spec with its server moved under the stand-ins and no auth."""
+    spec = dict(snapshot["full_schema_json"])
+    servers = spec.get("servers") or [{"url": ""}]
+    original = urlsplit(servers[0].get("url", ""))
+    spec["servers"] = [{"url": f"{standin_url}/upstream/{snapshot['connector_id']}{original.path.rstrip('/')}"}]
+    spec["x-auth-type"] = "none"
+    return spec
+
+
+def prepare_database(database_url: str, connectors: Dict[str, Dict[str, Any]], standin_url: str) -> None:
+    from app.db.models import Base, Connector, ConnectorStatus
+
+    engine = create_engine(database_url)
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    try:
+        for snapshot in connectors.values():
+            session.add(Connector(
+                connector_id=snapshot["connector_id"],
+                user_id=REPLAY_USER_ID,
+                name=snapshot["name"],
+                description=snapshot["description"],
+                version=snapshot["version"],
+                auth_type="none",
+                full_schema_json=_replay_schema(snapshot, standin_url),
+                operation_parameters=snapshot["operation_parameters"],
+                status=ConnectorStatus(snapshot["status"]),
+            ))
+        session.commit()
+    finally:
+        session.close()
+        engine.dispose()
+
+
+def llm_config(requests: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Global config selecting the provider and model the capture used most."""
+    used = Counter(
+        (event["provider"], event["model"])
+        for request in requests for event in request["events"] if event["kind"] == "llm"
+    )
+    provider, model = used.most_common(1)[0][0] if used else ("none", "")
+    return {
+        "agentProvider": provider,
+        "agentModel": model,
+        "logLevel": "WARNING",
+        "openaiApiKey": "replay",
+        "anthropicApiKey": "replay",
+        "googleApiKey": "replay",
+    }
+
+
+def process_memory(pid: int) -> Dict[str, int]:
+    """Resident and peak resident memory (KiB) of a process, from /proc (empty elsewhere)."""
+    memory = {}
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                name, _, value = line.partition(":")
+                if name in ("VmRSS", "VmHWM"):
+                    memory["rss_kib" if name == "VmRSS" else "peak_rss_kib"] = int(value.split()[0])
+    except OSError:
+        pass
+    return memory
+
+
+async def _send(client: httpx.AsyncClient, request: Dict[str, Any]) -> Dict[str, Any]:
+    headers = {"x-api-key": API_KEY, **request.get("headers", {})}
+    start = time.perf_counter()
+    try:
+        response = await client.request(request["method"], request["endpoint"], json=request["body"], headers=headers)
+        status = response.status_code
+    except httpx.HTTPError as e:
+        status = type(e).__name__
+    return {
+        "endpoint": request["endpoint"],
+        "latency_ms": (time.perf_counter() - start) * 1000,
+        "recorded_ms": request["duration_ms"],
+        "status": status,
+        "recorded_status": request["status"],
+    }
+
+
+async def drive(client: httpx.AsyncClient, requests: List[Dict[str, Any]], speed: float, concurrency: int) -> List[Dict[str, Any]]:
+    if concurrency:
+        remaining = iter(requests)
+        results: List[Dict[str, Any]] = []
+
+        async def worker():
+            for request in remaining:
+                results.append(await _send(client, request))
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return results
+
+    # Open loop: keep the captured arrival pattern
+    first = requests[0]["ts"]
+    started = time.monotonic()
+
+    async def timed(request):
+        if speed > 0:
+            await asyncio.sleep(max(0.0, started + (request["ts"] - first) / speed - time.monotonic()))
+        return await _send(client, request)
+
+    return list(await asyncio.gather(*(timed(request) for request in requests)))
+
+
+def _latency_summary(values: List[float]) -> Dict[str, float]:
+    return {
+        "mean": round(sum(values) / len(values), 3) if values else 0.0,
+        "p50": round(percentile(values, 50), 3),
+        "p95": round(percentile(values, 95), 3),
+        "p99": round(percentile(values, 99), 3),
+        "max": round(max(values), 3) if values else 0.0,
+    }
+
+
+def summarize(results: List[Dict[str, Any]], elapsed: float) -> Dict[str, Any]:
+    by_endpoint: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    for result in results:
+        by_endpoint[result["endpoint"]].append(result)
+    return {
+        "requests": len(results),
+        "duration_s": round(elapsed, 3),
+        "status_mismatches": sum(1 for result in results if result["status"] != result["recorded_status"]),
+        "endpoints": {
+            endpoint: {
+                "requests": len(entries),
+                "latency_ms": _latency_summary([entry["latency_ms"] for entry in entries]),
+                "recorded_latency_ms": _latency_summary([entry["recorded_ms"] for entry in entries]),
+                "statuses": dict(Counter(str(entry["status"]) for entry in entries)),
+            }
+            for endpoint, entries in sorted(by_endpoint.items())
+        },
+    }
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    capture = load_capture(args.capture)
+    if not capture["requests"]:
+        raise SystemExit("No captured requests found")
+    requests = capture["requests"][:args.limit] if args.limit else capture["requests"]
+
+    workdir = tempfile.mkdtemp(prefix="api-connector-replay-")
+    standin_url = f"http://127.0.0.1:{args.standin_port}"
+    app_url = f"http://127.0.0.1:{args.app_port}"
+    database_url = f"sqlite:///{os.path.join(workdir, 'replay.db')}"
+    capture_paths = [os.path.abspath(path) for path in args.capture]
+    prepare_database(database_url, capture["connectors"], standin_url)
+
+    standin_cmd = [sys.executable, "-m", "benchmarks.replay_standins", "--port", str(args.standin_port),
+                   "--speed", str(args.speed)]
+    for path in capture_paths:
+        standin_cmd += ["--capture", path]
+    app_env = {
+        **os.environ,
+        "SQLALCHEMY_DATABASE_URI": database_url,
+        "CHROMA_DB_PATH": os.path.join(workdir, "chroma"),
+        "VECTOR_STORE_PATH": os.path.join(workdir, "vectors"),
+        "VAULT_PATH": os.path.join(workdir, "vault"),
+        "VAULT_ENCRYPTION_KEY": Fernet.generate_key().decode(),
+        "OPENAI_BASE_URL": standin_url,
+        "ANTHROPIC_BASE_URL": standin_url,
+        "GOOGLE_AI_BASE_URL": standin_url,
+        "CAPTURE_ENABLED": "false",
+        "CAPTURE_REPLAY_PATH": os.pathsep.join(capture_paths),
+        "CAPTURE_REPLAY_SPEED": str(args.speed),
+        "LOG_LEVEL": "WARNING",
+    }
+    app_cmd = [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(args.app_port),
+               "--log-level", "warning", "--no-access-log"]
+
+    processes = []
+    try:
+        processes.append(subprocess.Popen(standin_cmd, cwd=BACKEND_DIR))
+        await _wait_ready(f"{standin_url}/stats", processes[-1])
+        processes.append(subprocess.Popen(app_cmd, cwd=BACKEND_DIR, env=app_env))
+        app_pid = processes[-1].pid
+        await _wait_ready(app_url, processes[-1])
+
+        limits = httpx.Limits(max_connections=max(args.concurrency, len(requests) if not args.concurrency else 0) + 10)
+        async with httpx.AsyncClient(base_url=app_url, timeout=args.timeout, limits=limits) as client:
+            (await client.post("/api/v1/config/", json=llm_config(requests))).raise_for_status()
+            memory_before = process_memory(app_pid)
+            before = parse_metrics((await client.get("/metrics")).text)
+            started = time.perf_counter()
+            results = await drive(client, requests, args.speed, args.concurrency)
+            elapsed = time.perf_counter() - started
+            after = parse_metrics((await client.get("/metrics")).text)
+            memory_after = process_memory(app_pid)
+        async with httpx.AsyncClient() as standins:
+            standin_stats = (await standins.get(f"{standin_url}/stats")).json()
+    finally:
+        for process in reversed(processes):
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = summarize(results, elapsed)
+    report.update({
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "baseline")},
+        "standins": standin_stats,
+        "stages": histogram_breakdown(before, after, "query_stage_seconds", "stage"),
+        "memory": {"before": memory_before, "after": memory_after},
+    })
+    return report
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any]) -> None:
+    """Print latency and memory changes against the report of another build."""
+    def change(new: float, old: float) -> str:
+        return f"{(new / old - 1):+.1%}" if old else "n/a"
+
+    for endpoint, entry in report["endpoints"].items():
+        old = baseline.get("endpoints", {}).get(endpoint)
+        if not old:
+            continue
+        latency, previous = entry["latency_ms"], old["latency_ms"]
+        print(f"{endpoint}: " + "  ".join(f"{q} {change(latency[q], previous[q])}" for q in ("p50", "p95", "p99")))
+    peak = report["memory"]["after"].get("peak_rss_kib")
+    old_peak = baseline.get("memory", {}).get("after", {}).get("peak_rss_kib")
+    if peak and old_peak:
+        print(f"peak RSS {peak} KiB ({change(peak, old_peak)})")
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Replay captured traffic against the current build")
+    parser.add_argument("--capture", action="append", required=True, help="capture file or directory (repeatable)")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="speed-up of arrivals and recorded latencies (0 = no delays at all)")
+    parser.add_argument("--concurrency", type=int, default=0,
+                        help="send closed-loop with this many workers instead of at the recorded arrival times")
+    parser.add_argument("--limit", type=int, default=0, help="replay only the first N captured requests")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--app-port", type=int, default=8766)
+    parser.add_argument("--standin-port", type=int, default=9200)
+    parser.add_argument("--output", help="write the JSON report here (default: stdout)")
+    parser.add_argument("--baseline", help="report of another build to compare against")
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(run(args))
+    for endpoint, entry in report["endpoints"].items():
+        latency, recorded = entry["latency_ms"], entry["recorded_latency_ms"]
+        print(f"{endpoint}: {entry['requests']} requests p50={latency['p50']}ms (recorded {recorded['p50']}ms) "
+              f"p95={latency['p95']}ms (recorded {recorded['p95']}ms)")
+    print(f"status mismatches: {report['status_mismatches']}  stand-in misses: "
+          f"llm={report['standins']['llm_misses']} upstream={report['standins']['upstream_misses']}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(report, json.load(f))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}")
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
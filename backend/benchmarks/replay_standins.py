@@ -0,0 +1,118 @@
+"""
+Local stand-ins for the LLM providers and upstream APIs of a traffic capture.
+
+Serves what the captured requests received, with the recorded latency
+divided by --speed:
+- LLM responses (OpenAI, Anthropic and Gemini-compatible endpoints), by
+  provider, model and prompt
+- upstream responses under /upstream/{connector_id}/..., by method, path and
+  query
+
+Responses recorded several times for the same key are served in recorded
+order, cycling when the replay asks more often. Unrecorded calls get a 404
+and are counted in /stats, so a replay that diverges from the capture shows
+up in the report.
+
+Usage:
+    python -m benchmarks.replay_standins --capture ./captures --port 9200 --speed 2
+"""
+import argparse
+import asyncio
+import itertools
+from collections import defaultdict
+from typing import Any, Dict, List, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
+
+from app.core.capture import read_capture, prompt_key, sanitize_url
+
+
+def _query_key(query: str) -> Tuple[Tuple[str, str], ...]:
+    return tuple(sorted(parse_qsl(query, keep_blank_values=True)))
+
+
+def load_events(paths: List[str]) -> Tuple[Dict[tuple, List[Dict[str, Any]]], Dict[tuple, List[Dict[str, Any]]]]:
+    """Recorded LLM and upstream events of the capture files, keyed for lookup."""
+    llm: Dict[tuple, List[Dict[str, Any]]] = defaultdict(list)
+    upstream: Dict[tuple, List[Dict[str, Any]]] = defaultdict(list)
+    for line in read_capture(paths):
+        if line.get("type") != "request":
+            continue
+        for event in line["events"]:
+            if event["kind"] == "llm":
+                if event.get("omitted"):
+                    # Oversized response, not recorded; the app can't use a placeholder
+                    continue
+                llm[(event["provider"], event["model"], event["prompt"])].append(event)
+            elif event["kind"] == "upstream":
+                url = urlsplit(event["url"])
+                upstream[(event["connector_id"], event["method"], url.path, _query_key(url.query))].append(event)
+    return llm, upstream
+
+
+def create_app(paths: List[str], speed: float) -> FastAPI:
+    app = FastAPI(title="Replay stand-ins", openapi_url=None, docs_url=None, redoc_url=None)
+    llm, upstream = load_events(paths)
+    cursors = {key: itertools.cycle(events) for key, events in {**llm, **upstream}.items()}
+    stats = {"llm": 0, "upstream": 0, "llm_misses": 0, "upstream_misses": 0}
+
+    async def serve(kind: str, key: tuple, **headers: str) -> Response:
+        cursor = cursors.get(key)
+        if cursor is None:
+            stats[f"{kind}_misses"] += 1
+            return JSONResponse({"error": f"No recorded {kind} response", "key": [str(part) for part in key]}, status_code=404)
+        stats[kind] += 1
+        event = next(cursor)
+        if speed > 0:
+            await asyncio.sleep(event["duration_ms"] / 1000 / speed)
+        if kind == "llm":
+            return Response(event["body"], status_code=event["status"], headers=event["headers"], media_type="application/json")
+        body = event["body"]
+        if "json" in body:
+            return JSONResponse(body["json"], status_code=event["status"], headers=event["headers"])
+        if "omitted" in body:
+            # Oversized JSON was not captured; send a placeholder of the same size
+            placeholder = {"capture_omitted": "x" * max(0, body["omitted"] - 24)}
+            return JSONResponse(placeholder, status_code=event["status"], headers=event["headers"])
+        return Response(body["text"], status_code=event["status"], headers=event["headers"])
+
+    @app.get("/stats")
+    async def get_stats():
+        return {**stats, "recorded": {"llm": sum(map(len, llm.values())), "upstream": sum(map(len, upstream.values()))}}
+
+    @app.post("/v1/chat/completions")
+    async def openai_chat(request: Request):
+        body = await request.json()
+        return await serve("llm", ("openai", body.get("model"), prompt_key(body["messages"][-1]["content"])))
+
+    @app.post("/v1/messages")
+    async def anthropic_messages(request: Request):
+        body = await request.json()
+        return await serve("llm", ("anthropic", body.get("model"), prompt_key(body["messages"][-1]["content"])))
+
+    @app.post("/v1beta/models/{model}:generateContent")
+    async def gemini_generate(model: str, request: Request):
+        body = await request.json()
+        return await serve("llm", ("google", model, prompt_key(body["contents"][-1]["parts"][0]["text"])))
+
+    @app.api_route("/upstream/{connector_id}/{path:path}", methods=["GET", "POST", "PUT", "PATCH", "DELETE"])
+    async def upstream_call(connector_id: str, path: str, request: Request):
+        # Recorded URLs are sanitized, so compare against the sanitized form
+        url = urlsplit(sanitize_url(str(request.url)))
+        return await serve("upstream", (connector_id, request.method, "/" + path, _query_key(url.query)))
+
+    return app
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Serve recorded LLM and upstream responses for a replay")
+    parser.add_argument("--capture", action="append", required=True, help="capture file or directory (repeatable)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9200)
+    parser.add_argument("--speed", type=float, default=1.0, help="divide recorded latencies by this (0 = no delay)")
+    args = parser.parse_args()
+    uvicorn.run(create_app(args.capture, args.speed), host=args.host, port=args.port, log_level="warning")
@@ -0,0 +1,325 @@
+"""
+Scalability benchmark for the vector store behind function search.
+
+Generates synthetic OpenAPI catalogs of the requested sizes, ingests them
+through `process_and_store_connector_chunks` into a throwaway store of the
+chosen vector backend and measures:
+- ingestion throughput (and how much of it is spent embedding)
+- `search_functions` latency and throughput at each concurrency level, plus
+  how often the operation a query was written for is among the results
+- `delete_connector_functions` cost for one connector
+- on-disk size of the store and resident memory of the process
+
+Embeddings default to the deterministic hashed bag-of-words vectors from
+`benchmarks.mock_services`, so runs are CPU-only, fast and reproducible;
+`--embedding local` uses the sentence-transformers model instead. The
+per-query vault lookup of the embedding configuration is bypassed.
+
+Usage (from backend/):
+    python -m benchmarks.vector_bench --sizes 1000,10000 --output vector.json
+    python -m benchmarks.vector_bench --sizes 100000 --concurrency 1,8 --baseline vector.json
+    python -m benchmarks.vector_bench --backend numpy --sizes 1000,10000
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from cryptography.fernet import Fernet
+
+from benchmarks import mock_services
+from benchmarks.loadtest import percentile
+
+RESOURCES = (
+    "order", "customer", "product", "invoice", "payment", "shipment", "ticket", "user", "account", "report",
+    "warehouse", "supplier", "contract", "campaign", "lead", "subscription", "device", "project", "task", "document",
+)
+QUALIFIERS = (
+    "", "archived", "draft", "partner", "regional", "internal", "recurring", "pending", "legacy", "priority",
+    "external", "temporary", "shared", "billing", "support", "sales", "audit", "mobile", "premium", "batch",
+)
+OPERATIONS = (
+    ("get", "/{id}", "get", "Get a {name} by its ID"),
+    ("get", "", "list", "List all {name}s with optional filters"),
+    ("post", "", "create", "Create a new {name}"),
+    ("put", "/{id}", "update", "Update an existing {name}"),
+    ("delete", "/{id}", "delete", "Delete a {name}"),
+)
+QUERY_TEMPLATES = {
+    "get": "Show me the {name} with id {n}",
+    "list": "List the {name}s",
+    "create": "Create a {name}",
+    "update": "Update {name} {n}",
+    "delete": "Remove the {name} {n}",
+}
+
+
+class HashingEmbeddingFunction:
+    """Embedding function producing `mock_services.embed` vectors; tracks time spent embedding."""
+
+    def __init__(self):
+        self.seconds = 0.0
+        self._lock = threading.Lock()
+
+    def __call__(self, input: List[str]) -> List[List[float]]:
+        start = time.perf_counter()
+        vectors = [mock_services.embed(text) for text in input]
+        with self._lock:
+            self.seconds += time.perf_counter() - start
+        return vectors
+
+    @staticmethod
+    def name() -> str:
+        return "benchmark-hashing"
+
+
+def _resource_names(start: int, count: int) -> List[Tuple[str, str]]:
+    """(display name, path segment) pairs for `count` distinct resources, numbered from `start`."""
+    names = []
+    for index in range(start, start + count):
+        resource = RESOURCES[index % len(RESOURCES)]
+        qualifier = QUALIFIERS[(index // len(RESOURCES)) % len(QUALIFIERS)]
+        generation = index // (len(RESOURCES) * len(QUALIFIERS))
+        words = [w for w in (qualifier, resource) if w]
+        if generation:
+            words.append(f"v{generation}")
+        names.append((" ".join(words), "-".join(words)))
+    return names
+
+
+def synthetic_spec(title: str, operations: int, first_resource: int = 0) -> Dict[str, Any]:
+    """
+    OpenAPI spec with `operations` CRUD operations spread over generated
+    resources; give each connector a distinct `first_resource` so catalogs
+    don't repeat the same operations.
+    """
+    paths: Dict[str, Dict[str, Any]] = {}
+    resources = _resource_names(first_resource, (operations + len(OPERATIONS) - 1) // len(OPERATIONS))
+    created = 0
+    for name, segment in resources:
+        for method, suffix, verb, summary in OPERATIONS:
+            if created == operations:
+                break
+            operation_id = f"{verb}{''.join(w.capitalize() for w in segment.split('-'))}"
+            paths.setdefault(f"/{segment}s{suffix}", {})[method] = {
+                "operationId": operation_id,
+                "summary": summary.format(name=name),
+                "x-bench-query": QUERY_TEMPLATES[verb].format(name=name, n="{n}"),
+                "responses": {"200": {"description": "OK"}},
+            }
+            created += 1
+    return {"openapi": "3.0.0", "info": {"title": title, "version": "1.0.0"}, "paths": paths}
+
+
+def _queries(specs: List[Tuple[str, Dict[str, Any]]], count: int, seed: int) -> List[Tuple[str, str]]:
+    """(query, expected chunk id) pairs written for randomly chosen operations."""
+    rng = random.Random(seed)
+    operations = [
+        (f"{connector_id}_{details['operationId']}", details["x-bench-query"])
+        for connector_id, spec in specs
+        for methods in spec["paths"].values()
+        for details in methods.values()
+    ]
+    picked = [operations[rng.randrange(len(operations))] for _ in range(count)]
+    return [(template.format(n=rng.randint(1, 99999)), expected) for expected, template in picked]
+
+
+def _rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        import resource
+
+        # Peak rather than current RSS where /proc is unavailable (kilobytes on Linux, bytes on macOS)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _dir_bytes(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            total += os.path.getsize(os.path.join(root, name))
+    return total
+
+
+def _search_level(store, queries: List[Tuple[str, str]], concurrency: int, n_results: int) -> Dict[str, Any]:
+    latencies: List[float] = []
+    hits = 0
+
+    def search(item: Tuple[str, str]) -> None:
+        nonlocal hits
+        query, expected = item
+        start = time.perf_counter()
+        results = store.search_functions(query, n_results=n_results)
+        latencies.append((time.perf_counter() - start) * 1000)
+        if expected in results["ids"][0]:
+            hits += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(search, queries))
+    elapsed = time.perf_counter() - started
+    return {
+        "concurrency": concurrency,
+        "queries": len(latencies),
+        "throughput_qps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": {
+            "mean": round(sum(latencies) / len(latencies), 3) if latencies else 0.0,
+            "p50": round(percentile(latencies, 50), 3),
+            "p95": round(percentile(latencies, 95), 3),
+            "p99": round(percentile(latencies, 99), 3),
+        },
+        "hit_rate": round(hits / max(1, len(latencies)), 4),
+    }
+
+
+def run_size(size: int, args: argparse.Namespace, embedding_function, provider: str, workdir: str) -> Dict[str, Any]:
+    from app.core.config import settings
+    from app.services import vector_db as vector_db_module
+
+    settings.VECTOR_BACKEND = args.backend
+    settings.CHROMA_DB_PATH = os.path.join(workdir, f"chroma-{size}")
+    settings.VECTOR_STORE_PATH = os.path.join(workdir, f"vectors-{size}")
+    store_path = settings.CHROMA_DB_PATH if args.backend == "chroma" else settings.VECTOR_STORE_PATH
+    rss_before = _rss_bytes()
+    store = vector_db_module.VectorDB()
+    store._get_embedding_function_and_provider = lambda: (embedding_function, provider)
+    # process_and_store_connector_chunks writes through the module-level instance
+    vector_db_module.vector_db = store
+
+    try:
+        specs = []
+        for index in range(0, size, args.connector_size):
+            connector_id = f"bench-{index // args.connector_size:05d}"
+            spec = synthetic_spec(f"Bench API {connector_id}", min(args.connector_size, size - index), index // len(OPERATIONS))
+            specs.append((connector_id, spec))
+
+        embed_before = getattr(embedding_function, "seconds", 0.0)
+        started = time.perf_counter()
+        for connector_id, spec in specs:
+            vector_db_module.process_and_store_connector_chunks(spec, connector_id, "bench-user")
+        ingest_seconds = time.perf_counter() - started
+        embed_seconds = getattr(embedding_function, "seconds", 0.0) - embed_before
+
+        queries = _queries(specs, args.queries, args.seed)
+        store.search_functions(queries[0][0], n_results=args.n_results)
+        search = [_search_level(store, queries, concurrency, args.n_results) for concurrency in args.concurrency]
+
+        delete_connector, delete_spec = specs[-1]
+        started = time.perf_counter()
+        store.delete_connector_functions(delete_connector)
+        delete_ms = (time.perf_counter() - started) * 1000
+
+        result = {
+            "operations": size,
+            "connectors": len(specs),
+            "ingest": {
+                "seconds": round(ingest_seconds, 3),
+                "operations_per_second": round(size / ingest_seconds, 1) if ingest_seconds else 0.0,
+                "embedding_seconds": round(embed_seconds, 3) if hasattr(embedding_function, "seconds") else None,
+            },
+            "search": search,
+            "delete": {
+                "operations": sum(len(methods) for methods in delete_spec["paths"].values()),
+                "ms": round(delete_ms, 3),
+            },
+            "footprint": {
+                "disk_bytes": _dir_bytes(store_path),
+                "rss_growth_bytes": max(0, _rss_bytes() - rss_before),
+            },
+        }
+    finally:
+        if not args.keep_data:
+            shutil.rmtree(store_path, ignore_errors=True)
+
+    print(
+        f"operations={size:<8} ingest={result['ingest']['operations_per_second']}/s "
+        f"search_p95@{search[-1]['concurrency']}={search[-1]['latency_ms']['p95']}ms "
+        f"hit_rate={search[0]['hit_rate']:.1%} delete={result['delete']['ms']}ms "
+        f"disk={result['footprint']['disk_bytes'] / 2**20:.1f}MiB",
+        file=sys.stderr,
+    )
+    return result
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any]) -> None:
+    """Print ingest throughput and search p95 changes against a previous report, per catalog size."""
+    previous = {entry["operations"]: entry for entry in baseline.get("sizes", [])}
+    for entry in report["sizes"]:
+        old = previous.get(entry["operations"])
+        if not old:
+            continue
+        old_rate = old["ingest"]["operations_per_second"]
+        ingest_change = (entry["ingest"]["operations_per_second"] / old_rate - 1) if old_rate else 0.0
+        old_search = {level["concurrency"]: level for level in old["search"]}
+        changes = []
+        for level in entry["search"]:
+            old_p95 = old_search.get(level["concurrency"], {}).get("latency_ms", {}).get("p95")
+            if old_p95:
+                changes.append(f"p95@{level['concurrency']} {level['latency_ms']['p95'] / old_p95 - 1:+.1%}")
+        print(f"operations={entry['operations']:<8} ingest {ingest_change:+.1%}  {'  '.join(changes)}", file=sys.stderr)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Vector search and ingestion scalability benchmark")
+    parser.add_argument("--sizes", type=lambda v: [int(s) for s in v.split(",")], default=[1000, 10000],
+                        help="comma-separated catalog sizes (total operations)")
+    parser.add_argument("--connector-size", type=int, default=500, help="operations per synthetic connector")
+    parser.add_argument("--concurrency", type=lambda v: [int(c) for c in v.split(",")], default=[1, 8],
+                        help="comma-separated search concurrency levels")
+    parser.add_argument("--queries", type=int, default=500, help="search queries per concurrency level")
+    parser.add_argument("--n-results", type=int, default=5)
+    parser.add_argument("--backend", default="chroma", help="VECTOR_BACKEND to benchmark (chroma, numpy, ...)")
+    parser.add_argument("--embedding", choices=("hashing", "local"), default="hashing",
+                        help="deterministic fake embeddings or the local sentence-transformers model")
+    parser.add_argument("--model", default="all-MiniLM-L6-v2", help="model for --embedding local")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write the JSON report here (default: stdout)")
+    parser.add_argument("--baseline", help="previous JSON report to compare against")
+    parser.add_argument("--keep-data", action="store_true", help="keep the temporary vector store directories")
+    args = parser.parse_args(argv)
+
+    # Keep the store and vault created when the app modules are imported out of the working directory
+    workdir = tempfile.mkdtemp(prefix="api-connector-vector-bench-")
+    os.environ["CHROMA_DB_PATH"] = os.path.join(workdir, "chroma")
+    os.environ["VECTOR_STORE_PATH"] = os.path.join(workdir, "vectors")
+    os.environ["VECTOR_BACKEND"] = args.backend
+    os.environ["VAULT_PATH"] = os.path.join(workdir, "vault")
+    os.environ["VAULT_ENCRYPTION_KEY"] = Fernet.generate_key().decode()
+
+    if args.embedding == "local":
+        from chromadb.utils import embedding_functions
+
+        embedding_function = embedding_functions.SentenceTransformerEmbeddingFunction(model_name=args.model)
+    else:
+        embedding_function = HashingEmbeddingFunction()
+
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "baseline")},
+        "sizes": [run_size(size, args, embedding_function, args.embedding, workdir) for size in args.sizes],
+    }
+    if not args.keep_data:
+        shutil.rmtree(workdir, ignore_errors=True)
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(report, json.load(f))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}", file=sys.stderr)
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+import argparse
+
+from app.services.vector_backends import BACKENDS, create_backend, migrate
+
+# Copy stored function embeddings between vector backends without re-embedding.
+# Point VECTOR_BACKEND at the target afterwards.
+#
+#   python migrate_vectors.py --from chroma --to numpy
+#   python migrate_vectors.py --from numpy --to chroma
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrate function embeddings between vector backends")
+    parser.add_argument("--from", dest="source", choices=sorted(BACKENDS), required=True)
+    parser.add_argument("--to", dest="target", choices=sorted(BACKENDS), required=True)
+    parser.add_argument("--batch-size", type=int, default=10000)
+    args = parser.parse_args()
+
+    if args.source == args.target:
+        parser.error("--from and --to must differ")
+
+    source = create_backend(args.source)
+    target = create_backend(args.target)
+    print(f"Migrating {source.count()} records from {args.source} to {args.target}...")
+    copied = migrate(source, target, batch_size=args.batch_size)
+    print(f"✅ Copied {copied} records. Target now holds {target.count()}. Set VECTOR_BACKEND={args.target} to use it.")
+
+
+if __name__ == "__main__":
+    main()
@@ -22,6 +22,16 @@ const PROVIDERS = {
         name: 'Local / Custom',
         models: ['llama-3-70b', 'mixtral-8x7b'],
         embeddingModels: ['all-MiniLM-L6-v2', 'e5-large-v2']
+    },
+    onnx: {
+        name: 'Local (ONNX Runtime)',
+        models: [],
+        embeddingModels: ['all-MiniLM-L6-v2', 'all-mpnet-base-v2']
+    },
+    sidecar: {
+        name: 'Local (shared sidecar)',
+        models: [],
+        embeddingModels: ['all-MiniLM-L6-v2', 'all-mpnet-base-v2']
     }
 };
 
@@ -159,7 +169,7 @@ const Configuration = () => {
                                     onChange={(e) => handleProviderChange('agent', e.target.value)}
                                     className="w-full px-4 py-2 border border-gray-300 rounded-lg focus:ring-2 focus:ring-indigo-500 focus:border-indigo-500 outline-none"
                                 >
-                                    {Object.entries(PROVIDERS).map(([key, data]) => (
+                                    {Object.entries(PROVIDERS).filter(([_, data]) => data.models.length > 0).map(([key, data]) => (
                                         <option key={key} value={key}>{data.name}</option>
                                     ))}
                                 </select>
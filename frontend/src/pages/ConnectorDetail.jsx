@@ -123,25 +123,58 @@ const ConnectorDetail = () => {
                     </div>
 
                     <form onSubmit={handleSubmit} className="space-y-4">
-                        <div>
-                            <label className="block text-sm font-medium text-gray-700 mb-1">API Key</label>
-                            <input
-                                type="password"
-                                onChange={(e) => handleInputChange('api_key', e.target.value)}
-                                className="w-full px-3 py-2 border border-gray-300 rounded-lg focus:ring-2 focus:ring-indigo-500 focus:border-indigo-500 outline-none text-sm"
-                                placeholder="sk_..."
-                                required
-                            />
-                        </div>
-                        <div>
-                            <label className="block text-sm font-medium text-gray-700 mb-1">Client ID (Optional)</label>
-                            <input
-                                type="text"
-                                onChange={(e) => handleInputChange('client_id', e.target.value)}
-                                className="w-full px-3 py-2 border border-gray-300 rounded-lg focus:ring-2 focus:ring-indigo-500 focus:border-indigo-500 outline-none text-sm"
-                                placeholder="client_..."
-                            />
-                        </div>
+                        {connector.auth_type === 'oauth2' ? (
+                            <>
+                                <div>
+                                    <label className="block text-sm font-medium text-gray-700 mb-1">Client ID</label>
+                                    <input
+                                        type="text"
+                                        onChange={(e) => handleInputChange('client_id', e.target.value)}
+                                        className="w-full px-3 py-2 border border-gray-300 rounded-lg focus:ring-2 focus:ring-indigo-500 focus:border-indigo-500 outline-none text-sm"
+                                        placeholder="client_..."
+                                        required
+                                    />
+                                </div>
+                                <div>
+                                    <label className="block text-sm font-medium text-gray-700 mb-1">Client Secret</label>
+                                    <input
+                                        type="password"
+                                        onChange={(e) => handleInputChange('client_secret', e.target.value)}
+                                        className="w-full px-3 py-2 border border-gray-300 rounded-lg focus:ring-2 focus:ring-indigo-500 focus:border-indigo-500 outline-none text-sm"
+                                    />
+                                </div>
+                                <div>
+                                    <label className="block text-sm font-medium text-gray-700 mb-1">Refresh Token (Optional)</label>
+                                    <input
+                                        type="password"
+                                        onChange={(e) => handleInputChange('refresh_token', e.target.value)}
+                                        className="w-full px-3 py-2 border border-gray-300 rounded-lg focus:ring-2 focus:ring-indigo-500 focus:border-indigo-500 outline-none text-sm"
+                                    />
+                                </div>
+                            </>
+                        ) : (
+                            <>
+                                <div>
+                                    <label className="block text-sm font-medium text-gray-700 mb-1">API Key</label>
+                                    <input
+                                        type="password"
+                                        onChange={(e) => handleInputChange('api_key', e.target.value)}
+                                        className="w-full px-3 py-2 border border-gray-300 rounded-lg focus:ring-2 focus:ring-indigo-500 focus:border-indigo-500 outline-none text-sm"
+                                        placeholder="sk_..."
+                                        required
+                                    />
+                                </div>
+                                <div>
+                                    <label className="block text-sm font-medium text-gray-700 mb-1">Client ID (Optional)</label>
+                                    <input
+                                        type="text"
+                                        onChange={(e) => handleInputChange('client_id', e.target.value)}
+                                        className="w-full px-3 py-2 border border-gray-300 rounded-lg focus:ring-2 focus:ring-indigo-500 focus:border-indigo-500 outline-none text-sm"
+                                        placeholder="client_..."
+                                    />
+                                </div>
+                            </>
+                        )}
                         <button
                             type="submit"
                             disabled={saving}